@@ -0,0 +1,206 @@
+import os
+import math
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+
+# Requests doing model work at once; the rest queue, cheap questions ahead of analyses
+ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'true').lower() != 'false'
+ADMISSION_MAX_CONCURRENT = int(os.getenv('ADMISSION_MAX_CONCURRENT', '4'))
+# Analyses expected to wait longer than this are summarised in Lite mode instead of queueing
+ADMISSION_LITE_WAIT_SECONDS = float(os.getenv('ADMISSION_LITE_WAIT_SECONDS', '15'))
+# Lite-mode analyses run at once, outside ADMISSION_MAX_CONCURRENT; beyond this they queue like the rest
+ADMISSION_LITE_MAX_CONCURRENT = int(os.getenv('ADMISSION_LITE_MAX_CONCURRENT', '4'))
+
+# Per request class: queue priority (lower first), queue bound, whether Lite mode can stand in,
+# and the service time assumed until real ones are measured
+REQUEST_CLASSES = {
+    "ask": {"priority": 0, "queue": int(os.getenv('ADMISSION_ASK_QUEUE', '32')), "lite": False, "seconds": 2.0},
+    "analyze": {"priority": 1, "queue": int(os.getenv('ADMISSION_ANALYZE_QUEUE', '8')), "lite": True, "seconds": 10.0},
+}
+
+SERVICE_TIME_WEIGHT = 0.2  # weight of the newest sample in the moving average
+
+class AdmissionRejected(Exception):
+    """The request's queue is full; retry after ``retry_after`` seconds."""
+
+    def __init__(self, kind, retry_after):
+        super().__init__(f"Too many pending {kind} requests")
+        self.kind = kind
+        self.retry_after = retry_after
+
+class Ticket:
+    """Admission of one request: release it when the work is done (or use it as a context manager)."""
+    __slots__ = ("kind", "degraded", "waited", "_controller", "_started", "_released")
+
+    def __init__(self, controller, kind, degraded=False, waited=0.0):
+        self.kind = kind
+        self.degraded = degraded
+        self.waited = waited
+        self._controller = controller
+        self._started = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            if self.degraded:
+                self._controller._release_lite()
+            else:
+                self._controller._release(self.kind, time.monotonic() - self._started)
+
+    def report(self):
+        return {"queued_seconds": round(self.waited, 3), "degraded": self.degraded}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class _Waiter:
+    __slots__ = ("kind", "wake")
+
+    def __init__(self, kind, wake):
+        self.kind = kind
+        self.wake = wake
+
+class AdmissionController:
+    """Bounded priority queues in front of the summarisation pipeline.
+
+    Up to ``max_concurrent`` requests run at once. Others wait in a single
+    priority queue, bounded per request class; a full queue rejects with a
+    suggested retry delay. Analyses whose estimated wait exceeds
+    ``lite_wait`` skip the queue and run in Lite mode instead, up to
+    ``lite_max_concurrent`` at once; once those slots are taken they queue.
+
+    enter() blocks its thread while queued, so under Flask each queued
+    request holds a server worker thread (gunicorn ``--threads``) until it
+    is admitted. enter_async() waits without a thread.
+    """
+
+    def __init__(self, max_concurrent=ADMISSION_MAX_CONCURRENT, classes=REQUEST_CLASSES,
+                 lite_wait=ADMISSION_LITE_WAIT_SECONDS, enabled=ADMISSION_ENABLED,
+                 lite_max_concurrent=ADMISSION_LITE_MAX_CONCURRENT):
+        self.max_concurrent = max_concurrent
+        self.classes = classes
+        self.lite_wait = lite_wait
+        self.lite_max_concurrent = lite_max_concurrent
+        self.enabled = enabled
+        self._lite_running = 0
+        self._lock = threading.Lock()
+        self._heap = []  # (priority, sequence, waiter)
+        self._sequence = itertools.count()
+        self._running = {kind: 0 for kind in classes}
+        self._queued = {kind: 0 for kind in classes}
+        self._service = {kind: config["seconds"] for kind, config in classes.items()}
+        self._counts = {kind: {"admitted": 0, "degraded": 0, "rejected": 0} for kind in classes}
+
+    def _estimated_wait(self, kind):
+        """Seconds until a new request of this class would start; call with the lock held."""
+        if sum(self._running.values()) < self.max_concurrent and not self._heap:
+            return 0.0
+        priority = self.classes[kind]["priority"]
+        ahead = sum(self._service[waiter.kind] for p, _, waiter in self._heap if p <= priority)
+        # Running requests are on average half done
+        in_progress = sum(self._service[k] * count for k, count in self._running.items()) / 2
+        return (ahead + in_progress) / self.max_concurrent
+
+    def _decide(self, kind, wake):
+        """Admit now (None), admit in Lite mode (Ticket), queue (_Waiter) or raise AdmissionRejected."""
+        with self._lock:
+            counts = self._counts[kind]
+            if not self.enabled or (sum(self._running.values()) < self.max_concurrent and not self._heap):
+                self._running[kind] += 1
+                counts["admitted"] += 1
+                return None
+
+            wait = self._estimated_wait(kind)
+            config = self.classes[kind]
+            if config["lite"] and wait > self.lite_wait and self._lite_running < self.lite_max_concurrent:
+                self._lite_running += 1
+                counts["degraded"] += 1
+                return Ticket(self, kind, degraded=True)
+            if self._queued[kind] >= config["queue"]:
+                counts["rejected"] += 1
+                raise AdmissionRejected(kind, max(1, math.ceil(wait)))
+
+            waiter = _Waiter(kind, wake)
+            heapq.heappush(self._heap, (config["priority"], next(self._sequence), waiter))
+            self._queued[kind] += 1
+            return waiter
+
+    def _release(self, kind, seconds=None):
+        with self._lock:
+            self._running[kind] -= 1
+            if seconds is not None:
+                self._service[kind] += SERVICE_TIME_WEIGHT * (seconds - self._service[kind])
+            self._dispatch()
+
+    def _release_lite(self):
+        with self._lock:
+            self._lite_running -= 1
+
+    def _dispatch(self):
+        # Called with the lock held: start queued requests while there is capacity
+        while self._heap and sum(self._running.values()) < self.max_concurrent:
+            _, _, waiter = heapq.heappop(self._heap)
+            self._queued[waiter.kind] -= 1
+            self._running[waiter.kind] += 1
+            self._counts[waiter.kind]["admitted"] += 1
+            waiter.wake()
+
+    def _cancel(self, waiter):
+        """Withdraw a waiter whose request went away; returns True if it had already been admitted."""
+        with self._lock:
+            for index, entry in enumerate(self._heap):
+                if entry[2] is waiter:
+                    self._heap.pop(index)
+                    heapq.heapify(self._heap)
+                    self._queued[waiter.kind] -= 1
+                    return False
+            return True
+
+    def enter(self, kind):
+        """Block until the request may run; returns its Ticket or raises AdmissionRejected."""
+        started = time.monotonic()
+        event = threading.Event()
+        decision = self._decide(kind, event.set)
+        if isinstance(decision, Ticket):
+            return decision
+        if decision is not None:
+            event.wait()
+        return Ticket(self, kind, waited=time.monotonic() - started)
+
+    async def enter_async(self, kind):
+        """enter() for coroutines: waits without blocking the event loop."""
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        admitted = loop.create_future()
+        decision = self._decide(kind, lambda: loop.call_soon_threadsafe(_resolve, admitted))
+        if isinstance(decision, Ticket):
+            return decision
+        if decision is not None:
+            try:
+                await admitted
+            except asyncio.CancelledError:
+                if self._cancel(decision):
+                    self._release(kind)
+                raise
+        return Ticket(self, kind, waited=time.monotonic() - started)
+
+    def stats(self):
+        """Queue lengths, running requests, counters and estimated waits per request class, and Lite runs."""
+        with self._lock:
+            stats = {kind: dict(self._counts[kind], queued=self._queued[kind], running=self._running[kind],
+                                mean_service_seconds=round(self._service[kind], 3),
+                                estimated_wait_seconds=round(self._estimated_wait(kind), 3))
+                     for kind in self.classes}
+            stats["lite_running"] = self._lite_running
+            return stats
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
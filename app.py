@@ -1,43 +1,628 @@
-from flask import Flask, request, jsonify, send_file, render_template
+from flask import Flask, Request, request, jsonify, send_file, render_template, url_for, g
 import os
+import re
+import uuid
+import time
+import zipfile
+import tempfile
+import threading
+from functools import partial
 from dotenv import load_dotenv
+from incremental import SessionCache, analyze_incrementally, content_hash
+from qa_cache import AnswerCache, ConversationHistory
+from near_duplicates import NearDuplicateIndex, minhash_signature, diff_documents
+from clause_index import build_clause_index, RISK_PATTERNS
+from document_compare import compare_documents, describe_changes
+from summary_render import parse_summary, render_html, clean_text_for_pdf, blocks_to_text, section_text
+from batch import run_batch
+from memory_budget import MemoryTracker
+from latency import LatencyByLength
+from ocr import ocr_stats
+from extractors import extract_text_from_pdf, extract_text_from_txt, extract_text_from_docx
+from llm_backends import backend_stats
+from admission import AdmissionController, AdmissionRejected
+from http_cache import (COMPRESS_MIN_BYTES, STATIC_MAX_AGE, compressible, choose_encoding, compress, content_etag,
+                        file_hashes, fingerprinted_name, resolve_fingerprint)
+from precompute import IdleScheduler, QA_PRECOMPUTE, COMMON_QUESTIONS
+from hierarchy import split_parts, outline, is_hierarchical, section_summary_cache
+from obligations import extract_obligations
+import summariser_lite
+
+try:
+    from storage import DocumentStore, DATABASE_URL
+except ImportError as e:
+    print(f" Document store disabled: {e}")
+    DocumentStore = None
+    DATABASE_URL = 'sqlite:///project.db'
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Global variables to store document text for Q&A
-current_document_text = ""
+# The document used for Q&A; its text is held compressed in its clause index
 current_document_name = ""
+current_document_key = ""
+current_clause_index = None
+current_document_context = None
+current_obligations = None
+# Held while the current document is replaced or its Q&A context registered, so readers see one document
+document_lock = threading.RLock()
+
+# Previous /analyze-text results per session, used to re-analyse only edited parts
+analysis_sessions = SessionCache()
+
+# Answers to earlier questions per document, reused for repeated or near-identical questions
+answer_cache = AnswerCache()
+
+# Each session's recent questions and answers, sent with its follow-up questions
+conversations = ConversationHistory()
+
+# MinHash fingerprints of analysed documents, so near-identical uploads reuse earlier analyses
+document_index = NearDuplicateIndex()
+
+# Analysis latency per requested summary length
+analysis_latency = LatencyByLength()
+
+# Bounded queues in front of the model pipeline; questions go ahead of analyses
+admission = AdmissionController()
+
+# Background work (precomputed answers) that runs only while no request is in progress
+idle_scheduler = IdleScheduler()
+
+# Documents, analyses and Q&A history that survive restarts and are shared by all workers
+try:
+    # Read after load_dotenv, so a DATABASE_URL set in .env applies
+    document_store = DocumentStore(os.getenv('DATABASE_URL', DATABASE_URL)) if DocumentStore is not None else None
+except Exception as e:
+    print(f" Document store unavailable: {e}")
+    document_store = None
 
 try:
     # Try to import the GenAI-powered version first
-    from summariser_genai import extract_text_from_pdf, extract_text_from_txt, extract_text_from_docx, split_into_sections, summarize_sections, compile_final_summary, save_summary_as_pdf, store_feedback, answer_question
+    from summariser_genai import split_into_sections, summarize_sections, compile_final_summary, save_summary_as_pdf, store_feedback, answer_question, revise_sections, register_document_context, refresh_document_context
+    from summariser_genai import compile_summary_blocks
+    from summariser_genai import summarize_sections_async, revise_sections_async, answer_question_async, explain_changes, answer_questions
+    from summariser_genai import summarize_part, verify_extractions
     AI_MODE = "GenAI"
     print(" GenAI mode loaded successfully")
 except ImportError as e:
     print(f" GenAI mode failed to load: {e}")
     try:
         # Fallback to Hugging Face Legal Pegasus + KeyBERT version
-        from summariser_hf import extract_text_from_pdf, extract_text_from_txt, extract_text_from_docx, split_into_sections, summarize_sections, compile_final_summary, save_summary_as_pdf, store_feedback, answer_question
+        from summariser_hf import split_into_sections, summarize_sections, compile_final_summary, save_summary_as_pdf, store_feedback, answer_question
+        revise_sections = None
+        register_document_context = refresh_document_context = compile_summary_blocks = None
+        summarize_sections_async = revise_sections_async = answer_question_async = None
+        explain_changes = answer_questions = summarize_part = verify_extractions = None
         AI_MODE = "HuggingFace"
         print("HuggingFace Legal Pegasus mode loaded successfully")
     except ImportError as e2:
         # Final fallback to lightweight version
         print(f" AI mode failed to load: {e2}")
         try:
-            from summariser_lite import extract_text_from_pdf, extract_text_from_txt, extract_text_from_docx, split_into_sections, summarize_sections, compile_final_summary, save_summary_as_pdf, store_feedback
+            from summariser_lite import split_into_sections, summarize_sections, compile_final_summary, save_summary_as_pdf, store_feedback
+            revise_sections = None
+            register_document_context = refresh_document_context = compile_summary_blocks = None
+            summarize_sections_async = revise_sections_async = answer_question_async = None
+            explain_changes = answer_questions = summarize_part = verify_extractions = None
             AI_MODE = "Lite"
             print(" Lite mode loaded successfully")
             # Add dummy answer_question function for compatibility
-            def answer_question(text, question):
+            def answer_question(text, question, context=None, history=None):
                 return "Q&A feature requires GenAI mode. Please wait for it to be available."
         except ImportError as e3:
             print(f" All modes failed to load: {e3}")
             raise
 
+# Uploads stay in memory up to UPLOAD_SPOOL_BYTES; larger ones spill to an
+# anonymous temporary file, on tmpfs when available
+UPLOAD_SPOOL_BYTES = int(os.getenv('UPLOAD_SPOOL_BYTES', str(2 * 1024 * 1024)))
+UPLOAD_SPOOL_DIR = os.getenv('UPLOAD_SPOOL_DIR') or ('/dev/shm' if os.path.isdir('/dev/shm') else None)
+
+class SpooledUploadRequest(Request):
+    """Request that buffers uploaded files in a SpooledTemporaryFile instead of a named file."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES, mode='rb+', dir=UPLOAD_SPOOL_DIR)
+
 app = Flask(__name__)
+app.request_class = SpooledUploadRequest
 app.config['MAX_CONTENT_LENGTH'] = 8 * 1024 * 1024  # Set file size limit to 8MB
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///project.db'  # Switch to SQLite
+
+def serve_static(filename):
+    """Static files; names fingerprinted by static_url() may be cached by clients for good."""
+    original, current = resolve_fingerprint(app.static_folder, filename)
+    response = app.send_static_file(original)
+    if current:
+        response.cache_control.no_cache = False
+        response.cache_control.public = True
+        response.cache_control.max_age = STATIC_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+app.view_functions['static'] = serve_static
+
+@app.template_global()
+def static_url(filename):
+    """URL of a static file with its content hash in the name, e.g. /static/css/styles.<hash>.css."""
+    return url_for('static', filename=fingerprinted_name(app.static_folder, filename))
+
+# Batch jobs run by this process, keyed by job id; the document store keeps every job's status
+BATCH_DIR = os.getenv('BATCH_DIR', 'batch_results')
+batch_jobs = {}
+# A running job whose status was not updated for this long was interrupted and is resumed by the next process to see it
+BATCH_STALE_SECONDS = int(os.getenv('BATCH_STALE_SECONDS', '300'))
+BATCH_HEARTBEAT_SECONDS = 60
+
+def valid_session_id(session_id):
+    """The given session id if well-formed, otherwise a new one."""
+    return session_id if session_id and re.fullmatch(r'[0-9a-f]{32}', session_id) else uuid.uuid4().hex
+
+def get_session_id():
+    """Return the caller's session id, issuing a new one if the cookie is missing."""
+    if 'session_id' not in g:
+        g.session_id = valid_session_id(request.cookies.get('session_id', ''))
+    return g.session_id
+
+# Requests that do not hold back background work
+IDLE_ENDPOINTS = {'health_check', 'metrics', 'static', 'batch_status'}
+
+@app.before_request
+def begin_foreground():
+    if request.endpoint not in IDLE_ENDPOINTS:
+        g.foreground = True
+        idle_scheduler.begin()
+
+@app.teardown_request
+def end_foreground(_):
+    if g.pop('foreground', False):
+        idle_scheduler.end()
+
+# Endpoints that pass through admission control, by request class
+ADMISSION_CLASSES = {'upload_file': 'analyze', 'analyze_text': 'analyze', 'compare': 'analyze', 'ask_question': 'ask',
+                     'section_summary': 'ask'}
+
+@app.before_request
+def admit_request():
+    kind = ADMISSION_CLASSES.get(request.endpoint)
+    if kind is not None:
+        g.admission = admission.enter(kind)
+
+@app.teardown_request
+def release_admission(_):
+    ticket = g.pop('admission', None)
+    if ticket is not None:
+        ticket.release()
+
+@app.errorhandler(AdmissionRejected)
+def too_many_requests(e):
+    response = jsonify({"error": "The server is busy. Please try again shortly.", "retry_after": e.retry_after})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 429
+
+def admission_report():
+    """How long this request queued and whether it was sent to Lite mode."""
+    return g.admission.report() if 'admission' in g else None
+
+def admitted_tracker():
+    """Memory tracker for this request, already degraded if admission control sent it to Lite mode."""
+    tracker = MemoryTracker()
+    tracker.degraded = 'admission' in g and g.admission.degraded
+    return tracker
+
+@app.after_request
+def compress_response(response):
+    """Content-hash ETags (and 304s) for GET responses; gzip or brotli for large JSON and text bodies."""
+    if response.status_code != 200 or not compressible(response.mimetype) or 'Content-Encoding' in response.headers:
+        return response
+    if response.direct_passthrough:
+        # Static text files are small enough to read and compress; downloads are streamed as they are
+        if request.endpoint != 'static':
+            return response
+        response.direct_passthrough = False
+
+    data = response.get_data()
+    if request.method in ('GET', 'HEAD') and response.get_etag()[0] is None:
+        response.set_etag(content_etag(data), weak=True)
+        response.make_conditional(request)
+        if response.status_code == 304:
+            return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.accept_encodings) if len(data) >= COMPRESS_MIN_BYTES else None
+    if encoding:
+        response.set_data(compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        # Compressed and identity bodies differ byte for byte, so only a weak validator covers both
+        etag, weak = response.get_etag()
+        if etag is not None and not weak:
+            response.set_etag(etag, weak=True)
+    return response
+
+@app.after_request
+def set_session_cookie(response):
+    if 'session_id' in g and request.cookies.get('session_id') != g.session_id:
+        response.set_cookie('session_id', g.session_id, httponly=True, samesite='Lax')
+    return response
+
+def persist(method, *args, **kwargs):
+    """Call a document store method; database errors are logged rather than failing the request."""
+    if document_store is None:
+        return None
+    try:
+        return getattr(document_store, method)(*args, **kwargs)
+    except Exception:
+        app.logger.exception("Document store %s failed", method)
+        return None
+
+def set_current_document(text, name):
+    """Make this the document used for Q&A, clause search and risk analysis.
+
+    Returns it as ``(key, name, clause_index)``, as current_document does;
+    the request that set it works from this tuple, since a concurrent upload
+    may replace the current document at any moment.
+    """
+    global current_document_name, current_document_key, current_clause_index, current_document_context
+    global current_obligations
+
+    clause_index = build_clause_index(text)
+    with document_lock:
+        if current_document_context is not None:
+            current_document_context.release()
+        current_document_context = None
+        current_obligations = None
+
+        current_document_name = name
+        current_document_key = content_hash(text)
+        current_clause_index = clause_index
+        return current_document_key, name, clause_index
+
+def current_document():
+    """The current document as ``(key, name, clause_index)``, read together; the clause index holds its text.
+
+    Requests that wait on the model capture it first, since another upload
+    may replace the current document before they finish.
+    """
+    with document_lock:
+        return current_document_key, current_document_name, current_clause_index
+
+def question_text(clause_index, context):
+    """The text answer_question needs: none with a registered context, which sends only relevant clauses."""
+    return clause_index.text if context is None else None
+
+def analyze_with_reuse(text, name, min_length, max_length, clause_index, previous=None, degraded=False,
+                       session_id=None, owner=None):
+    """Analyse text, starting from `previous` or else from the closest previously analysed document.
+
+    Returns ``(section_summaries, state, stats)`` as analyze_incrementally does;
+    when a near-duplicate was reused, ``stats["near_duplicate"]`` describes it
+    (see record_analysis). ``degraded`` analyses with Lite summarisation,
+    which keeps no state, to stay within the memory budget. Analyses are
+    persisted under ``session_id`` when a document store is configured.
+    ``owner`` (a session or batch job) decides how much of a near-duplicate
+    is revealed: any owner's document can be reused, but only the same
+    owner's is named.
+    """
+    if degraded:
+        persist("save_document", text, name)
+        return analyze_degraded(text, min_length, max_length, clause_index)
+
+    reuse, previous = find_reusable_analysis(text, min_length, max_length, previous, owner=owner)
+    section_summaries, state, stats = analyze_incrementally(
+        previous, text, split_into_sections, summarize_sections, revise_sections=revise_sections,
+        min_length=min_length, max_length=max_length, clause_index=clause_index)
+    record_analysis(reuse, text, name, state, stats, session_id=session_id)
+    return section_summaries, state, stats
+
+def analyze_degraded(text, min_length, max_length, clause_index):
+    """Lite summarisation for documents over the memory budget; keeps no state."""
+    sections = summariser_lite.split_into_sections(text)
+    section_summaries = summariser_lite.summarize_sections(sections, min_length=min_length, max_length=max_length,
+                                                           clause_index=clause_index)
+    return section_summaries, None, {"mode": "degraded"}
+
+def find_reusable_analysis(text, min_length, max_length, previous=None, owner=None):
+    """Fingerprint text and, without a `previous` state, find a near-duplicate to start from.
+
+    Falls back to an analysis of the same document stored by an earlier
+    process (identical text, so nothing about its uploader is revealed).
+    Returns ``(reuse, previous)``; pass ``reuse`` to record_analysis afterwards.
+    """
+    reuse = {"key": content_hash(text), "signature": minhash_signature(text), "lengths": (min_length, max_length),
+             "owner": owner}
+    reuse["match"] = document_index.find(reuse["key"], reuse["signature"], reuse["lengths"]) if previous is None else None
+    if reuse["match"]:
+        previous = reuse["match"][0]["state"]
+    elif previous is None:
+        previous = persist("load_analysis", reuse["key"], reuse["lengths"])
+    return reuse, previous
+
+def record_analysis(reuse, text, name, state, stats, session_id=None):
+    """Index and persist a finished analysis and describe any near-duplicate it was based on in ``stats``.
+
+    A near-duplicate of the same owner is named and its differences listed.
+    Another owner's is only counted: its analysis was revised for the
+    paragraphs that differ, and nothing of its name or text is returned.
+    """
+    if reuse["match"]:
+        entry, similarity = reuse["match"]
+        document_index.record_reuse(text, stats["chars_changed"])
+        differences = diff_documents(entry["chunks"].text(), text)
+        if reuse["owner"] is not None and entry["owner"] == reuse["owner"]:
+            stats["near_duplicate"] = {"document_name": entry["name"], "similarity": round(similarity, 3),
+                                       "differences": differences}
+        else:
+            stats["near_duplicate"] = {"shared": True, "similarity": round(similarity, 3),
+                                       "unchanged_paragraphs": differences["unchanged_paragraphs"],
+                                       "changed_paragraphs": differences["changed_paragraphs"]}
+    document_index.add(reuse["key"], name, reuse["signature"], text, state, reuse["lengths"], owner=reuse["owner"])
+    # A cached result is already stored unless a session needs it as its latest analysis
+    if stats["mode"] != "cached" or session_id is not None:
+        persist("save_document", text, name)
+        persist("save_analysis", reuse["key"], state, mode=stats["mode"], session_id=session_id)
+
+def session_analysis(session_id):
+    """The session's previous /analyze-text state, from memory or the document store."""
+    state = analysis_sessions.get(session_id)
+    return state if state is not None else persist("load_session_analysis", session_id)
+
+def cached_answer(document_key, question):
+    """An earlier answer to this question from the answer cache or the document store, or None."""
+    answer = answer_cache.get(document_key, question)
+    if answer is None:
+        answer = persist("find_answer", document_key, question)
+        if answer is not None:
+            answer_cache.put(document_key, question, answer)
+    return answer
+
+def remember_answer(answer, document_key, question, session_id, history=None, cached=False):
+    """Record a turn of the session's conversation and its Q&A history.
+
+    A new answer is shared through the answer cache and the document store
+    only if it was given without earlier turns of the conversation.
+    """
+    if not cached and not history:
+        answer_cache.put(document_key, question, answer)
+    conversations.add(session_id, document_key, question, answer)
+    persist("record_question", document_key, question, answer, session_id=session_id,
+            history_dependent=bool(history))
+
+def compile_summary(section_summaries, stats):
+    """The final summary as blocks, compiled by the summariser that produced the sections."""
+    if stats.get("mode") == "degraded":
+        return parse_summary(summariser_lite.compile_final_summary(section_summaries))
+    if compile_summary_blocks is not None:
+        # Structured GenAI analyses are blocks already and go to the renderers as they are
+        return compile_summary_blocks(section_summaries)
+    return parse_summary(compile_final_summary(section_summaries))
+
+def analyze_document(text, min_length=150, max_length=300, name="Document", owner=None):
+    """Run the full analysis for one document without touching the Q&A state.
+
+    Near-duplicates of other owners are reused without being named, as in analyze_with_reuse.
+    """
+    tracker = MemoryTracker()
+    text = tracker.check_text(text)
+    clause_index = build_clause_index(text)
+    started = time.perf_counter()
+    section_summaries, _, stats = analyze_with_reuse(text, name, min_length, max_length, clause_index,
+                                                     degraded=tracker.degraded, owner=owner)
+    analysis_latency.record(max_length, stats["mode"], time.perf_counter() - started)
+    result = {
+        "summary": blocks_to_text(compile_summary(section_summaries, stats)),
+        "sections": {name: section_text(summary) for name, summary in section_summaries.items()},
+        "risk_flags": clause_index.risk_flags(),
+        "obligations": extract_obligations(text, clause_index).to_json()
+    }
+    if "near_duplicate" in stats:
+        result["near_duplicate"] = stats["near_duplicate"]
+    if tracker.degraded or tracker.truncated:
+        result["degraded"] = tracker.degraded
+        result["truncated"] = tracker.truncated
+    return result
+
+def extract_upload(filename, stream, max_chars=None, on_text=None):
+    """Extract text from an uploaded file by its extension, or None if the type is unsupported.
+
+    ``on_text`` gets the running character count (see MemoryTracker.text_progress).
+    """
+    if filename.endswith('.txt'):
+        return extract_text_from_txt(stream, max_chars=max_chars, on_text=on_text)
+    elif filename.endswith('.pdf'):
+        # Scanned pages are OCRed in parallel; /metrics shows the progress under "ocr"
+        return extract_text_from_pdf(stream, max_chars=max_chars, label=filename, on_text=on_text)
+    elif filename.endswith('.docx'):
+        return extract_text_from_docx(stream, max_chars=max_chars, on_text=on_text)
+    return None
+
+def summary_response(summary_blocks, document, text, tracker, **extra):
+    """Render the summary blocks to PDF and HTML and build the JSON body of /upload and /analyze-text.
+
+    ``document`` is the ``(key, name, clause_index)`` returned by
+    set_current_document and ``text`` its text.
+    """
+    document_key, document_name, clause_index = document
+    with tracker.stage("render"):
+        summary = blocks_to_text(summary_blocks)
+        pdf_path = "static/summary_output.pdf"
+        save_summary_as_pdf(summary, output_path=pdf_path, blocks=summary_blocks)
+
+    body = {
+        "summary": summary,
+        "summary_html": render_html(summary_blocks),
+        "download_link": "/download/summary_output.pdf",
+        "has_document": True,
+        "document_name": document_name,
+        "risk_flags": clause_index.risk_flags()
+    }
+    # Deadlines, notice periods, fees and dates as data; low-confidence ones are verified in the background
+    with tracker.stage("obligations"):
+        terms = document_obligations(document_key, clause_index, text)
+        schedule_verification(terms, tracker)
+        body["obligations"] = terms.to_json()
+
+    # Long documents list their parts; each part's detailed summary is fetched from /sections/<number> on demand
+    if summarize_part is not None and is_hierarchical(text) and not tracker.degraded:
+        body["outline"] = outline(text, clause_index)
+    body.update(extra)
+    body["memory"] = tracker.report()
+    return body
+
+def question_context(document_key, clause_index):
+    """Q&A context for a document captured by the caller, registered on its first question so follow-ups reuse it.
+
+    If another upload has replaced that document since it was captured, a
+    context is built for this question only, without a server-side cache.
+    """
+    global current_document_context
+    if register_document_context is None:
+        return None
+    with document_lock:
+        if document_key == current_document_key:
+            if current_document_context is None:
+                current_document_context = register_document_context(clause_index)
+            elif current_document_context.expiring():
+                current_document_context = refresh_document_context(current_document_context)
+            return current_document_context
+    return register_document_context(clause_index, cache=False)
+
+def document_obligations(document_key, clause_index, text=None):
+    """Terms extracted by the rule engine from a document captured by the caller, on first use.
+
+    They are kept for the current document only, by its key, so a request
+    for a document another upload has replaced gets its own extraction.
+    Pass the document's text if it is at hand; otherwise it is decompressed
+    from the clause index.
+    """
+    global current_obligations
+    with document_lock:
+        if current_obligations is not None and current_obligations.document_key == document_key:
+            return current_obligations
+    terms = extract_obligations(text or clause_index.text, clause_index, document_key=document_key)
+    with document_lock:
+        if document_key != current_document_key:
+            return terms
+        if current_obligations is None or current_obligations.document_key != document_key:
+            current_obligations = terms
+        return current_obligations
+
+def verify_obligations(obligations):
+    """Ask the model about the low-confidence items of an extraction, in one batch."""
+    with document_lock:
+        if obligations is not current_obligations:
+            return  # replaced by a newer upload before the app went idle
+    pending = {item.id for item in obligations.unverified()}
+    items = [item for item in obligations.to_json()["items"] if item["id"] in pending]
+    verdicts = verify_extractions(items)
+    with document_lock:
+        if obligations.document_key != current_document_key:
+            return  # replaced while the model was verifying
+        obligations.apply_verdicts(verdicts)
+
+def schedule_verification(obligations, tracker):
+    """Queue verification of low-confidence items, ahead of precomputed answers, when a model is available."""
+    if verify_extractions is None or tracker.degraded or obligations.verification != "unverified":
+        return
+    obligations.mark_pending()
+    idle_scheduler.submit(verify_obligations, obligations, priority=5, key=("verify", obligations.document_key))
+
+def precompute_answers(document_key):
+    """Answer COMMON_QUESTIONS about the current document in one call and cache the answers."""
+    current_key, _, clause_index = current_document()
+    if document_key != current_key:
+        return  # replaced by a newer upload before the app went idle
+    questions = []
+    for question in COMMON_QUESTIONS:
+        if answer_cache.contains(document_key, question):
+            continue
+        stored = persist("find_answer", document_key, question)
+        if stored is not None:
+            answer_cache.put(document_key, question, stored)
+        else:
+            questions.append(question)
+    if not questions:
+        return
+
+    context = question_context(document_key, clause_index)
+    answers = answer_questions(question_text(clause_index, context), questions, context=context)
+    for question, answer in answers.items():
+        answer_cache.put(document_key, question, answer)
+        persist("record_question", document_key, question, answer)
+
+def schedule_precompute(document_key, tracker):
+    """Queue precomputed answers for the document just uploaded, when enabled and within the memory budget."""
+    if QA_PRECOMPUTE and answer_questions is not None and not tracker.degraded:
+        idle_scheduler.submit(precompute_answers, document_key, key=("answers", document_key))
+
+def batch_paths(job_id):
+    """The uploaded archive and the results file of a batch job."""
+    job_dir = os.path.join(BATCH_DIR, job_id)
+    return os.path.join(job_dir, "documents.zip"), os.path.join(job_dir, "results.jsonl")
+
+def run_batch_job(job_id):
+    """Run or resume a batch job; results already written by an interrupted run are skipped."""
+    job = batch_jobs[job_id]
+    archive_path, output_path = batch_paths(job_id)
+    finished = threading.Event()
+
+    def report(stats):
+        job["progress"] = stats
+        persist("save_batch_job", job_id, job)
+
+    def heartbeat():
+        # Keeps a job on one slow document from looking interrupted to other processes
+        while not finished.wait(BATCH_HEARTBEAT_SECONDS):
+            persist("save_batch_job", job_id, job)
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+    try:
+        # Documents of one job are compared with each other only
+        analyze = partial(analyze_document, owner=f"batch:{job_id}")
+        job["progress"] = run_batch(archive_path, output_path, analyze, progress=report)
+        job["status"] = "completed"
+    except Exception as e:
+        job["status"] = "failed"
+        job["error"] = str(e)
+    finally:
+        finished.set()
+        job["finished"] = time.time()
+        persist("save_batch_job", job_id, job)
+        if os.path.exists(archive_path):
+            os.remove(archive_path)
+
+def start_batch_job(job_id, job):
+    batch_jobs[job_id] = job
+    threading.Thread(target=run_batch_job, args=(job_id,), daemon=True).start()
+
+def resume_batch_job(job_id):
+    """Resume a stored running job whose process stopped updating it, if its archive is on this machine."""
+    if job_id in batch_jobs or not os.path.exists(batch_paths(job_id)[0]):
+        return
+    if persist("claim_batch_job", job_id, time.time() - BATCH_STALE_SECONDS):
+        print(f"Resuming interrupted batch job {job_id}")
+        start_batch_job(job_id, persist("load_batch_job", job_id))
+
+def find_batch_job(job_id):
+    """A batch job from this process or the document store, resuming it if it was interrupted."""
+    job = batch_jobs.get(job_id)
+    if job is None:
+        job = persist("load_batch_job", job_id)
+        if job is not None and job["status"] == "running":
+            resume_batch_job(job_id)
+            job = batch_jobs.get(job_id, job)
+    return job
+
+batch_jobs_resumed = False
+
+@app.before_request
+def resume_batch_jobs():
+    """Once per process, resume the batch jobs a crashed or restarted process left running."""
+    global batch_jobs_resumed
+    if not batch_jobs_resumed:
+        batch_jobs_resumed = True
+        for job_id in persist("running_batch_jobs") or []:
+            resume_batch_job(job_id)
 
 @app.route('/')
 def index():
@@ -48,9 +633,24 @@ def health_check():
     """Health check endpoint for deployment."""
     return jsonify({"status": "healthy", "mode": AI_MODE}), 200
 
+@app.route('/metrics')
+def metrics():
+    """Cache statistics for monitoring."""
+    return jsonify({
+        "mode": AI_MODE,
+        "qa_cache": answer_cache.stats(),
+        "near_duplicates": document_index.stats(),
+        "analysis_latency": analysis_latency.stats(),
+        "store": persist("stats"),
+        "background": idle_scheduler.stats(),
+        "ocr": ocr_stats(),
+        "admission": admission.stats(),
+        "llm": backend_stats(),
+        "sections": section_summary_cache.stats()
+    }), 200
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
-    global current_document_text, current_document_name
     
     if 'file' not in request.files:
         return jsonify({"error": "No file part"}), 400
@@ -59,57 +659,47 @@ def upload_file():
     if file.filename == '':
         return jsonify({"error": "No selected file"}), 400
 
-    file_path = f"temp_{file.filename}"
-    file.save(file_path)
-
     # Get optional custom summary length parameters from the request
     custom_min_length = int(request.form.get("min_length", 150))
     custom_max_length = int(request.form.get("max_length", 300))
 
+    # Per-request memory accounting; extraction stops at the character cap
+    tracker = admitted_tracker()
+
     try:
-        # Extract text based on file type
-        if file.filename.endswith('.txt'):
-            text = extract_text_from_txt(file_path)
-        elif file.filename.endswith('.pdf'):
-            text = extract_text_from_pdf(file_path)
-        elif file.filename.endswith('.docx'):
-            text = extract_text_from_docx(file_path)
-        else:
-            os.remove(file_path)
+        # Extract text based on file type, straight from the spooled upload stream
+        with tracker.stage("extract"):
+            text = extract_upload(file.filename, file.stream, max_chars=tracker.max_chars + 1,
+                                  on_text=tracker.text_progress())
+        if text is None:
             return jsonify({"error": "Unsupported file type"}), 400
+        text = tracker.check_text(text)
 
-        # Store document text for Q&A functionality
-        current_document_text = text
-        current_document_name = file.filename
-
-        # Summarize sections with custom length
-        sections = split_into_sections(text)
-        section_summaries = summarize_sections(sections, min_length=custom_min_length, max_length=custom_max_length)
-        final_summary = compile_final_summary(section_summaries)
+        # Store document text for Q&A and index its clauses once, right after extraction
+        with tracker.stage("index"):
+            document = set_current_document(text, file.filename)
 
-        # Save summary as PDF
-        pdf_path = "static/summary_output.pdf"
-        save_summary_as_pdf(final_summary, output_path=pdf_path)
+        # Summarize sections with custom length, reusing the analysis of a near-duplicate if one was seen
+        with tracker.stage("analyze"):
+            section_summaries, _, analysis_stats = analyze_with_reuse(
+                text, file.filename, custom_min_length, custom_max_length, document[2],
+                degraded=tracker.degraded, owner=get_session_id())
+            summary_blocks = compile_summary(section_summaries, analysis_stats)
+        analysis_latency.record(custom_max_length, analysis_stats["mode"], tracker.stages[-1]["seconds"])
 
-        # Cleanup temporary file
-        os.remove(file_path)
+        # Answer the usual first questions while the user reads the summary
+        schedule_precompute(document[0], tracker)
 
         # Respond with summary and download link
-        return jsonify({
-            "summary": final_summary,
-            "download_link": f"/download/summary_output.pdf",
-            "has_document": True,
-            "document_name": file.filename
-        })
+        return jsonify(summary_response(summary_blocks, document, text, tracker,
+                                        near_duplicate=analysis_stats.get("near_duplicate"),
+                                        admission=admission_report()))
 
     except Exception as e:
-        if os.path.exists(file_path):
-            os.remove(file_path)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/analyze-text', methods=['POST'])
 def analyze_text():
-    global current_document_text, current_document_name
     
     data = request.json
     text = data.get('text', '').strip()
@@ -121,42 +711,89 @@ def analyze_text():
     custom_min_length = int(data.get("min_length", 150))
     custom_max_length = int(data.get("max_length", 300))
     
+    tracker = admitted_tracker()
+    text = tracker.check_text(text)
+    
     try:
         # Store document text for Q&A functionality
-        current_document_text = text
-        current_document_name = "Pasted Text"
+        with tracker.stage("index"):
+            document = set_current_document(text, "Pasted Text")
         
-        # Process the text directly
-        sections = split_into_sections(text)
-        section_summaries = summarize_sections(sections, min_length=custom_min_length, max_length=custom_max_length)
-        final_summary = compile_final_summary(section_summaries)
-        
-        # Save summary as PDF
-        pdf_path = "static/summary_output.pdf"
-        save_summary_as_pdf(final_summary, output_path=pdf_path)
+        # Process the text, re-analysing only what changed since this session's last submission
+        # (or since the closest previously analysed document on a session's first submission)
+        session_id = get_session_id()
+        with tracker.stage("analyze"):
+            section_summaries, state, incremental_stats = analyze_with_reuse(
+                text, "Pasted Text", custom_min_length, custom_max_length, document[2],
+                previous=session_analysis(session_id), degraded=tracker.degraded, session_id=session_id,
+                owner=session_id)
+            analysis_sessions.set(session_id, state)
+            summary_blocks = compile_summary(section_summaries, incremental_stats)
+        analysis_latency.record(custom_max_length, incremental_stats["mode"], tracker.stages[-1]["seconds"])
         
         # Respond with summary and download link
-        return jsonify({
-            "summary": final_summary,
-            "download_link": f"/download/summary_output.pdf",
-            "has_document": True,
-            "document_name": "Pasted Text"
-        })
+        return jsonify(summary_response(summary_blocks, document, text, tracker, incremental=incremental_stats,
+                                        admission=admission_report()))
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/batch', methods=['POST'])
+def start_batch():
+    """Start analysing a ZIP of TXT, PDF and DOCX documents in the background."""
+    file = request.files.get('file')
+    if file is None or file.filename == '':
+        return jsonify({"error": "No file part"}), 400
+    if not file.filename.lower().endswith('.zip'):
+        return jsonify({"error": "Batch uploads must be a .zip archive"}), 400
+
+    job_id = uuid.uuid4().hex
+    archive_path, _ = batch_paths(job_id)
+    os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+    file.save(archive_path)
+
+    if not zipfile.is_zipfile(archive_path):
+        os.remove(archive_path)
+        return jsonify({"error": "Uploaded file is not a valid ZIP archive"}), 400
+
+    job = {"status": "running", "progress": {}, "started": time.time()}
+    persist("save_batch_job", job_id, job)
+    start_batch_job(job_id, job)
+
+    return jsonify({
+        "job_id": job_id,
+        "status_url": f"/batch/{job_id}",
+        "results_url": f"/batch/{job_id}/results"
+    }), 202
+
+@app.route('/batch/<job_id>', methods=['GET'])
+def batch_status(job_id):
+    job = find_batch_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown batch job"}), 404
+    return jsonify(dict(job, job_id=job_id))
+
+@app.route('/batch/<job_id>/results', methods=['GET'])
+def batch_results(job_id):
+    if find_batch_job(job_id) is None:
+        return jsonify({"error": "Unknown batch job"}), 404
+    _, results_path = batch_paths(job_id)
+    if not os.path.exists(results_path):
+        return jsonify({"error": "No results yet"}), 404
+    return send_file(results_path, mimetype="application/x-ndjson", as_attachment=True,
+                     download_name=f"batch_{job_id}.jsonl")
+
 @app.route('/download/<filename>', methods=['GET'])
 def download_file(filename):
-    return send_file(f"static/{filename}", as_attachment=True)
+    path = f"static/{filename}"
+    # The same file name is rewritten for every summary, so validate by content rather than modification time
+    response = send_file(path, as_attachment=True, etag=file_hashes.get(path) if os.path.isfile(path) else True)
+    response.cache_control.no_cache = True
+    return response
 
 # New Q&A endpoint
 @app.route('/ask', methods=['POST'])
 def ask_question():
-    global current_document_text, current_document_name
-    
-    if not current_document_text:
-        return jsonify({"error": "No document uploaded. Please upload a document first."}), 400
     
     data = request.json
     question = data.get("question", "").strip()
@@ -164,16 +801,134 @@ def ask_question():
     if not question:
         return jsonify({"error": "No question provided"}), 400
     
+    # Capture the document once; another upload may replace it while the answer is generated
+    key, name, clause_index = current_document()
+    if clause_index is None:
+        return jsonify({"error": "No document uploaded. Please upload a document first."}), 400
     try:
-        answer = answer_question(current_document_text, question)
+        session_id = get_session_id()
+        answer = cached_answer(key, question)
+        cached = answer is not None
+        history = []
+        if not cached:
+            history = conversations.turns(session_id, key)
+            context = question_context(key, clause_index)
+            answer = answer_question(question_text(clause_index, context), question, context=context, history=history)
+        remember_answer(answer, key, question, session_id, history=history, cached=cached)
         return jsonify({
             "answer": answer,
             "question": question,
-            "document_name": current_document_name
+            "document_name": name,
+            "cached": cached
         })
     except Exception as e:
         return jsonify({"error": f"Failed to answer question: {str(e)}"}), 500
 
+@app.route('/sections/<int:number>', methods=['GET'])
+def section_summary(number):
+    """Detailed summary of one part of the current long document, generated when first expanded."""
+    _, _, clause_index = current_document()
+    if clause_index is None:
+        return jsonify({"error": "No document uploaded. Please upload a document first."}), 400
+    if summarize_part is None:
+        return jsonify({"error": "Section summaries require GenAI mode"}), 400
+
+    text = clause_index.text
+    parts = split_parts(text, clause_index)
+    if not 1 <= number <= len(parts):
+        return jsonify({"error": f"No section {number}; the document has {len(parts)}"}), 404
+    part = parts[number - 1]
+    min_length = int(request.args.get("min_length", 150))
+    max_length = int(request.args.get("max_length", 300))
+
+    try:
+        summary, cached = summarize_part(text, part, min_length=min_length, max_length=max_length)
+        return jsonify({
+            "number": part.number,
+            "title": part.title,
+            "summary": summary,
+            "summary_html": render_html(parse_summary(summary)),
+            "cached": cached
+        })
+    except Exception as e:
+        return jsonify({"error": f"Failed to summarise section: {str(e)}"}), 500
+
+@app.route('/obligations', methods=['GET'])
+def obligations():
+    """Deadlines, notice periods, renewal terms, fees and dates in the current document, with verification state."""
+    key, name, clause_index = current_document()
+    if clause_index is None:
+        return jsonify({"error": "No document uploaded. Please upload a document first."}), 400
+    return jsonify(dict(document_obligations(key, clause_index).to_json(), document_name=name))
+
+@app.route('/ask/history', methods=['GET'])
+def question_history():
+    """This session's earlier questions and answers, newest first."""
+    limit = min(max(request.args.get("limit", 50, type=int), 1), 200)
+    return jsonify({"history": persist("question_history", get_session_id(), limit=limit) or []})
+
+@app.route('/clauses/search', methods=['GET'])
+def search_clauses():
+    """Keyword lookup over the clauses of the current document."""
+    _, name, clause_index = current_document()
+    if clause_index is None:
+        return jsonify({"error": "No document uploaded. Please upload a document first."}), 400
+
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "No search terms provided"}), 400
+
+    clause_ids = clause_index.search(query, limit=min(max(request.args.get("limit", 10, type=int), 1), 50))
+    return jsonify({
+        "query": query,
+        "document_name": name,
+        "clauses": [clause_index.describe(clause_id) for clause_id in clause_ids]
+    })
+
+@app.route('/compare', methods=['POST'])
+def compare():
+    """Clause-level comparison of two versions of a document; only changed clauses go to the model."""
+    tracker = admitted_tracker()
+    if request.files:
+        original, revised = request.files.get('original'), request.files.get('revised')
+        if original is None or revised is None or not original.filename or not revised.filename:
+            return jsonify({"error": "Upload both an 'original' and a 'revised' file"}), 400
+        names = (original.filename, revised.filename)
+        with tracker.stage("extract"):
+            texts = [extract_upload(file.filename, file.stream, max_chars=tracker.max_chars + 1,
+                                    on_text=tracker.text_progress()) for file in (original, revised)]
+        if None in texts:
+            return jsonify({"error": "Unsupported file type"}), 400
+    else:
+        data = request.json or {}
+        texts = [data.get('original_text', '').strip(), data.get('revised_text', '').strip()]
+        names = (data.get('original_name', 'Original'), data.get('revised_name', 'Revised'))
+        if not all(texts):
+            return jsonify({"error": "Provide both original_text and revised_text"}), 400
+    original_text, revised_text = (tracker.check_text(text) for text in texts)
+
+    try:
+        with tracker.stage("compare"):
+            comparison = compare_documents(original_text, revised_text)
+        with tracker.stage("analyze"):
+            if explain_changes is not None and not tracker.degraded:
+                explanation = explain_changes(comparison["changes"])
+            else:
+                explanation = describe_changes(comparison, {p["name"]: p["label"] for p in RISK_PATTERNS})
+
+        return jsonify({
+            "original_name": names[0],
+            "revised_name": names[1],
+            "explanation": explanation,
+            "explanation_html": render_html(parse_summary(explanation)),
+            "counts": comparison["counts"],
+            "changes": comparison["changes"],
+            "tokens": {"changed": comparison["tokens_changed"], "full_documents": comparison["tokens_total"]},
+            "memory": tracker.report()
+        })
+    except Exception as e:
+        return jsonify({"error": f"Failed to compare documents: {str(e)}"}), 500
+
 @app.route('/test-formatting', methods=['GET'])
 def test_formatting():
     """Test endpoint to verify bullet point formatting works correctly."""
@@ -211,18 +966,14 @@ def test_formatting():
 * Dispute resolution may be limited to arbitration"""
 
     try:
-        # Test the formatting functions
-        from summariser_genai import format_content_for_display, clean_text_for_pdf, preprocess_text_for_pdf
-        
-        formatted_content = format_content_for_display(test_content)
-        cleaned_content = clean_text_for_pdf(formatted_content)
-        preprocessed_content = preprocess_text_for_pdf(cleaned_content)
+        # The same parse feeds the HTML view and the PDF
+        blocks = parse_summary(test_content)
         
         return jsonify({
             "original": test_content,
-            "formatted": formatted_content,
-            "cleaned": cleaned_content,
-            "preprocessed": preprocessed_content,
+            "blocks": [{"kind": kind, "text": text} for kind, text in blocks],
+            "html": render_html(blocks),
+            "pdf_text": [clean_text_for_pdf(text) for _, text in blocks if text],
             "status": "Formatting test completed successfully"
         })
     except Exception as e:
@@ -237,7 +988,10 @@ def collect_feedback():
         return jsonify({"error": "No feedback provided"}), 400
     
     try:
-        store_feedback(feedback_text)
+        if document_store is not None:
+            document_store.save_feedback(feedback_text, session_id=get_session_id())
+        else:
+            store_feedback(feedback_text)
         return jsonify({"status": "Feedback received"})
     except Exception as e:
         return jsonify({"error": f"Failed to save feedback: {str(e)}"}), 500
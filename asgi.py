@@ -0,0 +1,349 @@
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import urllib.request
+from functools import partial
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route, Mount
+from starlette.middleware import Middleware
+from starlette.middleware.gzip import GZipMiddleware
+
+import app as flask_app
+from app import app, analysis_sessions, analysis_latency, admission, MemoryTracker
+from admission import AdmissionRejected
+from http_cache import COMPRESS_MIN_BYTES, COMPRESS_LEVEL
+from incremental import analyze_incrementally_async
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+# Threads for extraction, clause indexing, rendering and local-model summarisation; in GenAI
+# mode the model calls themselves are awaited, so they do not hold a thread while waiting
+ASGI_CPU_WORKERS = int(os.getenv('ASGI_CPU_WORKERS', str(min(32, (os.cpu_count() or 1) + 4))))
+
+executor = ThreadPoolExecutor(max_workers=ASGI_CPU_WORKERS, thread_name_prefix="asgi-cpu")
+
+async def run_blocking(function, *args, **kwargs):
+    """Run a blocking call on the CPU executor without stalling the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(executor, partial(function, *args, **kwargs))
+
+async def analyze_with_reuse_async(text, name, min_length, max_length, clause_index, previous=None, degraded=False,
+                                   session_id=None, owner=None):
+    """app.analyze_with_reuse, awaiting the model calls in GenAI mode."""
+    if degraded or flask_app.summarize_sections_async is None:
+        return await run_blocking(flask_app.analyze_with_reuse, text, name, min_length, max_length, clause_index,
+                                  previous=previous, degraded=degraded, session_id=session_id, owner=owner)
+
+    reuse, previous = await run_blocking(flask_app.find_reusable_analysis, text, min_length, max_length, previous,
+                                         owner=owner)
+    section_summaries, state, stats = await analyze_incrementally_async(
+        previous, text, flask_app.split_into_sections, flask_app.summarize_sections_async,
+        flask_app.revise_sections_async, min_length=min_length, max_length=max_length, clause_index=clause_index)
+    await run_blocking(flask_app.record_analysis, reuse, text, name, state, stats, session_id=session_id)
+    return section_summaries, state, stats
+
+class ForegroundMiddleware:
+    """Marks native routes as foreground work so background jobs wait for them (Flask routes mark themselves)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in NATIVE_PATHS:
+            return await self.app(scope, receive, send)
+        with flask_app.idle_scheduler.foreground():
+            await self.app(scope, receive, send)
+
+NATIVE_PATHS = {'/upload', '/analyze-text', '/ask'}
+
+class AdmissionMiddleware:
+    """Admission control for native routes (Flask routes are admitted by the Flask app)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        kind = ADMISSION_PATHS.get(scope["path"]) if scope["type"] == "http" else None
+        if kind is None:
+            return await self.app(scope, receive, send)
+        try:
+            ticket = await admission.enter_async(kind)
+        except AdmissionRejected as e:
+            response = JSONResponse({"error": "The server is busy. Please try again shortly.",
+                                     "retry_after": e.retry_after},
+                                    status_code=429, headers={"Retry-After": str(e.retry_after)})
+            return await response(scope, receive, send)
+        scope.setdefault("state", {})["admission"] = ticket
+        with ticket:
+            await self.app(scope, receive, send)
+
+ADMISSION_PATHS = {'/upload': 'analyze', '/analyze-text': 'analyze', '/ask': 'ask'}
+
+def admitted_tracker(request):
+    tracker = MemoryTracker()
+    tracker.degraded = request.state.admission.degraded
+    return tracker
+
+class BodyTooLarge(Exception):
+    pass
+
+class BodyLimitMiddleware:
+    """Rejects native-route bodies over MAX_CONTENT_LENGTH with a 413.
+
+    A declared Content-Length is checked before anything is read; chunked
+    uploads declare none, so the bytes are also counted as they arrive.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in NATIVE_PATHS:
+            return await self.app(scope, receive, send)
+        limit = app.config['MAX_CONTENT_LENGTH']
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > limit:
+            return await self.too_large(scope)(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise BodyTooLarge()
+            return message
+
+        try:
+            await self.app(scope, limited_receive, send)
+        except BodyTooLarge:
+            await self.too_large(scope)(scope, receive, send)
+
+    @staticmethod
+    def too_large(scope):
+        return JSONResponse({"error": "File too large" if scope["path"] == '/upload' else "Request too large"},
+                            status_code=413)
+
+async def json_body(request):
+    """The request's JSON object, or None if the body is not one."""
+    try:
+        data = await request.json()
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+def with_session_cookie(request, response, session_id):
+    if request.cookies.get('session_id') != session_id:
+        response.set_cookie('session_id', session_id, httponly=True, samesite='lax')
+    return response
+
+async def upload_file(request):
+    form = await request.form()
+    file = form.get('file')
+    if file is None or isinstance(file, str):
+        return JSONResponse({"error": "No file part"}, status_code=400)
+    if file.filename == '':
+        return JSONResponse({"error": "No selected file"}, status_code=400)
+
+    custom_min_length = int(form.get("min_length", 150))
+    custom_max_length = int(form.get("max_length", 300))
+
+    tracker = admitted_tracker(request)
+    session_id = flask_app.valid_session_id(request.cookies.get('session_id', ''))
+
+    try:
+        with tracker.stage("extract"):
+            text = await run_blocking(flask_app.extract_upload, file.filename, file.file, max_chars=tracker.max_chars + 1,
+                                      on_text=tracker.text_progress())
+        if text is None:
+            return JSONResponse({"error": "Unsupported file type"}, status_code=400)
+        text = tracker.check_text(text)
+
+        with tracker.stage("index"):
+            document = await run_blocking(flask_app.set_current_document, text, file.filename)
+
+        with tracker.stage("analyze"):
+            section_summaries, _, analysis_stats = await analyze_with_reuse_async(
+                text, file.filename, custom_min_length, custom_max_length, document[2],
+                degraded=tracker.degraded, owner=session_id)
+            summary_blocks = await run_blocking(flask_app.compile_summary, section_summaries, analysis_stats)
+        analysis_latency.record(custom_max_length, analysis_stats["mode"], tracker.stages[-1]["seconds"])
+
+        flask_app.schedule_precompute(document[0], tracker)
+        body = await run_blocking(flask_app.summary_response, summary_blocks, document, text, tracker,
+                                  near_duplicate=analysis_stats.get("near_duplicate"),
+                                  admission=request.state.admission.report())
+        return with_session_cookie(request, JSONResponse(body), session_id)
+
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+    finally:
+        await file.close()
+
+async def analyze_text(request):
+    data = await json_body(request)
+    if data is None:
+        return JSONResponse({"error": "Request body must be a JSON object"}, status_code=400)
+    text = data.get('text', '').strip()
+
+    if not text:
+        return JSONResponse({"error": "No text provided"}, status_code=400)
+
+    custom_min_length = int(data.get("min_length", 150))
+    custom_max_length = int(data.get("max_length", 300))
+
+    tracker = admitted_tracker(request)
+    text = tracker.check_text(text)
+    session_id = flask_app.valid_session_id(request.cookies.get('session_id', ''))
+
+    try:
+        with tracker.stage("index"):
+            document = await run_blocking(flask_app.set_current_document, text, "Pasted Text")
+
+        with tracker.stage("analyze"):
+            previous = await run_blocking(flask_app.session_analysis, session_id)
+            section_summaries, state, incremental_stats = await analyze_with_reuse_async(
+                text, "Pasted Text", custom_min_length, custom_max_length, document[2],
+                previous=previous, degraded=tracker.degraded, session_id=session_id, owner=session_id)
+            analysis_sessions.set(session_id, state)
+            summary_blocks = await run_blocking(flask_app.compile_summary, section_summaries, incremental_stats)
+        analysis_latency.record(custom_max_length, incremental_stats["mode"], tracker.stages[-1]["seconds"])
+
+        body = await run_blocking(flask_app.summary_response, summary_blocks, document, text, tracker,
+                                  incremental=incremental_stats, admission=request.state.admission.report())
+        return with_session_cookie(request, JSONResponse(body), session_id)
+
+    except Exception as e:
+        return with_session_cookie(request, JSONResponse({"error": str(e)}, status_code=500), session_id)
+
+async def ask_question(request):
+    data = await json_body(request)
+    if data is None:
+        return JSONResponse({"error": "Request body must be a JSON object"}, status_code=400)
+    question = data.get("question", "").strip()
+
+    if not question:
+        return JSONResponse({"error": "No question provided"}, status_code=400)
+
+    # Capture the document once; another upload may replace it while the answer is awaited
+    key, name, clause_index = flask_app.current_document()
+    if clause_index is None:
+        return JSONResponse({"error": "No document uploaded. Please upload a document first."}, status_code=400)
+    session_id = flask_app.valid_session_id(request.cookies.get('session_id', ''))
+    try:
+        answer = await run_blocking(flask_app.cached_answer, key, question)
+        cached = answer is not None
+        history = []
+        if not cached:
+            history = flask_app.conversations.turns(session_id, key)
+            context = await run_blocking(flask_app.question_context, key, clause_index)
+            text = await run_blocking(flask_app.question_text, clause_index, context)
+            if flask_app.answer_question_async is not None:
+                answer = await flask_app.answer_question_async(text, question, context=context, history=history)
+            else:
+                answer = await run_blocking(flask_app.answer_question, text, question, context=context, history=history)
+        await run_blocking(flask_app.remember_answer, answer, key, question, session_id, history=history,
+                           cached=cached)
+        return with_session_cookie(request, JSONResponse({
+            "answer": answer,
+            "question": question,
+            "document_name": name,
+            "cached": cached
+        }), session_id)
+    except Exception as e:
+        return JSONResponse({"error": f"Failed to answer question: {str(e)}"}, status_code=500)
+
+@asynccontextmanager
+async def lifespan(_):
+    yield
+    executor.shutdown(wait=False)
+
+# The analysis routes are served natively; every other route is the Flask app, run in a thread
+application = Starlette(routes=[
+    Route('/upload', upload_file, methods=['POST']),
+    Route('/analyze-text', analyze_text, methods=['POST']),
+    Route('/ask', ask_question, methods=['POST']),
+    Mount('/', app=WSGIMiddleware(app)),
+], middleware=[
+    # Flask responses arrive already compressed and are passed through unchanged
+    Middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_BYTES, compresslevel=COMPRESS_LEVEL),
+    Middleware(BodyLimitMiddleware), Middleware(ForegroundMiddleware), Middleware(AdmissionMiddleware)],
+    lifespan=lifespan)
+
+def _timed_post(url, body):
+    data = json.dumps(body).encode('utf-8')
+    started = time.perf_counter()
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=600) as response:
+            response.read()
+            ok = response.status == 200
+    except Exception:
+        ok = False
+    return time.perf_counter() - started, ok
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else None
+
+def benchmark(base_url, endpoint="/ask", requests=512, concurrency=128, document=None):
+    """Latency and throughput of one server under `concurrency` simultaneous clients.
+
+    Each /ask request asks a different question so none is served from the answer cache.
+    """
+    base_url = base_url.rstrip('/')
+    if endpoint == "/ask":
+        _timed_post(base_url + "/analyze-text", {"text": document})
+        bodies = [{"question": f"What does the agreement say about termination? ({uuid.uuid4().hex})"}
+                  for _ in range(requests)]
+    else:
+        bodies = [{"text": f"{document}\n\nReference {uuid.uuid4().hex}."} for _ in range(requests)]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(partial(_timed_post, base_url + endpoint), bodies))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(seconds for seconds, ok in results if ok)
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": sum(1 for _, ok in results if not ok),
+        "p50_seconds": round(_percentile(latencies, 0.5), 3) if latencies else None,
+        "p95_seconds": round(_percentile(latencies, 0.95), 3) if latencies else None,
+        "requests_per_second": round(len(latencies) / elapsed, 2)
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the WSGI (gunicorn) and ASGI (uvicorn) servers under load.")
+    parser.add_argument("--wsgi-url", default="http://localhost:8080")
+    parser.add_argument("--asgi-url", default="http://localhost:8081")
+    parser.add_argument("--endpoint", default="/ask", choices=["/ask", "/analyze-text"])
+    parser.add_argument("--requests", type=int, default=512)
+    parser.add_argument("--concurrency", type=int, default=128)
+    parser.add_argument("--document", help="Text file analysed first (and, for /analyze-text, resubmitted)")
+    args = parser.parse_args(argv)
+
+    if args.document:
+        with open(args.document, 'r', encoding='utf-8') as file:
+            document = file.read()
+    else:
+        document = "\n\n".join(f"{n}. The Supplier shall deliver the Services described in Schedule {n} "
+                               f"within thirty days of each purchase order." for n in range(1, 21))
+
+    results = {name: benchmark(url, args.endpoint, args.requests, args.concurrency, document)
+               for name, url in (("wsgi", args.wsgi_url), ("asgi", args.asgi_url))}
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    sys.exit(main())
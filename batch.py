@@ -0,0 +1,230 @@
+import os
+import sys
+import json
+import time
+import zipfile
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from extractors import extract_text_from_pdf, extract_text_from_docx
+from incremental import content_hash
+from memory_budget import MAX_DOCUMENT_CHARS
+
+SUPPORTED_EXTENSIONS = ('.txt', '.pdf', '.docx')
+
+EXTRACT_WORKERS = int(os.getenv('BATCH_EXTRACT_WORKERS', str(os.cpu_count() or 2)))
+ANALYSIS_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '4'))
+# Documents started per minute; a GenAI analysis makes one structured Gemini call (two without JSON output)
+DOCUMENTS_PER_MINUTE = float(os.getenv('BATCH_DOCUMENTS_PER_MINUTE', '12'))
+
+# Largest document read from a batch, matching the 8 MB upload limit, and the largest
+# uncompressed-to-compressed size ratio accepted for an archive member (zip bombs exceed both)
+MAX_DOCUMENT_BYTES = int(os.getenv('BATCH_MAX_DOCUMENT_BYTES', str(8 * 1024 * 1024)))
+MAX_COMPRESSION_RATIO = float(os.getenv('BATCH_MAX_COMPRESSION_RATIO', '100'))
+
+class RateLimiter:
+    """Space out calls so no more than `per_minute` start in any minute."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+def list_sources(path):
+    """Supported documents in a directory tree or ZIP archive, as (kind, container, name) tuples."""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            return [("zip", path, name) for name in sorted(archive.namelist())
+                    if name.lower().endswith(SUPPORTED_EXTENSIONS) and not name.startswith('__MACOSX/')]
+
+    sources = []
+    for root, _, files in os.walk(path):
+        for name in sorted(files):
+            if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                full_path = os.path.join(root, name)
+                sources.append(("dir", path, os.path.relpath(full_path, path)))
+    return sorted(sources)
+
+def _read_bounded(file, name):
+    """Read at most MAX_DOCUMENT_BYTES, failing rather than reading on past the limit."""
+    data = file.read(MAX_DOCUMENT_BYTES + 1)
+    if len(data) > MAX_DOCUMENT_BYTES:
+        raise ValueError(f"{name} is larger than {MAX_DOCUMENT_BYTES} bytes")
+    return data
+
+def check_member(info):
+    """Reject an archive member whose declared size or compression ratio is too large to extract."""
+    if info.file_size > MAX_DOCUMENT_BYTES:
+        raise ValueError(f"{info.filename} is larger than {MAX_DOCUMENT_BYTES} bytes")
+    if info.file_size > max(info.compress_size, 1) * MAX_COMPRESSION_RATIO:
+        raise ValueError(f"{info.filename} is compressed more than {MAX_COMPRESSION_RATIO:g}:1")
+
+def extract_source(source):
+    """Extract one document's text. Runs in a worker process."""
+    kind, container, name = source
+    if kind == "zip":
+        with zipfile.ZipFile(container) as archive:
+            info = archive.getinfo(name)
+            check_member(info)
+            # The declared size can lie, so the read itself is bounded too
+            with archive.open(info) as member:
+                data = _read_bounded(member, name)
+    else:
+        with open(os.path.join(container, name), 'rb') as file:
+            data = _read_bounded(file, name)
+
+    lower_name = name.lower()
+    if lower_name.endswith('.txt'):
+        return data.decode('utf-8', errors='replace')[:MAX_DOCUMENT_CHARS + 1]
+    if lower_name.endswith('.pdf'):
+        # Documents are already extracted in parallel, so OCR each one's pages in this worker
+        return extract_text_from_pdf(data, max_chars=MAX_DOCUMENT_CHARS + 1, ocr_parallel=False)
+    return extract_text_from_docx(data, max_chars=MAX_DOCUMENT_CHARS + 1)
+
+def load_completed(output_path):
+    """Sources and content hashes already recorded in a results file, for resuming."""
+    completed_sources = set()
+    completed_hashes = {}
+    if not os.path.exists(output_path):
+        return completed_sources, completed_hashes
+
+    with open(output_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # partial line from an interrupted run
+            if record.get("status") == "error":
+                continue
+            completed_sources.add(record["source"])
+            if record.get("status") == "ok":
+                completed_hashes[record["content_hash"]] = record["source"]
+    return completed_sources, completed_hashes
+
+def run_batch(path, output_path, analyze, extract_workers=EXTRACT_WORKERS,
+              concurrency=ANALYSIS_CONCURRENCY, documents_per_minute=DOCUMENTS_PER_MINUTE, progress=None):
+    """Extract, deduplicate and analyse every document under `path`, appending JSONL records.
+
+    `analyze(text)` returns a dict of result fields for one document. Sources
+    already present in `output_path` are skipped, so an interrupted run can be
+    restarted with the same arguments.
+    """
+    completed_sources, seen_hashes = load_completed(output_path)
+    pending = [source for source in list_sources(path) if source[2] not in completed_sources]
+    stats = {"total": len(pending) + len(completed_sources), "skipped": len(completed_sources),
+             "analyzed": 0, "duplicates": 0, "errors": 0}
+
+    limiter = RateLimiter(documents_per_minute)
+    write_lock = threading.Lock()
+    hash_lock = threading.Lock()
+
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    with open(output_path, 'a', encoding='utf-8') as output:
+
+        def write(record, counter):
+            with write_lock:
+                output.write(json.dumps(record) + "\n")
+                output.flush()
+                stats[counter] += 1
+                if progress:
+                    progress(dict(stats))
+
+        def analyze_one(name, text, text_hash):
+            limiter.wait()
+            started = time.perf_counter()
+            try:
+                result = analyze(text)
+            except Exception as e:
+                write({"source": name, "content_hash": text_hash, "status": "error", "error": str(e)}, "errors")
+                return
+            record = {"source": name, "content_hash": text_hash, "status": "ok", "chars": len(text),
+                      "seconds": round(time.perf_counter() - started, 2)}
+            record.update(result)
+            write(record, "analyzed")
+
+        with ProcessPoolExecutor(max_workers=extract_workers) as extract_pool, \
+                ThreadPoolExecutor(max_workers=concurrency) as analysis_pool:
+            extractions = {extract_pool.submit(extract_source, source): source for source in pending}
+            analyses = []
+
+            for future in as_completed(extractions):
+                name = extractions[future][2]
+                try:
+                    text = future.result()
+                except Exception as e:
+                    write({"source": name, "status": "error", "error": f"Extraction failed: {e}"}, "errors")
+                    continue
+
+                text_hash = content_hash(text)
+                with hash_lock:
+                    original = seen_hashes.get(text_hash)
+                    if original is None:
+                        seen_hashes[text_hash] = name
+                if original is not None:
+                    write({"source": name, "content_hash": text_hash, "status": "duplicate", "duplicate_of": original}, "duplicates")
+                    continue
+
+                analyses.append(analysis_pool.submit(analyze_one, name, text, text_hash))
+
+            for future in as_completed(analyses):
+                future.result()
+
+    return stats
+
+def export_parquet(jsonl_path, parquet_path):
+    """Convert a JSONL results file to Parquet (requires pyarrow)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    records = []
+    with open(jsonl_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            # Nested dicts vary per mode, so store them as JSON strings
+            records.append({key: json.dumps(value) if isinstance(value, (dict, list)) else value
+                            for key, value in record.items()})
+    pq.write_table(pa.Table.from_pylist(records), parquet_path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse a directory or ZIP of TXT, PDF and DOCX documents.")
+    parser.add_argument("source", help="Directory or .zip file of documents")
+    parser.add_argument("-o", "--output", default="batch_results.jsonl", help="JSONL results file (appended to and used for resuming)")
+    parser.add_argument("--parquet", help="Also write the results to this Parquet file when done")
+    parser.add_argument("--workers", type=int, default=EXTRACT_WORKERS, help="Extraction processes")
+    parser.add_argument("--concurrency", type=int, default=ANALYSIS_CONCURRENCY, help="Documents analysed at once")
+    parser.add_argument("--per-minute", type=float, default=DOCUMENTS_PER_MINUTE, help="Maximum documents started per minute")
+    args = parser.parse_args(argv)
+
+    # Importing the app selects the best available mode (GenAI, HF or Lite)
+    from app import analyze_document, AI_MODE
+    print(f"Analysing {args.source} in {AI_MODE} mode")
+
+    def report(stats):
+        done = stats["skipped"] + stats["analyzed"] + stats["duplicates"] + stats["errors"]
+        print(f"\r{done}/{stats['total']} documents ({stats['duplicates']} duplicates, {stats['errors']} errors)", end="", flush=True)
+
+    stats = run_batch(args.source, args.output, analyze_document, extract_workers=args.workers,
+                      concurrency=args.concurrency, documents_per_minute=args.per_minute, progress=report)
+    print()
+    print(json.dumps(stats))
+
+    if args.parquet:
+        export_parquet(args.output, args.parquet)
+        print(f"Wrote {args.parquet}")
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,273 @@
+import os
+import re
+import json
+import bisect
+import math
+from incremental import content_hash
+from compact_text import CompressedChunks
+
+# Risk patterns scanned for in every clause. Override with a JSON list of
+# {"name", "label", "severity", "pattern"} objects via RISK_PATTERNS_FILE.
+DEFAULT_RISK_PATTERNS = [
+    {"name": "auto_renewal", "label": "Automatic renewal", "severity": "HIGH",
+     "pattern": r"\bautomatic(?:ally)?\s+renew|\brenew(?:s|ed|al)?\s+automatically|\bauto-?renew"},
+    {"name": "arbitration", "label": "Arbitration / waiver of court", "severity": "HIGH",
+     "pattern": r"\barbitrat(?:ion|or|e)\b|\bclass[- ]action\s+waiver|\bwaive\w*\s+(?:your|any)\s+right\s+to\s+(?:a\s+)?(?:jury|court|class)"},
+    {"name": "indemnity", "label": "Indemnification", "severity": "HIGH",
+     "pattern": r"\bindemnif(?:y|ies|ied|ication)\b|\bhold\s+(?:us\s+)?harmless"},
+    {"name": "liability_cap", "label": "Limitation of liability", "severity": "MEDIUM",
+     "pattern": r"\blimitation\s+of\s+liability\b|\bliability\b.{0,80}?\b(?:shall\s+not\s+exceed|limited\s+to)\b|\bin\s+no\s+event\s+shall\b"},
+    {"name": "unilateral_changes", "label": "Terms can change unilaterally", "severity": "MEDIUM",
+     "pattern": r"\b(?:modify|change|amend|update)\b.{0,80}?\b(?:at\s+any\s+time|sole\s+discretion|without\s+(?:prior\s+)?notice)"},
+    {"name": "termination", "label": "Termination without cause", "severity": "MEDIUM",
+     "pattern": r"\bterminat\w*\b.{0,80}?\b(?:at\s+any\s+time|for\s+any\s+reason|without\s+(?:cause|notice))"},
+    {"name": "data_sharing", "label": "Data shared with third parties", "severity": "MEDIUM",
+     "pattern": r"\b(?:share|sell|disclose|transfer)\w*\b.{0,80}?\bthird[- ]part(?:y|ies)"},
+]
+
+SEVERITY_ORDER = ["HIGH", "MEDIUM", "LOW"]
+
+# "1.", "2)", "3.1" or "4.2.1" followed by the heading; a bare "30 days' notice" is a wrapped line, not a clause
+NUMBERED_HEADING = re.compile(r'^\s*((?:\d+\.)+\d+\.?|\d+[.)])\s+(\S.*)$')
+HEADING_MAX_CHARS = 60
+ARTICLE_HEADING = re.compile(r'^\s*(?:ARTICLE|Article|SECTION|Section|CLAUSE|Clause)\s+([0-9IVXLC]+(?:\.\d+)*)\b[.:\-\s]*(.*)$')
+TERM = re.compile(r'[a-z0-9]+')
+
+STOP_WORDS = {
+    "the", "and", "for", "are", "but", "not", "you", "your", "any", "all", "can", "our", "was",
+    "with", "this", "that", "from", "have", "has", "will", "shall", "may", "such", "which",
+    "its", "their", "they", "them", "been", "being", "other", "than", "into", "upon", "under",
+}
+
+def load_risk_patterns():
+    """Risk patterns from RISK_PATTERNS_FILE if set, otherwise the built-in list."""
+    patterns_file = os.getenv('RISK_PATTERNS_FILE')
+    patterns = DEFAULT_RISK_PATTERNS
+    if patterns_file:
+        try:
+            with open(patterns_file, 'r', encoding='utf-8') as file:
+                patterns = json.load(file)
+        except Exception as e:
+            print(f"Could not load risk patterns from {patterns_file}: {e}")
+    return [dict(p, regex=re.compile(p["pattern"], re.IGNORECASE | re.DOTALL)) for p in patterns]
+
+RISK_PATTERNS = load_risk_patterns()
+
+class Clause:
+    """One clause: its heading, nesting level and character span in the document."""
+    __slots__ = ("number", "heading", "level", "start", "end")
+
+    def __init__(self, number, heading, level, start, end):
+        self.number = number
+        self.heading = heading
+        self.level = level
+        self.start = start
+        self.end = end
+
+def _looks_like_heading(number, text):
+    """True if the text after a clause number starts a clause rather than continuing a wrapped sentence.
+
+    Sub-clause numbers ("2.1") only need a capitalised text; a single
+    number ("4.") also needs a short heading ("Termination") or a
+    title-case one ("Limitation of Liability ...").
+    """
+    if not text[0].isupper():
+        return False
+    if '.' in number.rstrip('.') or len(text) <= HEADING_MAX_CHARS:
+        return True
+    words = [word for word in text.split()[:4] if len(word) > 3]
+    return bool(words) and all(word[0].isupper() for word in words)
+
+def _heading_for(line):
+    """Return (number, heading, level) if the line starts a clause, else None."""
+    stripped = line.strip()
+    if not stripped:
+        return None
+
+    match = ARTICLE_HEADING.match(stripped)
+    if match:
+        number = match.group(1)
+        return number, stripped[:120], number.count('.') + 1
+
+    match = NUMBERED_HEADING.match(stripped)
+    if match and _looks_like_heading(match.group(1), match.group(2)):
+        number = match.group(1).rstrip('.)')
+        return number, stripped[:120], number.count('.') + 1
+
+    # Short all-caps lines ("TERMINATION", "GOVERNING LAW") head the numbered clauses below them
+    letters = [c for c in stripped if c.isalpha()]
+    if 3 <= len(stripped) <= 80 and letters and stripped.isupper() and not stripped.endswith('.'):
+        return "", stripped, 0
+
+    return None
+
+class ClauseIndex:
+    """Clause boundaries, heading tree, term index and risk-pattern matches for one document.
+
+    The document's text is kept compressed, clause by clause, so reading a
+    few clauses decompresses only the blocks that hold them.
+    """
+
+    def __init__(self, text, risk_patterns=None):
+        self.chars = len(text)
+        self.clauses = []
+        self.tree = []
+        self.postings = {}
+        self.risk_matches = {}
+        self._split_clauses(text)
+        self._build_tree()
+        self._build_postings(text)
+        self._match_risks(text, RISK_PATTERNS if risk_patterns is None else risk_patterns)
+        spans = [text[clause.start:clause.end] for clause in self.clauses]
+        self._spans = CompressedChunks(spans, [content_hash(span) for span in spans])
+
+    @property
+    def text(self):
+        """The whole document, decompressed on each access; prefer clause_text for parts of it."""
+        return "".join(self._spans)
+
+    @property
+    def nbytes(self):
+        """Bytes held for the compressed text."""
+        return self._spans.nbytes
+
+    def clause_text(self, clause_id):
+        return self._spans[clause_id].strip()
+
+    def prefix(self, max_chars):
+        """The first max_chars characters of the document, decompressing only the blocks they span."""
+        parts = []
+        used = 0
+        for span in self._spans:
+            if used >= max_chars:
+                break
+            parts.append(span[:max_chars - used])
+            used += len(parts[-1])
+        return "".join(parts)
+
+    def _split_clauses(self, text):
+        boundaries = []
+        offset = 0
+        for line in text.splitlines(keepends=True):
+            heading = _heading_for(line)
+            if heading:
+                boundaries.append((offset, heading))
+            offset += len(line)
+
+        if not boundaries or boundaries[0][0] > 0:
+            boundaries.insert(0, (0, ("", "Preamble", 0)))
+
+        for i, (start, (number, heading, level)) in enumerate(boundaries):
+            end = boundaries[i + 1][0] if i + 1 < len(boundaries) else len(text)
+            self.clauses.append(Clause(number, heading, level, start, end))
+
+    def _build_tree(self):
+        stack = []
+        for clause_id, clause in enumerate(self.clauses):
+            node = {"clause": clause_id, "heading": clause.heading, "children": []}
+            while stack and stack[-1][0] >= clause.level:
+                stack.pop()
+            (stack[-1][1]["children"] if stack else self.tree).append(node)
+            stack.append((clause.level, node))
+
+    def _build_postings(self, text):
+        for clause_id, clause in enumerate(self.clauses):
+            for term in set(TERM.findall(text[clause.start:clause.end].lower())):
+                if len(term) > 2 and term not in STOP_WORDS:
+                    self.postings.setdefault(term, []).append(clause_id)
+
+    def _match_risks(self, text, risk_patterns):
+        # Scan the whole text once per pattern and map match offsets back to clauses
+        starts = [clause.start for clause in self.clauses]
+        for pattern in risk_patterns:
+            clause_ids = []
+            for match in pattern["regex"].finditer(text):
+                clause_id = bisect.bisect_right(starts, match.start()) - 1
+                if not clause_ids or clause_ids[-1] != clause_id:
+                    clause_ids.append(clause_id)
+            if clause_ids:
+                self.risk_matches[pattern["name"]] = (pattern, clause_ids)
+
+    def search(self, query, limit=10):
+        """Clause ids containing every term of the query, in document order."""
+        terms = [t for t in TERM.findall(query.lower()) if len(t) > 2 and t not in STOP_WORDS]
+        if not terms:
+            return []
+        postings = sorted((self.postings.get(term, []) for term in terms), key=len)
+        matches = set(postings[0])
+        for posting in postings[1:]:
+            matches.intersection_update(posting)
+        return sorted(matches)[:limit]
+
+    def rank(self, query, limit=10):
+        """Clause ids sharing terms with the query, most relevant first; rarer terms count for more.
+
+        Terms of five letters or more also match words with the same first
+        five letters, so "terminate" finds "termination".
+        """
+        scores = {}
+        clause_count = len(self.clauses)
+        for term in {t for t in TERM.findall(query.lower()) if len(t) > 2 and t not in STOP_WORDS}:
+            if len(term) >= 5:
+                matched = [key for key in self.postings if key.startswith(term[:5])]
+            else:
+                matched = [term] if term in self.postings else []
+            clause_ids = {clause_id for key in matched for clause_id in self.postings[key]}
+            if not clause_ids:
+                continue
+            weight = math.log(1 + clause_count / len(clause_ids))
+            exact = set(self.postings.get(term, ()))
+            for clause_id in clause_ids:
+                # A prefix match ("termination" for "terminate") counts half
+                scores[clause_id] = scores.get(clause_id, 0.0) + (weight if clause_id in exact else weight / 2)
+        return sorted(scores, key=lambda clause_id: (-scores[clause_id], clause_id))[:limit]
+
+    def risk_clause_ids(self):
+        """Ids of clauses matching any risk pattern, in document order."""
+        return sorted({clause_id for _, clause_ids in self.risk_matches.values() for clause_id in clause_ids})
+
+    def risk_context(self, max_chars=25000):
+        """Text of the risk-candidate clauses, for focused risk prompts."""
+        parts = []
+        used = 0
+        for clause_id in self.risk_clause_ids():
+            clause_text = self.clause_text(clause_id)
+            if used + len(clause_text) > max_chars:
+                break
+            parts.append(clause_text)
+            used += len(clause_text) + 2
+        return "\n\n".join(parts)
+
+    def risk_flags(self):
+        """Number of matching clauses per risk pattern."""
+        return {name: len(clause_ids) for name, (_, clause_ids) in self.risk_matches.items()}
+
+    def describe(self, clause_id, snippet_length=160):
+        """JSON-friendly summary of a clause."""
+        clause = self.clauses[clause_id]
+        text = " ".join(self.clause_text(clause_id).split())
+        return {
+            "id": clause_id,
+            "number": clause.number,
+            "heading": clause.heading,
+            "snippet": text[:snippet_length] + ("..." if len(text) > snippet_length else "")
+        }
+
+def build_clause_index(text, risk_patterns=None):
+    """Build the clause index for a freshly extracted document."""
+    return ClauseIndex(text, risk_patterns)
+
+def format_risk_findings(clause_index, snippet_length=160):
+    """Plain-text list of risk-pattern matches, most severe first."""
+    findings = sorted(
+        clause_index.risk_matches.values(),
+        key=lambda item: SEVERITY_ORDER.index(item[0]["severity"]) if item[0]["severity"] in SEVERITY_ORDER else len(SEVERITY_ORDER)
+    )
+    lines = []
+    for pattern, clause_ids in findings:
+        for clause_id in clause_ids:
+            clause = clause_index.describe(clause_id, snippet_length)
+            # Short lines are real headings; long ones are numbered clauses with no title
+            location = clause["heading"] if len(clause["heading"]) <= 60 else f"Clause {clause['number']}"
+            lines.append(f"{len(lines) + 1}. [{pattern['severity']}] {pattern['label']} ({location}): {clause['snippet']}")
+    return "\n".join(lines)
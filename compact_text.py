@@ -0,0 +1,161 @@
+import os
+import sys
+import zlib
+import bisect
+from array import array
+from collections.abc import Mapping, Sequence
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Codec for stored document text: 'zstd' (needs the zstandard package), 'zlib' or 'none'
+TEXT_COMPRESSION = os.getenv('TEXT_COMPRESSION', 'zstd' if zstandard is not None else 'zlib')
+TEXT_COMPRESSION_LEVEL = int(os.getenv('TEXT_COMPRESSION_LEVEL', '6'))
+# Chunks are compressed together in blocks of about this many characters; reading a chunk decompresses its block only
+TEXT_BLOCK_CHARS = int(os.getenv('TEXT_BLOCK_CHARS', '16384'))
+
+DIGEST_SIZE = 32  # bytes of a SHA-256 content hash
+
+if TEXT_COMPRESSION == 'zstd' and zstandard is not None:
+    _compress = zstandard.ZstdCompressor(level=TEXT_COMPRESSION_LEVEL).compress
+    _decompress = zstandard.ZstdDecompressor().decompress
+elif TEXT_COMPRESSION == 'none':
+    _compress = _decompress = bytes
+else:
+    _compress = lambda data: zlib.compress(data, TEXT_COMPRESSION_LEVEL)  # noqa: E731
+    _decompress = zlib.decompress
+
+class ChunkBlock:
+    """Consecutive chunks compressed together, with their content hashes and end offsets packed alongside."""
+    __slots__ = ("data", "digests", "ends")
+
+    def __init__(self, chunks, keys):
+        self.data = _compress("".join(chunks).encode('utf-8'))
+        self.digests = b"".join(bytes.fromhex(key) for key in keys)
+        self.ends = array('I')
+        offset = 0
+        for chunk in chunks:
+            offset += len(chunk)
+            self.ends.append(offset)
+
+    def text(self):
+        return _decompress(self.data).decode('utf-8')
+
+    def chunk(self, text, index):
+        return text[self.ends[index - 1] if index else 0:self.ends[index]]
+
+    def find(self, digest):
+        """Position of the chunk with this content hash in the block, or -1."""
+        position = self.digests.find(digest)
+        while position != -1 and position % DIGEST_SIZE:
+            position = self.digests.find(digest, position + 1)
+        return position // DIGEST_SIZE if position != -1 else -1
+
+    @property
+    def nbytes(self):
+        return (sys.getsizeof(self) + sys.getsizeof(self.data) + sys.getsizeof(self.digests)
+                + sys.getsizeof(self.ends))
+
+class CompressedChunks(Sequence):
+    """A document's paragraph chunks in order (``keys`` are their content hashes), held compressed.
+
+    Consecutive chunks share a compressed block so that short paragraphs
+    still compress well. Reading one chunk decompresses only its block.
+    """
+    __slots__ = ("blocks", "chars", "nbytes", "raw_nbytes", "_first")
+
+    def __init__(self, chunks, keys, block_chars=TEXT_BLOCK_CHARS):
+        keys = list(keys)
+        self.blocks = []
+        self._first = array('I')  # index of each block's first chunk
+        start, size = 0, 0
+        for index, chunk in enumerate(chunks):
+            if index > start and size + len(chunk) > block_chars:
+                self._add_block(chunks, keys, start, index)
+                start, size = index, 0
+            size += len(chunk)
+        if start < len(chunks):
+            self._add_block(chunks, keys, start, len(chunks))
+
+        self.chars = sum(len(chunk) for chunk in chunks)
+        # What the chunks and their hashes take as plain strings, against what is held now
+        self.raw_nbytes = sum(sys.getsizeof(chunk) + sys.getsizeof(key) for chunk, key in zip(chunks, keys))
+        self.nbytes = (sys.getsizeof(self) + sys.getsizeof(self.blocks) + sys.getsizeof(self._first)
+                       + sum(block.nbytes for block in self.blocks))
+
+    def _add_block(self, chunks, keys, start, end):
+        self._first.append(start)
+        self.blocks.append(ChunkBlock(chunks[start:end], keys[start:end]))
+
+    def _locate(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("chunk index out of range")
+        block = bisect.bisect_right(self._first, index) - 1
+        return self.blocks[block], index - self._first[block]
+
+    def __len__(self):
+        return sum(len(block.ends) for block in self.blocks)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        block, position = self._locate(index)
+        return block.chunk(block.text(), position)
+
+    def __iter__(self):
+        for block in self.blocks:
+            text = block.text()
+            for position in range(len(block.ends)):
+                yield block.chunk(text, position)
+
+    def index_of(self, key):
+        """Index of the first chunk with this content hash, or -1."""
+        digest = bytes.fromhex(key)
+        for first, block in zip(self._first, self.blocks):
+            position = block.find(digest)
+            if position != -1:
+                return first + position
+        return -1
+
+    def keys(self):
+        """Content hashes of the chunks, in order."""
+        return [block.digests[i:i + DIGEST_SIZE].hex()
+                for block in self.blocks for i in range(0, len(block.digests), DIGEST_SIZE)]
+
+    def text(self):
+        """The document as paragraphs separated by blank lines (splits back into the same chunks)."""
+        return "\n\n".join(self)
+
+class ChunkMap(Mapping):
+    """Read-only {content hash: chunk text} view of CompressedChunks, as kept in analysis state.
+
+    Lookups scan the packed hashes rather than keeping a dict, so the view
+    adds no memory; iterate it once into a set for repeated membership tests.
+    """
+    __slots__ = ("chunks",)
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def __getitem__(self, key):
+        index = self.chunks.index_of(key)
+        if index == -1:
+            raise KeyError(key)
+        return self.chunks[index]
+
+    def __contains__(self, key):
+        return self.chunks.index_of(key) != -1
+
+    def __iter__(self):
+        return iter(dict.fromkeys(self.chunks.keys()))
+
+    def __len__(self):
+        return len(set(self.chunks.keys()))
+
+    @property
+    def nbytes(self):
+        return self.chunks.nbytes
@@ -0,0 +1,201 @@
+import os
+import re
+from difflib import SequenceMatcher
+from clause_index import build_clause_index, TERM, STOP_WORDS
+from near_duplicates import CHARS_PER_TOKEN
+
+# Minimum Jaccard similarity of two clauses' terms for a reworded clause to count as the same clause
+CLAUSE_MATCH_THRESHOLD = float(os.getenv('CLAUSE_MATCH_THRESHOLD', '0.4'))
+
+UNCHANGED = "unchanged"
+MODIFIED = "modified"
+ADDED = "added"
+REMOVED = "removed"
+
+NUMBER_PREFIX = re.compile(r'^\s*(?:(?:ARTICLE|Article|SECTION|Section|CLAUSE|Clause)\s+)?(?:\d+(?:\.\d+)*|[IVXLC]+)\b[.):\-]?\s*')
+
+def _normalise(text):
+    """Clause text without its number or whitespace differences, so renumbered clauses compare equal."""
+    return NUMBER_PREFIX.sub('', " ".join(text.split()), count=1)
+
+def _title(clause):
+    """Heading without its number, so renumbered clauses still line up by title."""
+    heading = clause.heading
+    return NUMBER_PREFIX.sub('', heading).strip().lower() if len(heading) <= 60 else ""
+
+def _terms(text):
+    return {t for t in TERM.findall(text.lower()) if len(t) > 2 and t not in STOP_WORDS}
+
+def _clause_risks(clause_index):
+    """Risk pattern names per clause id."""
+    risks = {}
+    for name, (_, clause_ids) in clause_index.risk_matches.items():
+        for clause_id in clause_ids:
+            risks.setdefault(clause_id, set()).add(name)
+    return risks
+
+def align_clauses(old_index, new_index, threshold=CLAUSE_MATCH_THRESHOLD):
+    """Pair the clauses of two documents; returns (old id or None, new id or None) in new-document order.
+
+    Identical clauses are paired first, then clauses with the same heading
+    title, then the most similar remaining clauses by shared terms, using the
+    new document's term index to find candidates.
+    """
+    old_texts = [_normalise(old_index.clause_text(i)) for i in range(len(old_index.clauses))]
+    new_texts = [_normalise(new_index.clause_text(i)) for i in range(len(new_index.clauses))]
+    pairs = {}  # new id -> old id
+    unmatched_old = [i for i, text in enumerate(old_texts) if text]
+    unmatched_new = {i for i, text in enumerate(new_texts) if text}
+
+    # Identical text
+    by_text = {}
+    for new_id in sorted(unmatched_new):
+        by_text.setdefault(new_texts[new_id], []).append(new_id)
+    remaining = []
+    for old_id in unmatched_old:
+        candidates = by_text.get(old_texts[old_id])
+        if candidates:
+            new_id = candidates.pop(0)
+            pairs[new_id] = old_id
+            unmatched_new.discard(new_id)
+        else:
+            remaining.append(old_id)
+    unmatched_old = remaining
+
+    # Same heading title
+    by_title = {}
+    for new_id in sorted(unmatched_new):
+        title = _title(new_index.clauses[new_id])
+        if title:
+            by_title.setdefault(title, []).append(new_id)
+    remaining = []
+    for old_id in unmatched_old:
+        candidates = by_title.get(_title(old_index.clauses[old_id]))
+        if candidates:
+            new_id = candidates.pop(0)
+            pairs[new_id] = old_id
+            unmatched_new.discard(new_id)
+        else:
+            remaining.append(old_id)
+    unmatched_old = remaining
+
+    # Most similar terms, best pairs first
+    new_terms = {new_id: _terms(new_texts[new_id]) for new_id in unmatched_new}
+    scored = []
+    for old_id in unmatched_old:
+        terms = _terms(old_texts[old_id])
+        shared = {}
+        for term in terms:
+            for new_id in new_index.postings.get(term, ()):
+                if new_id in unmatched_new:
+                    shared[new_id] = shared.get(new_id, 0) + 1
+        for new_id, count in shared.items():
+            score = count / (len(terms) + len(new_terms[new_id]) - count)
+            if score >= threshold:
+                scored.append((score, old_id, new_id))
+    matched_old = set()
+    for score, old_id, new_id in sorted(scored, reverse=True):
+        if old_id not in matched_old and new_id in unmatched_new:
+            pairs[new_id] = old_id
+            matched_old.add(old_id)
+            unmatched_new.discard(new_id)
+
+    # New-document order, with each removed clause after the clause that followed its predecessor
+    aligned = [(pairs.get(new_id), new_id) for new_id in range(len(new_texts)) if new_texts[new_id]]
+    old_to_position = {old_id: position for position, (old_id, _) in enumerate(aligned) if old_id is not None}
+    removed = [old_id for old_id in unmatched_old if old_id not in matched_old]
+    for old_id in reversed(removed):
+        position = 0
+        for previous in range(old_id - 1, -1, -1):
+            if previous in old_to_position:
+                position = old_to_position[previous] + 1
+                break
+        aligned.insert(position, (old_id, None))
+        old_to_position = {o: p for p, (o, _) in enumerate(aligned) if o is not None}
+    return aligned
+
+def _word_changes(old_text, new_text, max_items=5):
+    old_words, new_words = old_text.split(), new_text.split()
+    changes = []
+    for tag, a1, a2, b1, b2 in SequenceMatcher(None, old_words, new_words, autojunk=False).get_opcodes():
+        if tag != 'equal':
+            changes.append({"old": " ".join(old_words[a1:a2]), "new": " ".join(new_words[b1:b2])})
+    return changes[:max_items]
+
+def _label(clause):
+    return clause.heading if len(clause.heading) <= 60 else f"Clause {clause.number}"
+
+def compare_documents(old_text, new_text, old_index=None, new_index=None):
+    """Clause-level diff of two versions of a document.
+
+    Returns a dict with the changed clauses (status, label, old and new text,
+    word-level changes, risk patterns gained or lost) and counts, including
+    how much text a change-only review sends compared with analysing both
+    documents in full.
+    """
+    old_index = old_index or build_clause_index(old_text)
+    new_index = new_index or build_clause_index(new_text)
+    old_risks, new_risks = _clause_risks(old_index), _clause_risks(new_index)
+
+    counts = {UNCHANGED: 0, MODIFIED: 0, ADDED: 0, REMOVED: 0}
+    changes = []
+    for old_id, new_id in align_clauses(old_index, new_index):
+        old_clause_text = old_index.clause_text(old_id) if old_id is not None else ""
+        new_clause_text = new_index.clause_text(new_id) if new_id is not None else ""
+        if old_id is None:
+            status = ADDED
+        elif new_id is None:
+            status = REMOVED
+        else:
+            status = UNCHANGED if _normalise(old_clause_text) == _normalise(new_clause_text) else MODIFIED
+        counts[status] += 1
+        if status == UNCHANGED:
+            continue
+
+        risks_before = old_risks.get(old_id, set()) if old_id is not None else set()
+        risks_after = new_risks.get(new_id, set()) if new_id is not None else set()
+        change = {
+            "status": status,
+            "label": _label(new_index.clauses[new_id] if new_id is not None else old_index.clauses[old_id]),
+            "old_text": old_clause_text,
+            "new_text": new_clause_text,
+            "risks_added": sorted(risks_after - risks_before),
+            "risks_removed": sorted(risks_before - risks_after)
+        }
+        if status == MODIFIED:
+            change["word_changes"] = _word_changes(old_clause_text, new_clause_text)
+        changes.append(change)
+
+    chars_changed = sum(len(c["old_text"]) + len(c["new_text"]) for c in changes)
+    return {
+        "changes": changes,
+        "counts": counts,
+        "chars_changed": chars_changed,
+        "chars_total": len(old_text) + len(new_text),
+        "tokens_changed": chars_changed // CHARS_PER_TOKEN,
+        "tokens_total": (len(old_text) + len(new_text)) // CHARS_PER_TOKEN
+    }
+
+def describe_changes(comparison, risk_labels=None, max_items=20):
+    """Rule-based summary of a comparison, for modes without a language model."""
+    risk_labels = risk_labels or {}
+    counts = comparison["counts"]
+    lines = [
+        "**WHAT CHANGED**",
+        f"* {counts[MODIFIED]} clauses modified, {counts[ADDED]} added, {counts[REMOVED]} removed, "
+        f"{counts[UNCHANGED]} unchanged"
+    ]
+    for change in comparison["changes"][:max_items]:
+        if change["status"] == MODIFIED:
+            edits = "; ".join(f"'{c['old']}' -> '{c['new']}'" for c in change["word_changes"][:3])
+            lines.append(f"* {change['label']}: modified ({edits})")
+        else:
+            lines.append(f"* {change['label']}: {change['status']}")
+
+    added = [(c["label"], name) for c in comparison["changes"] for name in c["risks_added"]]
+    removed = [(c["label"], name) for c in comparison["changes"] for name in c["risks_removed"]]
+    lines += ["", "**NEW OR INCREASED RISKS**"]
+    lines += [f"* {risk_labels.get(name, name)} ({label})" for label, name in added] or ["* None detected"]
+    lines += ["", "**REDUCED RISKS**"]
+    lines += [f"* {risk_labels.get(name, name)} ({label})" for label, name in removed] or ["* None detected"]
+    return "\n".join(lines)
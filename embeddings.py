@@ -0,0 +1,166 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from incremental import content_hash, split_into_chunks
+from compact_text import CompressedChunks
+
+# Sentence-transformer shared by keyword extraction, Q&A retrieval and duplicate detection
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+# If set, each document's chunk vectors are saved here and memory-mapped instead of kept in RAM
+EMBEDDING_CACHE_DIR = os.getenv('EMBEDDING_CACHE_DIR')
+EMBEDDING_CACHE_VECTORS = int(os.getenv('EMBEDDING_CACHE_VECTORS', '50000'))
+EMBEDDING_CACHE_DOCUMENTS = int(os.getenv('EMBEDDING_CACHE_DOCUMENTS', '32'))
+
+class DocumentEmbeddings:
+    """A document's paragraph chunks (compressed) and their unit-length float16 vectors (one row per chunk)."""
+    __slots__ = ("chunks", "vectors")
+
+    def __init__(self, chunks, vectors):
+        self.chunks = chunks
+        self.vectors = vectors
+
+class EmbeddingService:
+    """Encodes each distinct text once and serves every feature from the cached vectors.
+
+    Vectors are normalised, so cosine similarity is a dot product. They are
+    stored as float16 to halve memory and upcast to float32 for scoring.
+    """
+
+    def __init__(self, model_name=EMBEDDING_MODEL, cache_dir=EMBEDDING_CACHE_DIR,
+                 max_vectors=EMBEDDING_CACHE_VECTORS, max_documents=EMBEDDING_CACHE_DOCUMENTS):
+        self.model_name = model_name
+        self.cache_dir = cache_dir
+        self.max_vectors = max_vectors
+        self.max_documents = max_documents
+        self._model = None
+        self._vectors = OrderedDict()    # content hash -> float16 vector
+        self._documents = OrderedDict()  # document key -> DocumentEmbeddings
+        self._lock = threading.Lock()
+        self.encoded = 0
+        self.reused = 0
+
+    @property
+    def model(self):
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+                self._model = SentenceTransformer(self.model_name)
+            return self._model
+
+    def encode(self, texts):
+        """Vectors for the texts, encoding only those not seen before (in one batch)."""
+        keys = [content_hash(text) for text in texts]
+        rows = {}
+        missing = {}
+        with self._lock:
+            for key, text in zip(keys, texts):
+                if key in rows or key in missing:
+                    continue
+                if key in self._vectors:
+                    self._vectors.move_to_end(key)
+                    rows[key] = self._vectors[key]
+                else:
+                    missing[key] = text
+            self.reused += len(keys) - len(missing)
+
+        if missing:
+            encoded = self.model.encode(list(missing.values()), normalize_embeddings=True,
+                                        convert_to_numpy=True).astype(np.float16)
+            rows.update(zip(missing, encoded))
+            with self._lock:
+                self.encoded += len(missing)
+                self._vectors.update(zip(missing, encoded))
+                while len(self._vectors) > self.max_vectors:
+                    self._vectors.popitem(last=False)
+
+        if not keys:
+            return np.zeros((0, 0), dtype=np.float16)
+        return np.vstack([rows[key] for key in keys])
+
+    def index_document(self, text):
+        """Chunk and encode a document once; later calls for the same text reuse the result."""
+        document_key = content_hash(text)
+        with self._lock:
+            document = self._documents.get(document_key)
+            if document is not None:
+                self._documents.move_to_end(document_key)
+                return document
+
+        chunks = split_into_chunks(text)
+        vectors = self._load_from_disk(document_key, len(chunks))
+        if vectors is None:
+            vectors = self.encode(chunks)
+            vectors = self._save_to_disk(document_key, vectors)
+        # Q&A reads back only the few best-matching chunks, so the text is kept compressed
+        document = DocumentEmbeddings(CompressedChunks(chunks, [content_hash(chunk) for chunk in chunks]), vectors)
+
+        with self._lock:
+            self._documents[document_key] = document
+            while len(self._documents) > self.max_documents:
+                self._documents.popitem(last=False)
+        return document
+
+    def _path(self, document_key):
+        return os.path.join(self.cache_dir, f"{document_key}.npy")
+
+    def _load_from_disk(self, document_key, rows):
+        if not self.cache_dir or not os.path.exists(self._path(document_key)):
+            return None
+        vectors = np.load(self._path(document_key), mmap_mode='r')
+        return vectors if vectors.shape[0] == rows else None
+
+    def _save_to_disk(self, document_key, vectors):
+        if not self.cache_dir or not len(vectors):
+            return vectors
+        os.makedirs(self.cache_dir, exist_ok=True)
+        np.save(self._path(document_key), vectors)
+        return np.load(self._path(document_key), mmap_mode='r')
+
+    def search(self, text, query, top_k=3):
+        """The document's chunks most similar to the query, as (score, chunk) pairs."""
+        document = self.index_document(text)
+        if not document.chunks:
+            return []
+        scores = document.vectors.astype(np.float32) @ self.encode([query])[0].astype(np.float32)
+        best = np.argsort(-scores)[:top_k]
+        return [(float(scores[i]), document.chunks[i]) for i in best]
+
+    def keywords(self, text, top_n=5, ngram_range=(1, 2), text_vector=None):
+        """KeyBERT-style keyphrases: candidate n-grams ranked by similarity to the whole text."""
+        from sklearn.feature_extraction.text import CountVectorizer
+
+        try:
+            candidates = CountVectorizer(ngram_range=ngram_range, stop_words='english').fit([text]).get_feature_names_out()
+        except ValueError:  # only stop words
+            return []
+        if text_vector is None:
+            text_vector = self.encode([text])[0]
+        # Candidate phrases repeat across sections and documents, so most come from the cache
+        scores = self.encode(list(candidates)).astype(np.float32) @ text_vector.astype(np.float32)
+        return [candidates[i] for i in np.argsort(-scores)[:top_n]]
+
+    def stats(self):
+        with self._lock:
+            return {"vectors": len(self._vectors), "documents": len(self._documents),
+                    "encoded": self.encoded, "reused": self.reused,
+                    "chunk_text_bytes": sum(document.chunks.nbytes for document in self._documents.values())}
+
+def find_duplicate(vector, vectors, threshold):
+    """Index of the row of `vectors` most similar to `vector` if it reaches `threshold`, else None."""
+    if not len(vectors):
+        return None
+    scores = np.asarray(vectors, dtype=np.float32) @ vector.astype(np.float32)
+    best = int(np.argmax(scores))
+    return best if scores[best] >= threshold else None
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_embedding_service():
+    """Process-wide embedding service."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = EmbeddingService()
+        return _service
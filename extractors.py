@@ -0,0 +1,237 @@
+import io
+import re
+import sys
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from PyPDF2 import PdfReader
+from ocr import ocr_available, ocr_pages, page_images, OCR_MIN_TEXT_CHARS, OCR_BATCH_PAGES
+
+# WordprocessingML element names used by the streaming DOCX reader
+W_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+W_P = W_NS + 'p'
+W_T = W_NS + 't'
+W_TAB = W_NS + 'tab'
+W_BR = W_NS + 'br'
+W_CR = W_NS + 'cr'
+W_TR = W_NS + 'tr'
+W_TC = W_NS + 'tc'
+W_CONTAINERS = (W_NS + 'body', W_NS + 'hdr', W_NS + 'ftr')
+
+HEADER_PART = re.compile(r'word/header(\d*)\.xml$')
+FOOTER_PART = re.compile(r'word/footer(\d*)\.xml$')
+
+def _as_binary_source(source):
+    """Paths and seekable file objects pass through; raw bytes are wrapped in a buffer."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    return source
+
+TXT_READ_CHARS = 1024 * 1024  # characters decoded per read from a TXT stream
+
+def extract_text_from_txt(source, max_chars=None, on_text=None):
+    """Extract text from a TXT file path, bytes or file-like object.
+
+    Streams are decoded a block at a time, up to ``max_chars``;
+    ``on_text(characters so far)`` is called after each block.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    if not hasattr(source, 'read'):
+        with open(source, 'r', encoding='utf-8') as file:
+            return _read_limited(file, max_chars, on_text)
+    if isinstance(source, io.TextIOBase):
+        return _read_limited(source, max_chars, on_text)
+    reader = io.TextIOWrapper(source, encoding='utf-8')
+    try:
+        return _read_limited(reader, max_chars, on_text)
+    finally:
+        reader.detach()  # leave the caller's stream open
+
+def _read_limited(file, max_chars=None, on_text=None):
+    parts = []
+    length = 0
+    while not max_chars or length < max_chars:
+        block = file.read(min(TXT_READ_CHARS, max_chars - length) if max_chars else TXT_READ_CHARS)
+        if not block:
+            break
+        parts.append(block)
+        length += len(block)
+        if on_text:
+            on_text(length)
+    return "".join(parts)
+
+def extract_text_from_pdf(source, max_chars=None, ocr=True, ocr_parallel=True, progress=None, label=None,
+                          on_text=None):
+    """Extract text from a PDF file path, bytes or file-like object.
+
+    With ``max_chars``, pages are read only until that much text is collected.
+    Pages without a text layer that carry images (scans) are OCRed when
+    ``ocr`` is set and Tesseract is available, OCR_BATCH_PAGES at a time as
+    they are read, so recognised text counts toward ``max_chars`` and only a
+    batch of page images is held in memory; see ocr.ocr_pages for the other
+    arguments (``progress`` is reported per batch). ``on_text(characters so
+    far)`` is called after each page; once it returns True (over the memory
+    budget) no further pages are OCRed.
+    """
+    pdf_reader = PdfReader(_as_binary_source(source))
+    use_ocr = ocr and ocr_available()
+    page_texts = []
+    scanned = []
+    length = 0
+
+    def recognise():
+        nonlocal length
+        for number, text in ocr_pages(scanned, parallel=ocr_parallel, progress=progress, label=label).items():
+            length += len(text) - len(page_texts[number])
+            page_texts[number] = text
+        scanned.clear()
+
+    for number, page in enumerate(pdf_reader.pages):
+        text = page.extract_text() or ""
+        page_texts.append(text)
+        length += len(text) + 1
+        if use_ocr and len(text.strip()) < OCR_MIN_TEXT_CHARS:
+            images = page_images(page)
+            if images:
+                scanned.append((number, images))
+                if len(scanned) >= OCR_BATCH_PAGES:
+                    recognise()
+        if on_text and on_text(length):
+            use_ocr = False
+            scanned.clear()
+        if max_chars and length >= max_chars:
+            break
+
+    if scanned:
+        recognise()
+    return _join_limited(page_texts, max_chars, trailing=True)
+
+def extract_text_from_docx(source, max_chars=None, on_text=None):
+    """Extract text from a DOCX file path, bytes or file-like object, including tables, page headers and footers.
+
+    With ``max_chars``, the document is streamed only until that much text is collected.
+    """
+    return _join_limited(iter_docx_blocks(source), max_chars, on_text=on_text)
+
+def _join_limited(blocks, max_chars=None, trailing=False, on_text=None):
+    """Join text blocks with newlines, stopping once ``max_chars`` characters are collected.
+
+    ``on_text(characters so far)`` is called after each block.
+    """
+    parts = []
+    length = 0
+    for block in blocks:
+        if not block and trailing:
+            continue
+        parts.append(block)
+        length += len(block) + 1
+        if on_text:
+            on_text(length)
+        if max_chars and length >= max_chars:
+            break
+    text = "\n".join(parts) + ("\n" if trailing and parts else "")
+    return text[:max_chars] if max_chars else text
+
+def iter_docx_blocks(source):
+    """Yield DOCX paragraphs and table rows in document order.
+
+    Page header lines come before the body and page footer lines after it,
+    each distinct line once and labelled "Header:" or "Footer:" so they are
+    not read as part of the first or last clause. Table rows are emitted as
+    their cell texts joined with " | ".
+    """
+    with zipfile.ZipFile(_as_binary_source(source)) as archive:
+        names = archive.namelist()
+        yield from _iter_page_parts(archive, names, HEADER_PART, "Header")
+        yield from _iter_part_blocks(archive, 'word/document.xml')
+        yield from _iter_page_parts(archive, names, FOOTER_PART, "Footer")
+
+def _iter_page_parts(archive, names, pattern, label):
+    """Yield the distinct lines of the header or footer parts matching ``pattern``, labelled."""
+    matches = [pattern.match(name) for name in names]
+    # header2.xml sorts before header10.xml
+    parts = sorted((int(match.group(1) or 0), match.group(0)) for match in matches if match)
+    seen_lines = set()
+    for _, part in parts:
+        for block in _iter_part_blocks(archive, part):
+            if block not in seen_lines:
+                seen_lines.add(block)
+                yield f"{label}: {block}"
+
+def _iter_part_blocks(archive, part_name):
+    """Stream one WordprocessingML part, clearing parsed elements as it goes."""
+    runs = []
+    cell_stack = []   # paragraphs of the table cells currently open (nested tables push more)
+    row_stack = []    # cell texts of the table rows currently open
+    container = None
+    depth = 0
+
+    with archive.open(part_name) as xml_file:
+        for event, elem in ET.iterparse(xml_file, events=('start', 'end')):
+            tag = elem.tag
+
+            if event == 'start':
+                depth += 1
+                if tag in W_CONTAINERS and container is None:
+                    container = (elem, depth)
+                elif tag == W_TR:
+                    row_stack.append([])
+                elif tag == W_TC:
+                    cell_stack.append([])
+                continue
+
+            if tag == W_T:
+                runs.append(elem.text or '')
+            elif tag == W_TAB:
+                runs.append('\t')
+            elif tag in (W_BR, W_CR):
+                runs.append('\n')
+            elif tag == W_P:
+                text = ''.join(runs).strip()
+                runs = []
+                if cell_stack:
+                    cell_stack[-1].append(text)
+                elif text:
+                    yield text
+            elif tag == W_TC:
+                paragraphs = cell_stack.pop()
+                row_stack[-1].append(' '.join(p for p in paragraphs if p))
+            elif tag == W_TR:
+                cells = row_stack.pop()
+                line = ' | '.join(cells) if any(cells) else ''
+                if cell_stack:
+                    cell_stack[-1].append(line)
+                elif line:
+                    yield line
+
+            depth -= 1
+            # Drop finished top-level blocks so memory stays flat on large documents
+            if container is not None and depth == container[1]:
+                container[0].clear()
+
+def _benchmark_docx(file_path, repeat=3):
+    """Compare the streaming reader with python-docx on one file."""
+    import tracemalloc
+    import docx
+
+    def python_docx_text(path):
+        doc = docx.Document(path)
+        return "\n".join(para.text for para in doc.paragraphs)
+
+    for label, extractor in (("python-docx", python_docx_text), ("streaming", extract_text_from_docx)):
+        timings = []
+        for _ in range(repeat):
+            tracemalloc.start()
+            start = time.perf_counter()
+            text = extractor(file_path)
+            timings.append(time.perf_counter() - start)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        print(f"{label:12} best {min(timings) * 1000:8.1f} ms   peak {peak / 1024 / 1024:7.1f} MB   {len(text):,} chars")
+
+if __name__ == '__main__':
+    # Usage: python extractors.py contract.docx [more.docx ...]
+    for path in sys.argv[1:]:
+        print(path)
+        _benchmark_docx(path)
@@ -0,0 +1,189 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from transformers import pipeline, AutoTokenizer, AutoModelForSeq2SeqLM
+
+from test_sets import load_test_set, DEFAULT_TEST_SET
+
+# Summarisation model and inference backend used in HuggingFace mode
+HF_MODEL_NAME = os.getenv('HF_MODEL_NAME', 'nsi319/legal-pegasus')
+HF_BACKEND = os.getenv('HF_BACKEND', 'torch')
+# Directory of an ONNX export (e.g. from `optimum-cli export onnx`); exported on first load if unset
+HF_ONNX_MODEL_DIR = os.getenv('HF_ONNX_MODEL_DIR')
+HF_NUM_THREADS = int(os.getenv('HF_NUM_THREADS', '0'))
+
+class SummarizationBackend:
+    """Interface for the HuggingFace-mode summariser: load once, then summarize many texts."""
+    name = None
+
+    def __init__(self, model_name=HF_MODEL_NAME):
+        self.model_name = model_name
+        self.summarizer = None
+
+    def load(self):
+        raise NotImplementedError
+
+    def summarize(self, text, min_length=30, max_length=150):
+        if self.summarizer is None:
+            self.summarizer = self.load()
+        summary = self.summarizer(text, max_length=max_length, min_length=min_length, do_sample=False, truncation=True)
+        return summary[0]['summary_text']
+
+class TorchBackend(SummarizationBackend):
+    """Full-precision PyTorch model, the original pipeline."""
+    name = "torch"
+
+    def load(self):
+        return pipeline("summarization", model=self.model_name)
+
+class QuantizedTorchBackend(SummarizationBackend):
+    """PyTorch model with its Linear layers dynamically quantised to int8 for CPU inference."""
+    name = "quantized"
+
+    def load(self):
+        import torch
+
+        if HF_NUM_THREADS:
+            torch.set_num_threads(HF_NUM_THREADS)
+        tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        model = AutoModelForSeq2SeqLM.from_pretrained(self.model_name)
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return pipeline("summarization", model=model, tokenizer=tokenizer)
+
+class OnnxBackend(SummarizationBackend):
+    """ONNX Runtime graph of the model (requires optimum[onnxruntime])."""
+    name = "onnx"
+
+    def load(self):
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+
+        if HF_ONNX_MODEL_DIR and os.path.isdir(HF_ONNX_MODEL_DIR):
+            model = ORTModelForSeq2SeqLM.from_pretrained(HF_ONNX_MODEL_DIR)
+            tokenizer = AutoTokenizer.from_pretrained(HF_ONNX_MODEL_DIR)
+        else:
+            model = ORTModelForSeq2SeqLM.from_pretrained(self.model_name, export=True)
+            tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            if HF_ONNX_MODEL_DIR:
+                # Keep the export so later starts skip it
+                model.save_pretrained(HF_ONNX_MODEL_DIR)
+                tokenizer.save_pretrained(HF_ONNX_MODEL_DIR)
+        return pipeline("summarization", model=model, tokenizer=tokenizer)
+
+BACKENDS = {backend.name: backend for backend in (TorchBackend, QuantizedTorchBackend, OnnxBackend)}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_backend(name=None):
+    """Shared instance of the named backend (HF_BACKEND by default)."""
+    name = name or HF_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown HF_BACKEND '{name}'; choose from {', '.join(BACKENDS)}")
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = BACKENDS[name]()
+        return _backends[name]
+
+def _lcs_length(a, b):
+    previous = [0] * (len(b) + 1)
+    for token in a:
+        current = [0]
+        for j, other in enumerate(b):
+            current.append(previous[j] + 1 if token == other else max(previous[j + 1], current[j]))
+        previous = current
+    return previous[-1]
+
+def rouge_scores(candidate, reference):
+    """ROUGE-1, ROUGE-2 and ROUGE-L F1 of a summary against a reference."""
+    cand = candidate.lower().split()
+    ref = reference.lower().split()
+
+    def f1(overlap, cand_total, ref_total):
+        if not overlap or not cand_total or not ref_total:
+            return 0.0
+        precision, recall = overlap / cand_total, overlap / ref_total
+        return 2 * precision * recall / (precision + recall)
+
+    scores = {}
+    for n in (1, 2):
+        cand_grams = [tuple(cand[i:i + n]) for i in range(len(cand) - n + 1)]
+        ref_counts = {}
+        for gram in (tuple(ref[i:i + n]) for i in range(len(ref) - n + 1)):
+            ref_counts[gram] = ref_counts.get(gram, 0) + 1
+        overlap = 0
+        for gram in cand_grams:
+            if ref_counts.get(gram):
+                ref_counts[gram] -= 1
+                overlap += 1
+        scores[f"rouge{n}"] = round(f1(overlap, len(cand_grams), max(len(ref) - n + 1, 0)), 4)
+    scores["rougeL"] = round(f1(_lcs_length(cand, ref), len(cand), len(ref)), 4)
+    return scores
+
+def _mean(values):
+    return round(sum(values) / len(values), 4) if values else None
+
+def benchmark(test_set, backend_names, baseline="torch"):
+    """Latency, memory and ROUGE of each backend on the test set.
+
+    ROUGE is reported against the documents' reference summaries when they
+    have them, and against the baseline backend's output (how closely a
+    faster backend reproduces the current pipeline) when it is benchmarked too.
+    """
+    from memory_budget import MemoryTracker
+
+    if baseline in backend_names:
+        backend_names = [baseline] + [name for name in backend_names if name != baseline]
+
+    results = {}
+    baseline_outputs = None
+    for name in backend_names:
+        backend = BACKENDS[name]()
+        tracker = MemoryTracker(per_stage_peak=True)  # benchmarks run alone
+        with tracker.stage("load"):
+            backend.summarizer = backend.load()
+
+        outputs, latencies = [], []
+        with tracker.stage("summarize"):
+            for document in test_set:
+                started = time.perf_counter()
+                outputs.append(backend.summarize(document["text"]))
+                latencies.append(time.perf_counter() - started)
+
+        load_stage, summarize_stage = tracker.stages
+        result = {
+            "load_seconds": load_stage["seconds"],
+            "mean_latency_seconds": _mean(latencies),
+            "max_latency_seconds": round(max(latencies), 4) if latencies else None,
+            "load_peak_rss_mb": load_stage["peak_rss_mb"],
+            "summarize_peak_rss_mb": summarize_stage["peak_rss_mb"],
+        }
+        references = [(output, document["reference"]) for output, document in zip(outputs, test_set) if document.get("reference")]
+        if references:
+            scores = [rouge_scores(output, reference) for output, reference in references]
+            result["rouge_vs_reference"] = {key: _mean([s[key] for s in scores]) for key in scores[0]}
+        if baseline_outputs is not None:
+            scores = [rouge_scores(output, base) for output, base in zip(outputs, baseline_outputs)]
+            result[f"rouge_vs_{baseline}"] = {key: _mean([s[key] for s in scores]) for key in scores[0]}
+        if name == baseline:
+            baseline_outputs = outputs
+
+        results[name] = result
+        del backend  # free the model before loading the next one
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark HuggingFace-mode summarisation backends.")
+    parser.add_argument("test_set", nargs="?", default=DEFAULT_TEST_SET,
+                        help="JSONL file or directory of .txt documents (default: benchmarks/contracts.jsonl)")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="Comma-separated backends to compare")
+    parser.add_argument("--limit", type=int, help="Only use the first N documents")
+    args = parser.parse_args(argv)
+
+    test_set = load_test_set(args.test_set)[:args.limit]
+    print(json.dumps(benchmark(test_set, args.backends.split(",")), indent=2))
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,138 @@
+import os
+import re
+import bisect
+import threading
+from collections import OrderedDict
+from incremental import content_hash, FAILED_PREFIXES
+
+# Documents longer than this are summarised hierarchically: short summaries of their parts, then an overview
+HIERARCHICAL_MIN_CHARS = int(os.getenv('HIERARCHICAL_MIN_CHARS', '25000'))
+# Parts are at least HIERARCHY_PART_CHARS long, and never more than HIERARCHY_MAX_PARTS of them, so the
+# overview always costs one concurrent round of part summaries plus one call, however long the document
+HIERARCHY_PART_CHARS = int(os.getenv('HIERARCHY_PART_CHARS', '12000'))
+HIERARCHY_MAX_PARTS = int(os.getenv('HIERARCHY_MAX_PARTS', '16'))
+# Part and section summaries kept, keyed by the content hash of the part
+SECTION_CACHE_ENTRIES = int(os.getenv('SECTION_CACHE_ENTRIES', '4096'))
+
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+
+class Part:
+    """A run of consecutive top-level clauses: its title, character span and content hash."""
+    __slots__ = ("number", "title", "start", "end", "key")
+
+    def __init__(self, number, title, start, end, key):
+        self.number = number
+        self.title = title
+        self.start = start
+        self.end = end
+        self.key = key
+
+    def text(self, document_text):
+        return document_text[self.start:self.end].strip()
+
+def _first_at_least(offsets, low, high):
+    """Smallest offset in [low, high], or None."""
+    i = bisect.bisect_left(offsets, low)
+    return offsets[i] if i < len(offsets) and offsets[i] <= high else None
+
+def _title(number, start, end, clause_index):
+    """Headings of the top-level clauses the part covers, e.g. "1. Definitions ... 4. Fees"."""
+    headings = []
+    if clause_index is not None:
+        starts = [clause.start for clause in clause_index.clauses]
+        first = max(0, bisect.bisect_right(starts, start) - 1)
+        for clause in clause_index.clauses[first:]:
+            if clause.start >= end:
+                break
+            if clause.level <= 1 and clause.heading != "Preamble":
+                headings.append(clause.heading)
+    if not headings:
+        return f"Part {number}"
+    return headings[0] if len(headings) == 1 else f"{headings[0]} ... {headings[-1]}"
+
+def split_parts(text, clause_index=None, part_chars=HIERARCHY_PART_CHARS, max_parts=HIERARCHY_MAX_PARTS):
+    """Split a long document into at most ``max_parts`` parts of at least ``part_chars`` characters.
+
+    Parts end at a top-level clause heading where possible, else at a
+    paragraph break, else at a space. The split depends only on the text,
+    so it can be recomputed to find a part again.
+    """
+    target = max(part_chars, -(-len(text) // max_parts))
+    headings = [] if clause_index is None else sorted(
+        clause.start for clause in clause_index.clauses if clause.level <= 1 and clause.start > 0)
+    paragraphs = [match.end() for match in PARAGRAPH_BREAK.finditer(text)]
+
+    spans = []
+    start = 0
+    while len(text) - start > target:
+        low, high = start + target, start + 2 * target
+        cut = _first_at_least(headings, low, high) or _first_at_least(paragraphs, low, high)
+        if cut is None:
+            if len(text) <= high:
+                break
+            cut = text.rfind(' ', low, high) + 1 or high
+        spans.append((start, cut))
+        start = cut
+    spans.append((start, len(text)))
+
+    return [Part(number, _title(number, start, end, clause_index), start, end, content_hash(text[start:end]))
+            for number, (start, end) in enumerate(spans, 1)]
+
+def is_hierarchical(text):
+    return len(text) > HIERARCHICAL_MIN_CHARS
+
+class SectionSummaryCache:
+    """Thread-safe LRU of part summaries: brief ones for the overview, detailed ones per requested length.
+
+    Keys are content hashes, so unchanged parts of an edited document and
+    parts shared between documents are summarised once. Error messages are
+    never cached.
+    """
+
+    def __init__(self, max_entries=SECTION_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0}
+
+    def get(self, key):
+        with self._lock:
+            summary = self._items.get(key)
+            if summary is None:
+                self._counters["misses"] += 1
+            else:
+                self._counters["hits"] += 1
+                self._items.move_to_end(key)
+            return summary
+
+    def peek(self, key):
+        """get() without touching the counters or the LRU order."""
+        with self._lock:
+            return self._items.get(key)
+
+    def put(self, key, summary):
+        if not summary or summary.startswith(FAILED_PREFIXES):
+            return
+        with self._lock:
+            self._items[key] = summary
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, entries=len(self._items))
+
+section_summary_cache = SectionSummaryCache()
+
+def brief_key(part):
+    return ("brief", part.key)
+
+def detail_key(part, min_length, max_length):
+    return ("detail", part.key, min_length, max_length)
+
+def outline(text, clause_index=None):
+    """The document's parts with their brief summaries (None for parts not summarised yet)."""
+    return [{"number": part.number, "title": part.title, "chars": part.end - part.start,
+             "summary": section_summary_cache.peek(brief_key(part))}
+            for part in split_parts(text, clause_index)]
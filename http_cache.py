@@ -0,0 +1,87 @@
+import os
+import re
+import gzip
+import hashlib
+import threading
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# JSON and text responses at least this large are compressed for clients that accept it
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', '1024'))
+COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', '6'))
+# Fingerprinted static assets never change under the same name, so clients may keep them this long
+STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', str(365 * 24 * 3600)))
+
+COMPRESSIBLE_TYPES = ("application/json", "application/javascript", "application/x-ndjson", "image/svg+xml")
+
+FINGERPRINT_LENGTH = 12
+FINGERPRINTED = re.compile(r'^(?P<stem>.+)\.(?P<fingerprint>[0-9a-f]{%d})(?P<suffix>\.[^./]+)$' % FINGERPRINT_LENGTH)
+
+def compressible(mimetype):
+    return bool(mimetype) and (mimetype.startswith("text/") or mimetype in COMPRESSIBLE_TYPES)
+
+def choose_encoding(accept_encodings):
+    """Best encoding the client accepts (werkzeug Accept header): brotli if installed, else gzip, else None."""
+    if brotli is not None and accept_encodings["br"]:
+        return "br"
+    if accept_encodings["gzip"]:
+        return "gzip"
+    return None
+
+def compress(data, encoding, level=COMPRESS_LEVEL):
+    if encoding == "br":
+        return brotli.compress(data, quality=min(level, 11))
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+def content_etag(data):
+    """ETag from the SHA-256 of the uncompressed body."""
+    return hashlib.sha256(data).hexdigest()[:32]
+
+class FileHashes:
+    """SHA-256 of files on disk, recomputed only when a file's size or modification time changes."""
+
+    def __init__(self):
+        self._hashes = {}  # path -> (mtime_ns, size, hex digest)
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        stat = os.stat(path)
+        with self._lock:
+            cached = self._hashes.get(path)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 16), b""):
+                digest.update(block)
+        with self._lock:
+            self._hashes[path] = (stat.st_mtime_ns, stat.st_size, digest.hexdigest())
+        return digest.hexdigest()
+
+file_hashes = FileHashes()
+
+def fingerprinted_name(static_folder, filename):
+    """``css/styles.css`` -> ``css/styles.<hash>.css``; the name changes whenever the content does."""
+    path = safe_join(static_folder, filename)
+    if path is None or not os.path.isfile(path):
+        return filename
+    stem, suffix = os.path.splitext(filename)
+    return f"{stem}.{file_hashes.get(path)[:FINGERPRINT_LENGTH]}{suffix}"
+
+def resolve_fingerprint(static_folder, filename):
+    """Real file name for a fingerprinted name and whether the fingerprint matches its current content.
+
+    Names without a fingerprint are returned unchanged with False.
+    """
+    match = FINGERPRINTED.match(filename)
+    if match is None:
+        return filename, False
+    original = match.group("stem") + match.group("suffix")
+    path = safe_join(static_folder, original)
+    if path is None or not os.path.isfile(path):
+        return filename, False
+    return original, file_hashes.get(path).startswith(match.group("fingerprint"))
@@ -0,0 +1,184 @@
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from compact_text import CompressedChunks, ChunkMap
+
+# Re-run the full analysis instead of revising when more than this share of the text changed
+REVISE_MAX_CHANGED_RATIO = 0.5
+
+# Summaries starting with these are error messages and are never reused
+FAILED_PREFIXES = ("Error", "GenAI service unavailable")
+
+def content_hash(text):
+    """Hash a chunk of text, ignoring whitespace-only differences."""
+    return hashlib.sha256(" ".join(text.split()).encode('utf-8')).hexdigest()
+
+def _has_failed(summaries):
+    """True if any summary is an error message rather than real output."""
+    return any(str(value).startswith(FAILED_PREFIXES) for value in summaries.values())
+
+def split_into_chunks(text):
+    """Split text into paragraph chunks used to diff successive versions."""
+    return [chunk.strip() for chunk in re.split(r'\n\s*\n', text) if chunk.strip()]
+
+class SessionCache:
+    """Small thread-safe LRU mapping of session id to per-session state."""
+
+    def __init__(self, max_sessions=256):
+        self.max_sessions = max_sessions
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            state = self._items.get(session_id)
+            if state is not None:
+                self._items.move_to_end(session_id)
+            return state
+
+    def set(self, session_id, state):
+        with self._lock:
+            self._items[session_id] = state
+            self._items.move_to_end(session_id)
+            while len(self._items) > self.max_sessions:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+def _plan_whole_document(previous, text):
+    """Decide how to analyse a new version of a whole-document analysis: reuse, revise or start over.
+
+    Returns a dict with the mode ("cached", "revised" or "full"), the new
+    version's chunks (compressed, for the state), the added and removed
+    chunks, the previous summaries and the stats so far.
+    """
+    chunk_list = split_into_chunks(text)
+    keys = [content_hash(chunk) for chunk in chunk_list]
+    chunks = dict(zip(keys, chunk_list))
+    stats = {"chunks_total": len(chunks), "chunks_changed": 0, "chars_changed": 0}
+
+    # Only the removed chunks of the previous version are decompressed
+    old_chunks = previous.get("chunks", {})
+    old_keys = set(old_chunks)
+    added = [chunk for h, chunk in chunks.items() if h not in old_keys]
+    removed = [old_chunks[h] for h in old_chunks if h not in chunks]
+    changed_chars = sum(len(chunk) for chunk in added) + sum(len(chunk) for chunk in removed)
+    stats["chunks_changed"] = len(added) + len(removed)
+
+    previous_summaries = previous.get("summaries")
+    if previous_summaries and _has_failed(previous_summaries):
+        previous_summaries = None
+    if previous_summaries and not added and not removed:
+        stats["mode"] = "cached"
+    elif previous_summaries and changed_chars <= REVISE_MAX_CHANGED_RATIO * max(len(text), 1):
+        stats["mode"] = "revised"
+        stats["chars_changed"] = changed_chars
+    else:
+        stats["mode"] = "full"
+        stats["chars_changed"] = len(text)
+
+    return {"mode": stats["mode"], "chunks": ChunkMap(CompressedChunks(chunk_list, keys)), "added": added,
+            "removed": removed, "previous_summaries": previous_summaries, "stats": stats}
+
+def _previous_for(previous, lengths):
+    # Summaries written for other lengths cannot be reused
+    previous = previous or {}
+    return previous if previous.get("lengths") == lengths else {}
+
+def analyze_incrementally(previous, text, split_into_sections, summarize_sections,
+                          revise_sections=None, min_length=150, max_length=300, clause_index=None):
+    """Analyse text, reusing results from the previous version where possible.
+
+    Modes that summarise each section independently (Lite, HF) only
+    re-summarise sections whose content hash changed. Modes that analyse the
+    whole document at once (GenAI) pass ``revise_sections``, which updates the
+    previous analysis from the added and removed paragraph chunks only.
+
+    Returns ``(section_summaries, state, stats)``; ``state`` is what the
+    caller keeps for the session and passes back as ``previous`` next time.
+    """
+    lengths = (min_length, max_length)
+    previous = _previous_for(previous, lengths)
+
+    if revise_sections is not None:
+        plan = _plan_whole_document(previous, text)
+        if plan["mode"] == "cached":
+            section_summaries = plan["previous_summaries"]
+        elif plan["mode"] == "revised":
+            section_summaries = revise_sections(plan["previous_summaries"], plan["added"], plan["removed"],
+                                                min_length=min_length, max_length=max_length)
+        else:
+            section_summaries = summarize_sections(split_into_sections(text), min_length=min_length,
+                                                   max_length=max_length, clause_index=clause_index)
+
+        state = {"chunks": plan["chunks"], "summaries": section_summaries, "lengths": lengths}
+        return section_summaries, state, plan["stats"]
+
+    stats = {"chunks_changed": 0, "chars_changed": 0}
+
+    # Per-section modes: cache each section's summary under its content hash
+    old_sections = previous.get("sections", {})
+    new_sections = {}
+    section_summaries = {}
+    sections = split_into_sections(text)
+    # Sections are summarised one at a time, so each gets its share of the requested length
+    section_count = max(1, sum(1 for content in sections.values() if content.strip()))
+    section_min_length = max(1, round(min_length / section_count))
+    section_max_length = max(1, round(max_length / section_count))
+    keys = {}
+    changed = {}
+    for section_name, content in sections.items():
+        # A section's summary length depends on how many sections there are, so it is part of the key
+        keys[section_name] = content_hash(f"{section_min_length}-{section_max_length}\n{section_name}\n{content}")
+        result = old_sections.get(keys[section_name])
+        if result is None or _has_failed(result):
+            changed[section_name] = content
+            stats["chunks_changed"] += 1
+            stats["chars_changed"] += len(content)
+
+    # Changed sections are summarised in one call, so the summariser can spot repeated sections among
+    # them; the summarisers divide the lengths among the non-empty sections they are given
+    summarised = {}
+    changed_count = sum(1 for content in changed.values() if content.strip())
+    if changed_count:
+        summarised = summarize_sections(changed, min_length=section_min_length * changed_count,
+                                        max_length=section_max_length * changed_count)
+
+    for section_name in sections:
+        key = keys[section_name]
+        if section_name in changed:
+            result = {section_name: summarised[section_name]} if section_name in summarised else {}
+        else:
+            result = old_sections[key]
+        new_sections[key] = result
+        section_summaries.update(result)
+
+    state = {"sections": new_sections, "summaries": dict(section_summaries), "lengths": lengths}
+
+    # Sections derived from the whole-document clause index (e.g. risk findings) are cheap to rebuild
+    if clause_index is not None:
+        section_summaries.update(summarize_sections({}, min_length=min_length, max_length=max_length,
+                                                    clause_index=clause_index))
+
+    stats["chunks_total"] = len(new_sections)
+    stats["mode"] = "sections"
+    return section_summaries, state, stats
+
+async def analyze_incrementally_async(previous, text, split_into_sections, summarize_sections_async,
+                                      revise_sections_async, min_length=150, max_length=300, clause_index=None):
+    """analyze_incrementally for whole-document modes whose model calls are coroutines."""
+    lengths = (min_length, max_length)
+    plan = _plan_whole_document(_previous_for(previous, lengths), text)
+    if plan["mode"] == "cached":
+        section_summaries = plan["previous_summaries"]
+    elif plan["mode"] == "revised":
+        section_summaries = await revise_sections_async(plan["previous_summaries"], plan["added"], plan["removed"],
+                                                        min_length=min_length, max_length=max_length)
+    else:
+        section_summaries = await summarize_sections_async(split_into_sections(text), min_length=min_length,
+                                                           max_length=max_length, clause_index=clause_index)
+
+    state = {"chunks": plan["chunks"], "summaries": section_summaries, "lengths": lengths}
+    return section_summaries, state, plan["stats"]
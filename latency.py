@@ -0,0 +1,45 @@
+import threading
+from collections import deque
+
+# Upper bounds (in words) of the max_length buckets latency is reported under
+LENGTH_BUCKETS = (100, 200, 300, 500, 1000)
+SAMPLES_PER_BUCKET = 200
+
+def length_bucket(max_length):
+    """Label of the bucket a requested max_length falls in, e.g. "<=300"."""
+    for bound in LENGTH_BUCKETS:
+        if max_length <= bound:
+            return f"<={bound}"
+    return f">{LENGTH_BUCKETS[-1]}"
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+class LatencyByLength:
+    """Analysis latency per requested summary length, over the most recent requests."""
+
+    def __init__(self, samples=SAMPLES_PER_BUCKET):
+        self.samples = samples
+        self._buckets = {}  # (bucket, mode) -> deque of seconds
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, max_length, mode, seconds):
+        key = (length_bucket(max_length), mode)
+        with self._lock:
+            self._buckets.setdefault(key, deque(maxlen=self.samples)).append(seconds)
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def stats(self):
+        """Count and p50/p95/mean seconds per length bucket and analysis mode."""
+        with self._lock:
+            items = [(key, sorted(samples), self._counts[key]) for key, samples in self._buckets.items()]
+        result = {}
+        for (bucket, mode), ordered, count in sorted(items):
+            result.setdefault(bucket, {})[mode] = {
+                "count": count,
+                "p50_seconds": round(_percentile(ordered, 0.5), 3),
+                "p95_seconds": round(_percentile(ordered, 0.95), 3),
+                "mean_seconds": round(sum(ordered) / len(ordered), 3)
+            }
+        return result
@@ -0,0 +1,310 @@
+import os
+import sys
+import copy
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import threading
+import importlib.util
+from contextlib import contextmanager, asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+# Language model behind summaries, risk analysis and Q&A: gemini, local (llama.cpp on CPU) or fake
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'gemini')
+# GGUF model file for the local backend (requires llama-cpp-python), e.g. a small instruction-tuned model
+LOCAL_LLM_MODEL_PATH = os.getenv('LOCAL_LLM_MODEL_PATH')
+LOCAL_LLM_CONTEXT_TOKENS = int(os.getenv('LOCAL_LLM_CONTEXT_TOKENS', '4096'))
+LOCAL_LLM_MAX_TOKENS = int(os.getenv('LOCAL_LLM_MAX_TOKENS', '512'))
+LOCAL_LLM_THREADS = int(os.getenv('LOCAL_LLM_THREADS', '0'))  # 0 lets llama.cpp choose
+# Simulated model latency of the fake backend, for load tests and benchmarks of the pipeline itself
+FAKE_LLM_LATENCY_MS = int(os.getenv('FAKE_LLM_LATENCY_MS', '0'))
+
+CHARS_PER_TOKEN = 4  # rough estimate for English legal text
+
+class LLMBackend:
+    """Interface for a text-generation engine: generate one prompt, or a batch, within a concurrency limit.
+
+    At most ``max_concurrency`` calls run at once (set per backend with
+    LLM_<NAME>_MAX_CONCURRENCY); further calls wait for a slot.
+    ``structured_output`` backends accept Gemini-style JSON generation
+    configs (response_mime_type / response_schema).
+    """
+    name = None
+    label = None  # how messages to users name the model
+    setup_hint = None  # what to check when the backend is unavailable
+    structured_output = False
+    default_concurrency = 1
+
+    def __init__(self, max_concurrency=None):
+        self.max_concurrency = max_concurrency or int(
+            os.getenv(f'LLM_{self.name.upper()}_MAX_CONCURRENCY', str(self.default_concurrency)))
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._slot_waiter = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"llm-{self.name}-slots")
+        self._lock = threading.Lock()
+        self._counters = {"calls": 0, "failures": 0, "in_flight": 0, "seconds": 0.0}
+
+    def available(self):
+        return True
+
+    def _generate(self, prompt, generation_config):
+        raise NotImplementedError
+
+    async def _generate_async(self, prompt, generation_config):
+        return await asyncio.to_thread(self._generate, prompt, generation_config)
+
+    def _started(self):
+        with self._lock:
+            self._counters["in_flight"] += 1
+        return time.perf_counter()
+
+    def _finished(self, started, failed):
+        with self._lock:
+            self._counters["in_flight"] -= 1
+            self._counters["calls"] += 1
+            self._counters["failures"] += failed
+            self._counters["seconds"] += time.perf_counter() - started
+
+    @contextmanager
+    def _call(self):
+        with self._slots:
+            started, failed = self._started(), True
+            try:
+                yield
+                failed = False
+            finally:
+                self._finished(started, failed)
+
+    async def _acquire_async(self):
+        """Take a slot without blocking the event loop; the slots are shared with threaded callers."""
+        if self._slots.acquire(blocking=False):
+            return
+        # One thread per backend waits for slots on behalf of coroutines, in arrival order
+        acquire = asyncio.get_running_loop().run_in_executor(self._slot_waiter, self._slots.acquire)
+        try:
+            await asyncio.shield(acquire)
+        except asyncio.CancelledError:
+            # The wait still completes in the thread, so hand back the slot it takes
+            acquire.add_done_callback(lambda future: future.cancelled() or self._slots.release())
+            raise
+
+    @asynccontextmanager
+    async def _call_async(self):
+        await self._acquire_async()
+        started, failed = self._started(), True
+        try:
+            yield
+            failed = False
+        finally:
+            self._finished(started, failed)
+            self._slots.release()
+
+    def generate(self, prompt, generation_config=None):
+        """Generated text for the prompt; raises on model or API errors."""
+        with self._call():
+            return self._generate(prompt, generation_config)
+
+    async def generate_async(self, prompt, generation_config=None):
+        async with self._call_async():
+            return await self._generate_async(prompt, generation_config)
+
+    def generate_batch(self, prompts, generation_config=None):
+        """Generated text per prompt, in order; a failed prompt's entry is its exception.
+
+        Prompts run concurrently up to the backend's limit.
+        """
+        def generate_one(prompt):
+            try:
+                return self.generate(prompt, generation_config)
+            except Exception as e:
+                return e
+
+        if len(prompts) <= 1 or self.max_concurrency == 1:
+            return [generate_one(prompt) for prompt in prompts]
+        with ThreadPoolExecutor(max_workers=min(len(prompts), self.max_concurrency)) as executor:
+            return list(executor.map(generate_one, prompts))
+
+    def stats(self):
+        with self._lock:
+            calls = self._counters["calls"]
+            return {"max_concurrency": self.max_concurrency, "calls": calls,
+                    "failures": self._counters["failures"], "in_flight": self._counters["in_flight"],
+                    "mean_seconds": round(self._counters["seconds"] / calls, 3) if calls else None}
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini through google-generativeai; ``model`` is a configured GenerativeModel."""
+    name = "gemini"
+    label = "Gemini"
+    setup_hint = "Please check your GEMINI_API_KEY in the .env file."
+    structured_output = True
+    default_concurrency = 16
+
+    def __init__(self, model=None, max_concurrency=None):
+        super().__init__(max_concurrency)
+        self.model = model
+
+    def available(self):
+        return self.model is not None
+
+    def bind(self, model):
+        """The same backend, with its limit and counters, calling another model (e.g. one with cached context)."""
+        bound = copy.copy(self)
+        bound.model = model
+        return bound
+
+    def _generate(self, prompt, generation_config):
+        if generation_config is None:
+            return self.model.generate_content(prompt).text
+        return self.model.generate_content(prompt, generation_config=generation_config).text
+
+    async def _generate_async(self, prompt, generation_config):
+        if generation_config is None:
+            response = await self.model.generate_content_async(prompt)
+        else:
+            response = await self.model.generate_content_async(prompt, generation_config=generation_config)
+        return response.text
+
+def _fit_prompt(prompt, max_chars):
+    """Cut the middle of an over-long prompt; instructions sit at its start and end."""
+    if len(prompt) <= max_chars:
+        return prompt
+    head = max_chars * 2 // 3
+    return prompt[:head] + "\n\n[...document truncated to fit the local model...]\n\n" + prompt[-(max_chars - head):]
+
+class LocalBackend(LLMBackend):
+    """A GGUF model run on the CPU by llama.cpp. One model instance, so calls run one at a time."""
+    name = "local"
+    label = "the local model"
+    setup_hint = "Please check LOCAL_LLM_MODEL_PATH and that llama-cpp-python is installed."
+
+    def __init__(self, model_path=LOCAL_LLM_MODEL_PATH, max_concurrency=None):
+        super().__init__(max_concurrency)
+        self.model_path = model_path
+        self._llm = None
+        self._model_lock = threading.Lock()
+
+    def available(self):
+        return (bool(self.model_path) and os.path.exists(self.model_path)
+                and importlib.util.find_spec("llama_cpp") is not None)
+
+    def _load(self):
+        if self._llm is None:
+            from llama_cpp import Llama
+
+            self._llm = Llama(model_path=self.model_path, n_ctx=LOCAL_LLM_CONTEXT_TOKENS,
+                              n_threads=LOCAL_LLM_THREADS or None, verbose=False)
+        return self._llm
+
+    def _generate(self, prompt, generation_config):
+        max_tokens = min((generation_config or {}).get("max_output_tokens", LOCAL_LLM_MAX_TOKENS),
+                         LOCAL_LLM_CONTEXT_TOKENS // 2)
+        prompt = _fit_prompt(prompt, (LOCAL_LLM_CONTEXT_TOKENS - max_tokens) * CHARS_PER_TOKEN)
+        with self._model_lock:  # a llama.cpp context is not thread-safe
+            result = self._load().create_chat_completion(
+                messages=[{"role": "user", "content": prompt}], max_tokens=max_tokens, temperature=0.2)
+        return result["choices"][0]["message"]["content"]
+
+    def generate_batch(self, prompts, generation_config=None):
+        # One model, so the batch runs back to back while it stays loaded and warm
+        with self._call():
+            results = []
+            for prompt in prompts:
+                try:
+                    results.append(self._generate(prompt, generation_config))
+                except Exception as e:
+                    results.append(e)
+            return results
+
+class FakeBackend(LLMBackend):
+    """Deterministic stand-in: the same prompt always gets the same answer, after FAKE_LLM_LATENCY_MS."""
+    name = "fake"
+    label = "the fake backend"
+    setup_hint = "Please check the LLM_BACKEND setting."
+    default_concurrency = 64
+
+    def __init__(self, latency_ms=FAKE_LLM_LATENCY_MS, max_concurrency=None):
+        super().__init__(max_concurrency)
+        self.latency = latency_ms / 1000
+
+    def _answer(self, prompt):
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:12]
+        words = len(prompt.split())
+        return (f"**FAKE RESPONSE**\n* Deterministic response {digest} to a {words}-word prompt\n"
+                f"* Generated without a language model for testing and benchmarks")
+
+    def _generate(self, prompt, generation_config):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._answer(prompt)
+
+    async def _generate_async(self, prompt, generation_config):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._answer(prompt)
+
+    def generate_batch(self, prompts, generation_config=None):
+        with self._call():
+            if self.latency:
+                time.sleep(self.latency)  # a batch costs one model pass
+            return [self._answer(prompt) for prompt in prompts]
+
+BACKENDS = {backend.name: backend for backend in (GeminiBackend, LocalBackend, FakeBackend)}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_backend(name=None, **kwargs):
+    """Shared instance of the named backend (LLM_BACKEND by default); kwargs apply when it is first created."""
+    name = name or LLM_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM_BACKEND '{name}'; choose from {', '.join(BACKENDS)}")
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = BACKENDS[name](**kwargs)
+        return _backends[name]
+
+def backend_stats():
+    """Call counters of every backend created so far."""
+    with _backends_lock:
+        backends = dict(_backends)
+    return {name: dict(backend.stats(), available=backend.available()) for name, backend in backends.items()}
+
+def benchmark(test_set, backend_names, question="How can I cancel or terminate this agreement?"):
+    """Latency of the GenAI-mode pipeline (analysis and one question per document) on each backend."""
+    import summariser_genai
+
+    results = {}
+    for name in backend_names:
+        backend = summariser_genai.use_backend(name)
+        if backend is None:
+            results[name] = {"error": "backend unavailable"}
+            continue
+        analysis_latencies, question_latencies = [], []
+        for document in test_set:
+            started = time.perf_counter()
+            summariser_genai.summarize_sections(summariser_genai.split_into_sections(document["text"]))
+            analysis_latencies.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            summariser_genai.answer_question(document["text"], question)
+            question_latencies.append(time.perf_counter() - started)
+        results[name] = dict(backend.stats(),
+                             mean_analysis_seconds=round(sum(analysis_latencies) / len(analysis_latencies), 4),
+                             mean_question_seconds=round(sum(question_latencies) / len(question_latencies), 4))
+    return results
+
+def main(argv=None):
+    from test_sets import load_test_set, DEFAULT_TEST_SET
+
+    parser = argparse.ArgumentParser(description="Benchmark language-model backends on the same analysis pipeline.")
+    parser.add_argument("test_set", nargs="?", default=DEFAULT_TEST_SET,
+                        help="JSONL file or directory of .txt documents (default: benchmarks/contracts.jsonl)")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="Comma-separated backends to compare")
+    parser.add_argument("--limit", type=int, help="Only use the first N documents")
+    args = parser.parse_args(argv)
+
+    test_set = load_test_set(args.test_set)[:args.limit]
+    print(json.dumps(benchmark(test_set, args.backends.split(",")), indent=2))
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Resident memory the process should stay under; documents that would push past it are
+# summarised in Lite mode instead of with the model
+MEMORY_BUDGET_MB = float(os.getenv('MEMORY_BUDGET_MB', '1536'))
+# Extraction stops after this many characters, however far a compressed upload expands
+MAX_DOCUMENT_CHARS = int(os.getenv('MAX_DOCUMENT_CHARS', '2000000'))
+# Rough bytes held per character of document text while it is analysed: the text, its
+# sections, joined copies, prompts and the clause index
+BYTES_PER_TEXT_CHAR = int(os.getenv('MEMORY_BYTES_PER_CHAR', '12'))
+
+MB = 1024 * 1024
+HWM_PATTERN = re.compile(r'VmHWM:\s+(\d+)\s+kB')
+
+def current_rss_mb():
+    """Resident set size of this process in MB, or None if it cannot be read."""
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / MB
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def _reset_peak():
+    """Reset the kernel's peak RSS counter so the next reading covers one stage (Linux only).
+
+    The counter belongs to the whole process, so only tools that run one
+    job at a time (the benchmarks) reset it; a server request never does.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+def peak_rss_mb():
+    """Peak resident set size in MB since the last reset, or over the process lifetime."""
+    try:
+        with open('/proc/self/status') as file:
+            match = HWM_PATTERN.search(file.read())
+        if match:
+            return int(match.group(1)) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / MB if sys.platform == 'darwin' else peak / 1024
+
+class MemoryTracker:
+    """Per-request memory accounting: the text's estimated footprint, and RSS for each processing stage.
+
+    RSS figures are process-wide, so concurrent requests show up in each
+    other's numbers; they are reported for monitoring only. Degradation is
+    decided from the request's own text length (estimated_mb) against what
+    the process has left, as soon as extraction passes it.
+    ``per_stage_peak`` resets the process's peak counter for each stage and
+    is only for tools that run one job at a time.
+    """
+
+    def __init__(self, budget_mb=MEMORY_BUDGET_MB, max_chars=MAX_DOCUMENT_CHARS, per_stage_peak=False):
+        self.budget_mb = budget_mb
+        self.max_chars = max_chars
+        self.per_stage_peak = per_stage_peak
+        self.stages = []
+        self.degraded = False
+        self.truncated = False
+        self.chars = 0
+
+    @contextmanager
+    def stage(self, name):
+        """Record process RSS before and after the enclosed block, and the process's peak RSS."""
+        resettable = self.per_stage_peak and _reset_peak()
+        before = current_rss_mb()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            after = current_rss_mb()
+            peak = peak_rss_mb()
+            self.stages.append({
+                "stage": name,
+                "rss_mb": _round(after),
+                "delta_mb": _round(after - before) if after is not None and before is not None else None,
+                # Unless reset for this stage, the peak covers the whole process lifetime
+                "peak_rss_mb": _round(peak),
+                "peak_is_per_stage": resettable,
+                "seconds": round(time.perf_counter() - started, 3)
+            })
+
+    def estimated_mb(self, chars):
+        """Memory the analysis of a document this long is expected to need."""
+        return chars * BYTES_PER_TEXT_CHAR / MB
+
+    def chars_within_budget(self):
+        """Characters of text whose analysis fits in what the process has left of the budget now."""
+        rss = current_rss_mb() or 0.0
+        return max(0, int((self.budget_mb - rss) * MB / BYTES_PER_TEXT_CHAR))
+
+    def text_progress(self):
+        """Callback for extractors, given the running character count; returns True once over budget.
+
+        The request is degraded as soon as its text outgrows the budget, so
+        extraction can stop expensive work (such as OCR) instead of finishing
+        it first.
+        """
+        limit = self.chars_within_budget()
+
+        def progress(chars):
+            self.chars = chars
+            if chars > limit:
+                self.degraded = True
+            return self.degraded
+
+        return progress
+
+    def check_text(self, text):
+        """Apply the hard character cap and decide whether to degrade; returns the text to analyse."""
+        if len(text) > self.max_chars:
+            text = text[:self.max_chars]
+            self.truncated = True
+        self.chars = len(text)
+        rss = current_rss_mb() or 0.0
+        if rss + self.estimated_mb(len(text)) > self.budget_mb:
+            self.degraded = True
+        return text
+
+    def report(self):
+        """JSON-friendly summary for response metadata."""
+        return {
+            "budget_mb": self.budget_mb,
+            "estimated_mb": _round(self.estimated_mb(self.chars)),
+            "rss_scope": "process",
+            "degraded": self.degraded,
+            "truncated": self.truncated,
+            "stages": self.stages
+        }
+
+def _round(value):
+    return round(value, 1) if value is not None else None
@@ -0,0 +1,228 @@
+import os
+import re
+import zlib
+import random
+import threading
+import numpy as np
+from collections import Counter, OrderedDict
+from difflib import SequenceMatcher
+from incremental import split_into_chunks, content_hash
+from compact_text import CompressedChunks, ChunkMap
+
+# Minimum estimated Jaccard similarity of two documents' shingle sets to reuse an analysis
+DEFAULT_SIMILARITY_THRESHOLD = float(os.getenv('NEAR_DUPLICATE_THRESHOLD', '0.8'))
+DEFAULT_MAX_DOCUMENTS = int(os.getenv('NEAR_DUPLICATE_DOCUMENTS', '256'))
+CHARS_PER_TOKEN = int(os.getenv('CHARS_PER_TOKEN', '4'))
+
+SHINGLE_SIZE = 5
+NUM_PERMUTATIONS = 128
+# 16 bands of 8 rows: documents at 0.8 similarity share a band ~95% of the time, at 0.5 only ~6%
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+
+MASK_64 = (1 << 64) - 1
+WORD = re.compile(r'\w+')
+
+# Multiply-shift hash functions (odd multiplier, 64-bit wraparound, keep the high 32 bits).
+# Fixed seed so signatures stay comparable across processes and restarts.
+_rng = random.Random(20240601)
+PERMUTATIONS = [(_rng.getrandbits(64) | 1, _rng.getrandbits(64)) for _ in range(NUM_PERMUTATIONS)]
+_MULTIPLIERS = np.array([a for a, _ in PERMUTATIONS], dtype=np.uint64)[:, None]
+_OFFSETS = np.array([b for _, b in PERMUTATIONS], dtype=np.uint64)[:, None]
+# Shingles hashed per step; bounds the (permutations x shingles) array at 4 MB
+MINHASH_BLOCK = 4096
+
+def shingles(text, size=SHINGLE_SIZE):
+    """CRC32 hashes of the document's overlapping lowercase word n-grams."""
+    words = WORD.findall(text.lower())
+    if len(words) < size:
+        return {zlib.crc32(" ".join(words).encode('utf-8'))} if words else set()
+    return {zlib.crc32(" ".join(words[i:i + size]).encode('utf-8')) for i in range(len(words) - size + 1)}
+
+def minhash_signature(text):
+    """MinHash signature of the document's shingle set (empty for empty text)."""
+    hashes = np.fromiter(shingles(text), dtype=np.uint64)
+    if not hashes.size:
+        return ()
+    # uint64 arithmetic wraps like the & MASK_64 of the hash functions
+    minimum = np.full(NUM_PERMUTATIONS, MASK_64, dtype=np.uint64)
+    for start in range(0, hashes.size, MINHASH_BLOCK):
+        np.minimum(minimum, (_MULTIPLIERS * hashes[start:start + MINHASH_BLOCK] + _OFFSETS).min(axis=1), out=minimum)
+    # The minimum of the full 64-bit values has the minimum high half, so shift once per permutation
+    return tuple(int(value) >> 32 for value in minimum)
+
+def estimated_similarity(signature_a, signature_b):
+    """Estimated Jaccard similarity of two documents from their signatures."""
+    if not signature_a or not signature_b:
+        return 0.0
+    return sum(1 for a, b in zip(signature_a, signature_b) if a == b) / len(signature_a)
+
+def _bands(signature):
+    return [(band, signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]) for band in range(LSH_BANDS)]
+
+def _snippet(text, length=160):
+    text = " ".join(text.split())
+    return text[:length] + ("..." if len(text) > length else "")
+
+def diff_documents(old_text, new_text, max_items=10):
+    """Summarise how a near-duplicate differs from the document it was matched to.
+
+    Paragraphs are aligned by content hash. Changed paragraphs that still
+    mostly match are reduced to their word-level replacements (e.g. a
+    different company name), counted across the document.
+    """
+    old_chunks = split_into_chunks(old_text)
+    new_chunks = split_into_chunks(new_text)
+    matcher = SequenceMatcher(None, [content_hash(c) for c in old_chunks], [content_hash(c) for c in new_chunks],
+                              autojunk=False)
+
+    replacements = Counter()
+    added = []
+    removed = []
+    unchanged = 0
+    changed = 0
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            unchanged += i2 - i1
+            continue
+        changed += max(i2 - i1, j2 - j1)
+        if tag == 'replace' and i2 - i1 == j2 - j1:
+            for old_chunk, new_chunk in zip(old_chunks[i1:i2], new_chunks[j1:j2]):
+                old_words, new_words = old_chunk.split(), new_chunk.split()
+                words = SequenceMatcher(None, old_words, new_words, autojunk=False)
+                if words.ratio() < 0.5:
+                    removed.append(old_chunk)
+                    added.append(new_chunk)
+                    continue
+                for word_tag, a1, a2, b1, b2 in words.get_opcodes():
+                    if word_tag != 'equal':
+                        replacements[(" ".join(old_words[a1:a2]), " ".join(new_words[b1:b2]))] += 1
+        else:
+            removed.extend(old_chunks[i1:i2])
+            added.extend(new_chunks[j1:j2])
+
+    return {
+        "unchanged_paragraphs": unchanged,
+        "changed_paragraphs": changed,
+        "replacements": [{"old": old, "new": new, "count": count}
+                         for (old, new), count in replacements.most_common(max_items)],
+        "added": [_snippet(chunk) for chunk in added[:max_items]],
+        "removed": [_snippet(chunk) for chunk in removed[:max_items]]
+    }
+
+class NearDuplicateIndex:
+    """MinHash/LSH index of analysed documents, used to reuse analyses of near-identical uploads.
+
+    Documents match across owners (sessions or batch jobs), so the same
+    boilerplate terms uploaded by different users share one analysis. Each
+    entry records its ``owner`` so callers can withhold the other document's
+    name and contents when the owners differ.
+    """
+
+    def __init__(self, threshold=DEFAULT_SIMILARITY_THRESHOLD, max_documents=DEFAULT_MAX_DOCUMENTS):
+        self.threshold = threshold
+        self.max_documents = max_documents
+        self._documents = OrderedDict()  # content hash -> entry dict
+        self._buckets = {}               # (band, band rows) -> set of content hashes
+        self._lock = threading.Lock()
+        self.exact_matches = 0
+        self.near_matches = 0
+        self.misses = 0
+        self.analyses_avoided = 0
+        self.tokens_avoided = 0
+
+    def find(self, key, signature, lengths=None):
+        """Return (entry, similarity) for the closest document analysed with the same lengths, or None."""
+        with self._lock:
+            entry = self._documents.get(key)
+            if entry is not None and entry["lengths"] == lengths:
+                self._documents.move_to_end(key)
+                self.exact_matches += 1
+                return entry, 1.0
+
+            candidates = set()
+            for band in _bands(signature) if signature else []:
+                candidates.update(self._buckets.get(band, ()))
+
+            best, best_score = None, 0.0
+            for candidate in candidates:
+                entry = self._documents[candidate]
+                if entry["lengths"] != lengths:
+                    continue
+                score = estimated_similarity(signature, entry["signature"])
+                if score > best_score:
+                    best, best_score = entry, score
+
+            if best is not None and best_score >= self.threshold:
+                self._documents.move_to_end(best["key"])
+                self.near_matches += 1
+                return best, best_score
+
+            self.misses += 1
+            return None
+
+    def add(self, key, name, signature, text, state, lengths=None, owner=None):
+        """Index an analysed document and its owner together with the state needed to reuse its analysis.
+
+        The text is kept compressed (entry["chunks"]); whole-document states
+        already hold it that way, and then the state's copy is shared.
+        """
+        chunks = state.get("chunks") if state else None
+        if isinstance(chunks, ChunkMap):
+            chunks = chunks.chunks
+        else:
+            chunk_list = split_into_chunks(text)
+            chunks = CompressedChunks(chunk_list, [content_hash(chunk) for chunk in chunk_list])
+        with self._lock:
+            if key in self._documents:
+                self._remove(key)
+            self._documents[key] = {"key": key, "owner": owner, "name": name, "signature": signature,
+                                             "chunks": chunks, "state": state, "lengths": lengths}
+            for band in _bands(signature) if signature else []:
+                self._buckets.setdefault(band, set()).add(key)
+            while len(self._documents) > self.max_documents:
+                self._remove(next(iter(self._documents)))
+
+    def record_reuse(self, text, chars_changed):
+        """Count the model input avoided by reusing an analysis for this text."""
+        with self._lock:
+            if chars_changed == 0:
+                self.analyses_avoided += 1
+            self.tokens_avoided += max(len(text) - chars_changed, 0) // CHARS_PER_TOKEN
+
+    def _remove(self, document):
+        entry = self._documents.pop(document)
+        for band in _bands(entry["signature"]) if entry["signature"] else []:
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(document)
+                if not bucket:
+                    del self._buckets[band]
+
+    def _memory(self):
+        """Bytes held for the indexed documents' text, compressed and as plain strings."""
+        stored = raw = 0
+        for entry in self._documents.values():
+            stored += entry["chunks"].nbytes
+            raw += entry["chunks"].raw_nbytes
+        documents = len(self._documents)
+        return {
+            "text_bytes": stored,
+            "text_bytes_per_document": stored // documents if documents else 0,
+            "uncompressed_bytes": raw,
+            "compression_ratio": round(raw / stored, 2) if stored else None
+        }
+
+    def stats(self):
+        """Match counters, estimated spend avoided and memory held for document text."""
+        with self._lock:
+            return {
+                "documents": len(self._documents),
+                "memory": self._memory(),
+                "exact_matches": self.exact_matches,
+                "near_matches": self.near_matches,
+                "misses": self.misses,
+                "analyses_avoided": self.analyses_avoided,
+                "tokens_avoided": self.tokens_avoided,
+                "threshold": self.threshold
+            }
@@ -0,0 +1,249 @@
+import os
+import re
+import bisect
+import threading
+from datetime import date
+
+# Matches scored below this are sent to the language model for confirmation, in one batch per document
+OBLIGATION_VERIFY_BELOW = float(os.getenv('OBLIGATION_VERIFY_BELOW', '0.7'))
+OBLIGATION_VERIFY_MAX = int(os.getenv('OBLIGATION_VERIFY_MAX', '40'))
+OBLIGATION_MAX_ITEMS = int(os.getenv('OBLIGATION_MAX_ITEMS', '200'))
+
+# Numbers in words combine these, as in "forty-five" or "one hundred and eighty"; see _number_words
+NUMBER_WORDS = {word: number for number, word in enumerate(
+    ["one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten", "eleven", "twelve",
+     "thirteen", "fourteen", "fifteen", "sixteen", "seventeen", "eighteen", "nineteen"], 1)}
+TENS_WORDS = {word: number for number, word in zip(
+    range(20, 100, 10), ["twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"])}
+MONTHS = {name: number for number, name in enumerate(
+    ["january", "february", "march", "april", "may", "june", "july", "august", "september", "october",
+     "november", "december"], 1)}
+MONTHS.update({name[:3]: number for name, number in list(MONTHS.items())})
+CURRENCIES = {"$": "USD", "us$": "USD", "usd": "USD", "dollars": "USD", "€": "EUR", "eur": "EUR", "euros": "EUR",
+              "£": "GBP", "gbp": "GBP", "pounds": "GBP"}
+
+_DIGIT_WORDS = '|'.join(list(NUMBER_WORDS)[:9])
+_BELOW_HUNDRED = (r'(?:(?:' + '|'.join(TENS_WORDS) + r')(?:[- ](?:' + _DIGIT_WORDS + r'))?|'
+                  + '|'.join(sorted(NUMBER_WORDS, key=len, reverse=True)) + r')')
+_NUMBER_WORDS = (r'(?:(?:a|' + _DIGIT_WORDS + r')\s+hundred(?:\s+(?:and\s+)?' + _BELOW_HUNDRED + r')?|'
+                 + _BELOW_HUNDRED + r')')
+_NUMBER = r'\b(?P<number>\d+(?:\.\d+)?|' + _NUMBER_WORDS + r')(?:\s*\(\d+\))?'
+_UNIT = r'(?P<unit>(?:business|calendar|working)\s+days?|days?|weeks?|months?|years?)'
+DURATION = _NUMBER + r'\s*[- ]?\s*' + _UNIT
+MONEY = (r'(?:(?P<symbol>US\$|[$€£])\s?(?P<amount>\d[\d,]*(?:\.\d{1,2})?)'
+         r'|\b(?P<code>USD|EUR|GBP)\s?(?P<code_amount>\d[\d,]*(?:\.\d{1,2})?)'
+         r'|\b(?P<word_amount>\d[\d,]*(?:\.\d{1,2})?)\s?(?P<word>dollars|euros|pounds|USD|EUR|GBP)\b)')
+_MONTH = r'(?P<month>' + '|'.join(sorted(MONTHS, key=len, reverse=True)) + r')\.?'
+DATE = (r'(?:\b' + _MONTH + r'\s+(?P<day>\d{1,2})(?:st|nd|rd|th)?,?\s+(?P<year>\d{4})\b'
+        r'|\b(?P<day2>\d{1,2})(?:st|nd|rd|th)?\s+(?:day\s+of\s+)?' + _MONTH.replace('month', 'month2')
+        + r',?\s+(?P<year2>\d{4})\b'
+        r'|\b(?P<iso_year>\d{4})-(?P<iso_month>\d{2})-(?P<iso_day>\d{2})\b'
+        r'|\b(?P<first>\d{1,2})/(?P<second>\d{1,2})/(?P<year3>\d{4})\b)')
+
+# Each rule: the kind of item, its pattern and a base confidence. Earlier rules win overlapping matches.
+RULES = [
+    ("notice_period", re.compile(DURATION + r"(?:'|’)?s?\s+(?:prior\s+|advance\s+)?(?:written\s+)?notice", re.I), 0.8),
+    ("notice_period", re.compile(r"\bnotice\s+(?:period\s+)?of\s+(?:at\s+least\s+|not\s+less\s+than\s+|no\s+less\s+than\s+)?"
+                                 + DURATION, re.I), 0.8),
+    ("renewal", re.compile(r"\b(?:automatic(?:ally)?\s+renew\w*|renew\w*\s+automatically|auto-?renew\w*)", re.I), 0.75),
+    ("deadline", re.compile(r"\b(?:within|no\s+later\s+than|not\s+later\s+than|at\s+least|before\s+the\s+end\s+of)\s+"
+                            + DURATION, re.I), 0.65),
+    ("term", re.compile(r"\b(?:term|period)\s+of\s+" + DURATION, re.I), 0.65),
+    ("fee", re.compile(r"\b\d+(?:\.\d+)?\s?%\s+(?:per|a|each)\s+(?P<per>month|year|annum)\b", re.I), 0.6),
+    ("fee", re.compile(MONEY, re.I), 0.55),
+    ("date", re.compile(DATE, re.I), 0.55),
+]
+
+# Words that make a match more likely to be a real obligation or term, per kind
+OBLIGATION_CUES = re.compile(r"\b(?:shall|must|will|agrees?|required|due|payable|entitled)\b", re.I)
+KIND_CUES = {
+    "deadline": re.compile(r"\b(?:notice|notify|terminat\w*|cancel\w*|pay\w*|refund\w*|return\w*|respond|deliver\w*|cure)\b", re.I),
+    "term": re.compile(r"\b(?:agreement|contract|subscription|initial|renewal)\b", re.I),
+    "renewal": re.compile(DURATION, re.I),
+    "fee": re.compile(r"\b(?:pay\w*|fees?|charges?|price|cost|interest|penalt\w*|refund\w*)\b", re.I),
+    "date": re.compile(r"\b(?:effective|commenc\w*|expir\w*|due|terminat\w*|starts?|ends?|until)\b", re.I),
+}
+SENTENCE_END = re.compile(r'(?<=[.;:!?])\s+|\n\s*\n')
+SENTENCE_CONTEXT = 300  # characters searched either side of a match for its sentence
+
+class Extraction:
+    """One extracted item: its kind, matched text, normalised value, sentence and confidence."""
+    __slots__ = ("id", "kind", "text", "value", "sentence", "clause_id", "confidence", "verified")
+
+    def __init__(self, kind, text, value, sentence, clause_id, confidence):
+        self.id = None
+        self.kind = kind
+        self.text = text
+        self.value = value
+        self.sentence = sentence
+        self.clause_id = clause_id
+        self.confidence = confidence
+        self.verified = None
+
+def _number_words(value):
+    """Value of a number in words, e.g. "forty-five" or "one hundred and twenty"."""
+    number = 0
+    for word in re.split(r'[\s-]+', value):
+        if word == "hundred":
+            number *= 100
+        elif word == "a":
+            number += 1
+        elif word != "and":
+            number += NUMBER_WORDS.get(word) or TENS_WORDS[word]
+    return number
+
+def _number(value):
+    value = value.lower()
+    if value[0].isdigit():
+        return float(value) if '.' in value else int(value)
+    return _number_words(value)
+
+def _duration(match):
+    unit = " ".join(match.group("unit").lower().split()).rstrip('s')
+    return {"amount": _number(match.group("number")), "unit": unit.replace(" ", "_") + "s"}
+
+def _money(match):
+    groups = match.groupdict()
+    if groups.get("symbol"):
+        currency, amount = CURRENCIES[groups["symbol"].lower()], groups["amount"]
+    elif groups.get("code"):
+        currency, amount = groups["code"].upper(), groups["code_amount"]
+    else:
+        currency, amount = CURRENCIES[groups["word"].lower()], groups["word_amount"]
+    return {"amount": float(amount.replace(',', '')), "currency": currency}
+
+def _date(match):
+    """ISO date, and whether the day and month order had to be guessed."""
+    groups = match.groupdict()
+    if groups.get("year"):
+        year, month, day, ambiguous = groups["year"], MONTHS[groups["month"].lower()], groups["day"], False
+    elif groups.get("year2"):
+        year, month, day, ambiguous = groups["year2"], MONTHS[groups["month2"].lower()], groups["day2"], False
+    elif groups.get("iso_year"):
+        year, month, day, ambiguous = groups["iso_year"], groups["iso_month"], groups["iso_day"], False
+    else:
+        # Numeric dates are read month first unless that is impossible
+        first, second = int(groups["first"]), int(groups["second"])
+        year, ambiguous = groups["year3"], first <= 12 and second <= 12 and first != second
+        month, day = (first, second) if first <= 12 else (second, first)
+    return date(int(year), int(month), int(day)).isoformat(), ambiguous
+
+def _value(kind, match):
+    """Normalised value and a confidence adjustment for the match."""
+    groups = match.groupdict()
+    if groups.get("unit"):
+        return _duration(match), 0.0
+    if kind == "fee" and groups.get("per"):
+        return {"percent": float(match.group().split('%')[0]), "per": groups["per"].lower()}, 0.0
+    if kind == "fee":
+        return _money(match), 0.0
+    if kind == "date":
+        iso, ambiguous = _date(match)
+        return {"date": iso}, -0.2 if ambiguous else 0.0
+    return None, 0.0
+
+def _sentence(text, start, end):
+    """Bounds of the sentence around text[start:end], within SENTENCE_CONTEXT characters either side."""
+    low = max(0, start - SENTENCE_CONTEXT)
+    sentence_start = low
+    for boundary in SENTENCE_END.finditer(text, low, start):
+        sentence_start = boundary.end()
+    boundary = SENTENCE_END.search(text, end, min(len(text), end + SENTENCE_CONTEXT))
+    sentence_end = boundary.start() if boundary else min(len(text), end + SENTENCE_CONTEXT)
+    return sentence_start, sentence_end
+
+def _score(kind, base, sentence):
+    confidence = base
+    if OBLIGATION_CUES.search(sentence):
+        confidence += 0.15
+    cue = KIND_CUES.get(kind)
+    if cue is not None and cue.search(sentence):
+        confidence += 0.1
+    return round(min(confidence, 0.99), 2)
+
+class ObligationSet:
+    """Items extracted from one document, and the state of their language-model verification."""
+
+    def __init__(self, document_key, items, clause_index=None):
+        self.document_key = document_key
+        self.items = items
+        self.clause_index = clause_index
+        # not_needed, unverified, pending (queued), done, or unavailable (the model call failed)
+        self.verification = "unverified" if self.unverified() else "not_needed"
+        self._lock = threading.Lock()
+
+    def unverified(self):
+        """Low-confidence items awaiting verification, at most OBLIGATION_VERIFY_MAX of them."""
+        return [item for item in self.items
+                if item.verified is None and item.confidence < OBLIGATION_VERIFY_BELOW][:OBLIGATION_VERIFY_MAX]
+
+    def mark_pending(self):
+        with self._lock:
+            self.verification = "pending"
+
+    def apply_verdicts(self, verdicts):
+        """Record {item id: True/False} from verification; an empty result means it failed."""
+        with self._lock:
+            if not verdicts:
+                self.verification = "unavailable"
+                return
+            for item in self.items:
+                if item.id in verdicts:
+                    item.verified = bool(verdicts[item.id])
+            self.verification = "done"
+
+    def _describe(self, item):
+        entry = {"id": item.id, "type": item.kind, "text": item.text, "value": item.value,
+                 "sentence": item.sentence, "confidence": item.confidence, "verified": item.verified}
+        if self.clause_index is not None and item.clause_id is not None:
+            clause = self.clause_index.clauses[item.clause_id]
+            entry["clause"] = {"id": item.clause_id, "number": clause.number, "heading": clause.heading}
+        return entry
+
+    def to_json(self):
+        """Items by document order, without those verification rejected, with counts per type."""
+        with self._lock:
+            items = [self._describe(item) for item in self.items if item.verified is not False]
+            rejected = sum(1 for item in self.items if item.verified is False)
+            verification = self.verification
+        counts = {}
+        for item in items:
+            counts[item["type"]] = counts.get(item["type"], 0) + 1
+        return {"items": items, "counts": counts, "rejected": rejected, "verification": verification}
+
+def extract_obligations(text, clause_index=None, document_key=None, max_items=OBLIGATION_MAX_ITEMS):
+    """Deadlines, notice periods, renewal terms, fees and dates in the text, found by RULES.
+
+    Each pattern scans the whole text once; matches are mapped back to
+    clauses as in the clause index, and scored by the cue words in their
+    sentence.
+    """
+    starts = [clause.start for clause in clause_index.clauses] if clause_index is not None else None
+    claimed = []  # sorted, non-overlapping (start, end) spans already extracted
+    found = []
+    for kind, regex, base in RULES:
+        for match in regex.finditer(text):
+            start, end = match.span()
+            position = bisect.bisect_left(claimed, (start, end))
+            if ((position > 0 and claimed[position - 1][1] > start)
+                    or (position < len(claimed) and claimed[position][0] < end)):
+                continue
+            try:
+                value, adjustment = _value(kind, match)
+            except (ValueError, KeyError):
+                continue  # e.g. "31/31/2024"
+            sentence_start, sentence_end = _sentence(text, start, end)
+            sentence = " ".join(text[sentence_start:sentence_end].split())
+            if kind == "renewal":
+                duration = KIND_CUES["renewal"].search(sentence)
+                value = _duration(duration) if duration else None
+            clause_id = bisect.bisect_right(starts, start) - 1 if starts else None
+            confidence = round(max(0.05, _score(kind, base, sentence) + adjustment), 2)
+            claimed.insert(position, (start, end))
+            found.append((start, Extraction(kind, match.group(), value, sentence, clause_id, confidence)))
+
+    found.sort(key=lambda entry: entry[0])
+    items = [item for _, item in found[:max_items]]
+    for number, item in enumerate(items, 1):
+        item.id = number
+    return ObligationSet(document_key, items, clause_index)
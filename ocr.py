@@ -0,0 +1,190 @@
+import os
+import shutil
+import hashlib
+import importlib.util
+import itertools
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# OCR of scanned PDF pages with Tesseract (requires pytesseract, Pillow and the tesseract binary)
+OCR_ENABLED = os.getenv('OCR_ENABLED', 'true').lower() != 'false'
+OCR_LANGUAGE = os.getenv('OCR_LANGUAGE', 'eng')
+OCR_WORKERS = int(os.getenv('OCR_WORKERS', str(os.cpu_count() or 1)))
+# Pages whose text layer has fewer characters than this are treated as image-only
+OCR_MIN_TEXT_CHARS = int(os.getenv('OCR_MIN_TEXT_CHARS', '20'))
+OCR_CACHE_PAGES = int(os.getenv('OCR_CACHE_PAGES', '2000'))
+# Scanned pages decoded and recognised at a time; bounds the page images held in memory, and
+# extraction stops starting new batches once it has the text it needs
+OCR_BATCH_PAGES = int(os.getenv('OCR_BATCH_PAGES', str(2 * OCR_WORKERS)))
+# If set, recognised page text is also kept here so it survives restarts and is shared by workers
+OCR_CACHE_DIR = os.getenv('OCR_CACHE_DIR')
+
+_available = None
+_executor = None
+_lock = threading.Lock()
+_cache = OrderedDict()  # page hash -> text
+_jobs = {}              # job id -> {"label", "pages", "done"}
+_job_ids = itertools.count(1)
+_counters = {"pages_recognised": 0, "cache_hits": 0, "failures": 0}
+
+def ocr_available():
+    """True if OCR is enabled and pytesseract, Pillow and the tesseract binary are all present."""
+    global _available
+    if _available is None:
+        try:
+            import pytesseract
+            # Pillow decodes the page images, in this process and the workers
+            _available = (OCR_ENABLED and importlib.util.find_spec("PIL") is not None
+                          and bool(shutil.which(pytesseract.pytesseract.tesseract_cmd)))
+        except ImportError:
+            _available = False
+    return _available
+
+def page_images(page):
+    """Encoded images the page draws (empty if it draws none or they cannot be decoded).
+
+    Only XObjects the content stream paints with ``Do`` count; some writers
+    share one resource dictionary, holding every image, across all pages.
+    The drawn images are decoded by PyPDF2's ``PageObject.images`` on a
+    stand-in page whose resources hold just those.
+    """
+    from PyPDF2 import PageObject
+    from PyPDF2.generic import ContentStream, DictionaryObject, NameObject
+
+    try:
+        x_objects = page["/Resources"]["/XObject"].get_object()
+    except KeyError:
+        return []
+    try:
+        contents = page.get_contents()
+        drawn = {operands[0] for operands, operator in ContentStream(contents, page.pdf).operations
+                 if operator == b"Do" and operands} if contents is not None else set()
+        images = DictionaryObject({NameObject(name): x_objects.raw_get(name) for name in x_objects
+                                   if name in drawn and x_objects[name].get_object().get("/Subtype") == "/Image"})
+        if not images:
+            return []
+        drawn_page = PageObject(pdf=page.pdf)
+        drawn_page[NameObject("/Resources")] = DictionaryObject({NameObject("/XObject"): images})
+        return [image.data for image in drawn_page.images]
+    except Exception as e:
+        print(f"Could not read page images: {e}")
+        return []
+
+def page_hash(images, language=OCR_LANGUAGE):
+    """Cache key of a page: its image contents and the OCR language."""
+    digest = hashlib.sha256(language.encode('utf-8'))
+    for data in images:
+        digest.update(hashlib.sha256(data).digest())
+    return digest.hexdigest()
+
+def recognise_page(images, language=OCR_LANGUAGE):
+    """OCR one page's images. Runs in a worker process."""
+    import io
+    import pytesseract
+    from PIL import Image
+
+    texts = []
+    for data in images:
+        with Image.open(io.BytesIO(data)) as image:
+            texts.append(pytesseract.image_to_string(image, lang=language).strip())
+    return "\n".join(text for text in texts if text)
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            # Spawned workers do not inherit the web server's threads and locks
+            _executor = ProcessPoolExecutor(max_workers=OCR_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _executor
+
+def _cached(key):
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    if OCR_CACHE_DIR:
+        path = os.path.join(OCR_CACHE_DIR, f"{key}.txt")
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as file:
+                text = file.read()
+            _remember(key, text, persist=False)
+            return text
+    return None
+
+def _remember(key, text, persist=True):
+    with _lock:
+        _cache[key] = text
+        _cache.move_to_end(key)
+        while len(_cache) > OCR_CACHE_PAGES:
+            _cache.popitem(last=False)
+    if persist and OCR_CACHE_DIR:
+        os.makedirs(OCR_CACHE_DIR, exist_ok=True)
+        with open(os.path.join(OCR_CACHE_DIR, f"{key}.txt"), 'w', encoding='utf-8') as file:
+            file.write(text)
+
+def ocr_pages(pages, parallel=True, progress=None, label=None):
+    """Recognise text on image-only pages; ``pages`` is a list of (page number, images).
+
+    Cached pages are answered immediately and the rest are spread over the
+    process pool (or run in this process when ``parallel`` is false).
+    ``progress(done, total)`` is called as pages finish, and the job is
+    listed in ocr_stats() while it runs. Returns {page number: text}.
+    """
+    results = {}
+    pending = {}
+    for number, images in pages:
+        key = page_hash(images)
+        text = _cached(key)
+        if text is not None:
+            results[number] = text
+        else:
+            pending[number] = (key, images)
+
+    with _lock:
+        _counters["cache_hits"] += len(results)
+        job_id = next(_job_ids)
+        _jobs[job_id] = {"label": label, "pages": len(pages), "done": len(results)}
+
+    def finished(number, key, text):
+        results[number] = text
+        _remember(key, text)
+        with _lock:
+            _counters["pages_recognised"] += 1
+            _jobs[job_id]["done"] += 1
+            done = _jobs[job_id]["done"]
+        if progress:
+            progress(done, len(pages))
+
+    try:
+        if parallel and len(pending) > 1:
+            executor = _get_executor()
+            futures = {executor.submit(recognise_page, images): (number, key)
+                       for number, (key, images) in pending.items()}
+            for future in as_completed(futures):
+                number, key = futures[future]
+                try:
+                    finished(number, key, future.result())
+                except Exception as e:
+                    with _lock:
+                        _counters["failures"] += 1
+                    print(f"OCR failed on page {number + 1}: {e}")
+        else:
+            for number, (key, images) in pending.items():
+                try:
+                    finished(number, key, recognise_page(images))
+                except Exception as e:
+                    with _lock:
+                        _counters["failures"] += 1
+                    print(f"OCR failed on page {number + 1}: {e}")
+    finally:
+        with _lock:
+            del _jobs[job_id]
+    return results
+
+def ocr_stats():
+    """Counters, cache size and the progress of OCR jobs in flight."""
+    with _lock:
+        return dict(_counters, available=bool(_available), cached_pages=len(_cache),
+                    in_progress=[dict(job) for job in _jobs.values()])
@@ -0,0 +1,115 @@
+import os
+import json
+import time
+import heapq
+import itertools
+import threading
+from contextlib import contextmanager
+
+# Answer the common questions below in the background after each upload (one extra Gemini call per document)
+QA_PRECOMPUTE = os.getenv('QA_PRECOMPUTE', 'false').lower() == 'true'
+# Seconds without a foreground request before background work starts
+PRECOMPUTE_IDLE_SECONDS = float(os.getenv('PRECOMPUTE_IDLE_SECONDS', '2'))
+
+DEFAULT_COMMON_QUESTIONS = [
+    "How can I cancel or terminate this agreement?",
+    "Can I get a refund?",
+    "Is my data shared with third parties?",
+    "Do disputes have to go to arbitration?",
+    "Does this agreement renew automatically?",
+    "What fees or charges do I have to pay?",
+]
+
+def load_common_questions():
+    """Questions to precompute, from a JSON list in QA_PRECOMPUTE_QUESTIONS_FILE if set."""
+    questions_file = os.getenv('QA_PRECOMPUTE_QUESTIONS_FILE')
+    if questions_file:
+        try:
+            with open(questions_file, 'r', encoding='utf-8') as file:
+                return [str(question) for question in json.load(file)]
+        except Exception as e:
+            print(f"Could not load precompute questions from {questions_file}: {e}")
+    return DEFAULT_COMMON_QUESTIONS
+
+COMMON_QUESTIONS = load_common_questions()
+
+class IdleScheduler:
+    """Runs background jobs one at a time, lowest priority number first, only while the app is idle.
+
+    Foreground requests mark themselves with begin()/end() (or the
+    foreground() context manager). A job starts only when none are in
+    progress and none have finished in the last ``idle_seconds``, so
+    background work never queues ahead of a user's request.
+    """
+
+    def __init__(self, idle_seconds=PRECOMPUTE_IDLE_SECONDS):
+        self.idle_seconds = idle_seconds
+        self._queue = []  # (priority, sequence, key, job, args)
+        self._keys = set()
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._active = 0
+        self._last_active = 0.0
+        self._thread = None
+        self.completed = 0
+        self.failed = 0
+
+    def begin(self):
+        with self._condition:
+            self._active += 1
+
+    def end(self):
+        with self._condition:
+            self._active -= 1
+            self._last_active = time.monotonic()
+            self._condition.notify_all()
+
+    @contextmanager
+    def foreground(self):
+        self.begin()
+        try:
+            yield
+        finally:
+            self.end()
+
+    def submit(self, job, *args, priority=10, key=None):
+        """Queue job(*args); a job whose key is already queued is not added again."""
+        with self._condition:
+            if key is not None:
+                if key in self._keys:
+                    return False
+                self._keys.add(key)
+            heapq.heappush(self._queue, (priority, next(self._sequence), key, job, args))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="idle-scheduler", daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+        return True
+
+    def _next_job(self):
+        with self._condition:
+            while True:
+                if self._queue and self._active == 0:
+                    remaining = self._last_active + self.idle_seconds - time.monotonic()
+                    if remaining <= 0:
+                        _, _, key, job, args = heapq.heappop(self._queue)
+                        self._keys.discard(key)
+                        return job, args
+                    self._condition.wait(remaining)
+                else:
+                    self._condition.wait()
+
+    def _run(self):
+        while True:
+            job, args = self._next_job()
+            try:
+                job(*args)
+                self.completed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"Background job {getattr(job, '__name__', job)} failed: {e}")
+
+    def stats(self):
+        with self._condition:
+            return {"queued": len(self._queue), "active_requests": self._active,
+                    "completed": self.completed, "failed": self.failed}
@@ -0,0 +1,192 @@
+import os
+import re
+import math
+import threading
+from collections import Counter, OrderedDict
+
+# Minimum cosine similarity between two questions' character n-gram vectors to reuse an answer;
+# the questions must also have the same content words (see content_words)
+DEFAULT_SIMILARITY_THRESHOLD = float(os.getenv('QA_CACHE_THRESHOLD', '0.7'))
+DEFAULT_MAX_DOCUMENTS = int(os.getenv('QA_CACHE_DOCUMENTS', '64'))
+DEFAULT_MAX_ANSWERS = int(os.getenv('QA_CACHE_ANSWERS_PER_DOCUMENT', '128'))
+# Earlier turns of a session's conversation included with each new question
+QA_HISTORY_TURNS = int(os.getenv('QA_HISTORY_TURNS', '3'))
+
+NGRAM_SIZE = 3
+
+# Function words that may differ between two questions sharing an answer. Pronouns, negations, modals,
+# question words and prepositions of time or direction are left out on purpose: "Can I cancel?" and
+# "Can they cancel?", or "before the end of the term" and "after the end of the term", ask different things
+STOPWORDS = {"a", "an", "the", "this", "that", "these", "those", "of", "in", "on", "at", "by", "for", "with", "as",
+             "is", "are", "am", "was", "were", "be", "been", "being", "do", "does", "did", "there", "here", "any",
+             "some", "and", "also", "just", "please", "exactly", "actually", "really", "tell", "about"}
+
+# Answers starting with these are error messages and are never cached
+UNCACHEABLE_PREFIXES = ("Error", "GenAI service unavailable", "Q&A feature requires")
+
+def normalize_question(question):
+    """Lowercase, drop punctuation and collapse whitespace so trivially different questions match."""
+    question = question.lower().replace("'", "")
+    question = re.sub(r'[^a-z0-9]+', ' ', question)
+    return question.strip()
+
+def stem(word):
+    """Strip common inflections so "contracts", "cancelled" and "cancelling" match their base words."""
+    if word.isdigit() or len(word) <= 3:
+        return word
+    if word.endswith("ies"):
+        word = word[:-3] + "y"
+    else:
+        for suffix in ("ing", "ed", "es", "s", "e"):
+            if word.endswith(suffix) and len(word) - len(suffix) >= 3 and not word.endswith(("ss", "us", "is")):
+                word = word[:-len(suffix)]
+                break
+    # "cancell(ed)", "stopp(ing)" and "pass" lose their doubled final consonant
+    if word[-1] == word[-2] and word[-1] not in "aeiou":
+        word = word[:-1]
+    return word
+
+def content_words(normalized):
+    """Stemmed words of a normalized question other than STOPWORDS; similar questions must have the same set."""
+    return frozenset(stem(token) for token in normalized.split() if token not in STOPWORDS)
+
+def ngram_vector(normalized):
+    """Character n-gram counts and vector norm for a normalized question."""
+    padded = f" {normalized} "
+    counts = Counter(padded[i:i + NGRAM_SIZE] for i in range(len(padded) - NGRAM_SIZE + 1))
+    norm = math.sqrt(sum(count * count for count in counts.values()))
+    return counts, norm
+
+def cosine_similarity(a, b):
+    """Cosine similarity of two (counts, norm) n-gram vectors."""
+    counts_a, norm_a = a
+    counts_b, norm_b = b
+    if not norm_a or not norm_b:
+        return 0.0
+    if len(counts_a) > len(counts_b):
+        counts_a, counts_b = counts_b, counts_a
+    dot = sum(count * counts_b.get(gram, 0) for gram, count in counts_a.items())
+    return dot / (norm_a * norm_b)
+
+class AnswerCache:
+    """Per-document cache of Q&A answers, matched by normalized text and n-gram similarity."""
+
+    def __init__(self, threshold=DEFAULT_SIMILARITY_THRESHOLD, max_documents=DEFAULT_MAX_DOCUMENTS,
+                 max_answers=DEFAULT_MAX_ANSWERS):
+        self.threshold = threshold
+        self.max_documents = max_documents
+        self.max_answers = max_answers
+        # document key -> OrderedDict(normalized question -> (vector, content words, answer))
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, document_key, question):
+        """Return a cached answer for a matching question about this document, or None."""
+        normalized = normalize_question(question)
+        with self._lock:
+            answers = self._documents.get(document_key)
+            if answers is None:
+                self.misses += 1
+                return None
+            self._documents.move_to_end(document_key)
+
+            if normalized in answers:
+                answers.move_to_end(normalized)
+                self.exact_hits += 1
+                return answers[normalized][2]
+
+            # Only questions with the same content words are candidates; they differ in function words or inflection
+            vector, words = ngram_vector(normalized), content_words(normalized)
+            best_key, best_score = None, 0.0
+            for cached_key, (cached_vector, cached_words, _) in answers.items():
+                if cached_words != words:
+                    continue
+                score = cosine_similarity(vector, cached_vector)
+                if score > best_score:
+                    best_key, best_score = cached_key, score
+
+            if best_key is not None and best_score >= self.threshold:
+                answers.move_to_end(best_key)
+                self.similar_hits += 1
+                return answers[best_key][2]
+
+            self.misses += 1
+            return None
+
+    def contains(self, document_key, question):
+        """True if this exact (normalized) question has a cached answer; does not count as a lookup."""
+        normalized = normalize_question(question)
+        with self._lock:
+            return normalized in self._documents.get(document_key, {})
+
+    def put(self, document_key, question, answer):
+        """Cache an answer unless it is an error message."""
+        if not answer or answer.startswith(UNCACHEABLE_PREFIXES):
+            return
+        normalized = normalize_question(question)
+        with self._lock:
+            answers = self._documents.setdefault(document_key, OrderedDict())
+            self._documents.move_to_end(document_key)
+            answers[normalized] = (ngram_vector(normalized), content_words(normalized), answer)
+            answers.move_to_end(normalized)
+
+            while len(answers) > self.max_answers:
+                answers.popitem(last=False)
+                self.evictions += 1
+            while len(self._documents) > self.max_documents:
+                _, dropped = self._documents.popitem(last=False)
+                self.evictions += len(dropped)
+
+    def stats(self):
+        """Hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.exact_hits + self.similar_hits + self.misses
+            return {
+                "documents": len(self._documents),
+                "answers": sum(len(answers) for answers in self._documents.values()),
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.exact_hits + self.similar_hits) / lookups, 3) if lookups else 0.0,
+                "threshold": self.threshold
+            }
+
+class ConversationHistory:
+    """Recent questions and answers per session, about the document the session is asking about.
+
+    History is private to its session: answers that depended on it must not
+    go into the shared AnswerCache.
+    """
+
+    def __init__(self, max_turns=QA_HISTORY_TURNS, max_sessions=1024):
+        self.max_turns = max_turns
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # session id -> (document key, [(question, answer)])
+        self._lock = threading.Lock()
+
+    def turns(self, session_id, document_key):
+        """The session's recent turns about this document, oldest first."""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or entry[0] != document_key:
+                return []
+            self._sessions.move_to_end(session_id)
+            return list(entry[1])
+
+    def add(self, session_id, document_key, question, answer):
+        if not self.max_turns or not answer or answer.startswith(UNCACHEABLE_PREFIXES):
+            return
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            turns = entry[1] if entry is not None and entry[0] == document_key else []
+            turns.append((question, answer))
+            del turns[:-self.max_turns]
+            self._sessions[session_id] = (document_key, turns)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
@@ -6,6 +6,8 @@ document.addEventListener('DOMContentLoaded', () => {
     const resultDiv = document.getElementById('result');
     const summaryText = document.getElementById('summaryText');
     const downloadLink = document.getElementById('downloadLink');
+    const sectionOutline = document.getElementById('sectionOutline');
+    const sectionList = document.getElementById('sectionList');
     const feedbackSection = document.getElementById('feedbackSection');
     const feedbackForm = document.getElementById('feedbackForm');
     const feedbackTextarea = document.getElementById('feedback');
@@ -217,9 +219,10 @@ document.addEventListener('DOMContentLoaded', () => {
             loader.style.display = 'none';
 
             if (response.ok && data.summary) {
-                // Format and show results
-                summaryText.innerHTML = formatSummaryText(data.summary);
+                // Show results, preferring the server-rendered HTML built from the same blocks as the PDF
+                summaryText.innerHTML = data.summary_html || formatSummaryText(data.summary);
                 downloadLink.href = data.download_link;
+                showOutline(data.outline);
                 resultDiv.style.display = 'block';
                 
                 // Show Q&A section if document is available
@@ -347,6 +350,67 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    // Long documents come with an outline of their parts; a part's detailed summary is fetched when first expanded
+    function showOutline(outline) {
+        sectionList.innerHTML = '';
+        if (!outline || !outline.length) {
+            sectionOutline.style.display = 'none';
+            return;
+        }
+        outline.forEach(part => {
+            const item = document.createElement('details');
+            item.className = 'section-item';
+            const title = document.createElement('summary');
+            title.className = 'section-item-title';
+            title.textContent = part.title;
+            item.appendChild(title);
+            if (part.summary) {
+                const brief = document.createElement('div');
+                brief.className = 'section-brief summary-text';
+                brief.innerHTML = formatSummaryText(part.summary);
+                item.appendChild(brief);
+            }
+            const detail = document.createElement('div');
+            detail.className = 'section-detail summary-text';
+            item.appendChild(detail);
+            item.addEventListener('toggle', () => {
+                if (item.open && !item.dataset.loaded) {
+                    item.dataset.loaded = 'true';
+                    loadSectionDetail(part.number, detail, item);
+                }
+            });
+            sectionList.appendChild(item);
+        });
+        sectionOutline.style.display = 'block';
+    }
+
+    async function loadSectionDetail(number, detail, item) {
+        detail.innerHTML = `
+            <div class="qa-loading">
+                <div class="spinner"></div>
+                <span>Summarising section...</span>
+            </div>
+        `;
+        const params = new URLSearchParams({
+            min_length: document.getElementById('min_length').value,
+            max_length: document.getElementById('max_length').value
+        });
+        try {
+            const response = await fetch(`/sections/${number}?${params}`);
+            const data = await response.json();
+            if (response.ok && data.summary) {
+                detail.innerHTML = data.summary_html || formatSummaryText(data.summary);
+            } else {
+                detail.innerHTML = `<span style="color: var(--error-color);">Error: ${data.error || 'Failed to summarise section'}</span>`;
+                delete item.dataset.loaded;
+            }
+        } catch (error) {
+            detail.innerHTML = `<span style="color: var(--error-color);">Network error. Please try again.</span>`;
+            delete item.dataset.loaded;
+            console.error('Section error:', error);
+        }
+    }
+
     function showFeedbackStatus(message, type) {
         feedbackStatus.textContent = message;
         feedbackStatus.className = `feedback-status ${type}`;
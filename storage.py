@@ -0,0 +1,297 @@
+import os
+import json
+import time
+from sqlalchemy import (MetaData, Table, Column, Integer, Float, String, Text, Boolean, ForeignKey, Index,
+                        UniqueConstraint, create_engine, event, select, func, inspect, false, text as sql_text)
+from sqlalchemy.exc import IntegrityError
+from incremental import content_hash, split_into_chunks
+from compact_text import CompressedChunks, ChunkMap
+from qa_cache import normalize_question, UNCACHEABLE_PREFIXES
+
+# Documents, analyses, Q&A history and feedback persist here, shared by every worker
+DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///project.db')
+DATABASE_POOL_SIZE = int(os.getenv('DATABASE_POOL_SIZE', '5'))
+DATABASE_BUSY_TIMEOUT_MS = int(os.getenv('DATABASE_BUSY_TIMEOUT_MS', '5000'))
+# Analyses kept per document; older ones are deleted as new ones are saved
+ANALYSES_PER_DOCUMENT = int(os.getenv('ANALYSES_PER_DOCUMENT', '5'))
+
+metadata = MetaData()
+
+documents = Table(
+    "documents", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("content_hash", String(64), nullable=False, unique=True),
+    Column("name", String(255)),
+    Column("chars", Integer, nullable=False),
+    Column("created_at", Float, nullable=False),
+)
+
+# Paragraph chunks in document order, the unit incremental analysis diffs by; a document's text is kept only here
+chunks = Table(
+    "chunks", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("document_id", Integer, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False),
+    Column("position", Integer, nullable=False),
+    Column("content_hash", String(64), nullable=False),
+    Column("text", Text, nullable=False),
+    UniqueConstraint("document_id", "position"),
+    Index("ix_chunks_content_hash", "content_hash"),
+)
+
+# Analysis state as kept by incremental.analyze_incrementally, minus the chunk texts
+analyses = Table(
+    "analyses", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("document_id", Integer, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False),
+    Column("session_id", String(32)),
+    Column("min_length", Integer, nullable=False),
+    Column("max_length", Integer, nullable=False),
+    Column("mode", String(16)),
+    Column("state", Text, nullable=False),
+    Column("created_at", Float, nullable=False),
+    Index("ix_analyses_document_lengths", "document_id", "min_length", "max_length"),
+    Index("ix_analyses_session", "session_id", "created_at"),
+)
+
+questions = Table(
+    "questions", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("document_id", Integer, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False),
+    Column("session_id", String(32)),
+    Column("question", Text, nullable=False),
+    Column("normalized_question", Text, nullable=False),
+    Column("answer", Text, nullable=False),
+    # Answered with the session's earlier questions in the prompt, so never reused for another session
+    Column("history_dependent", Boolean, nullable=False, server_default=false()),
+    Column("created_at", Float, nullable=False),
+    Index("ix_questions_document_question", "document_id", "normalized_question"),
+    Index("ix_questions_session", "session_id", "created_at"),
+)
+
+# /batch jobs, so their status survives restarts and an interrupted job can be resumed
+batch_jobs = Table(
+    "batch_jobs", metadata,
+    Column("id", String(32), primary_key=True),
+    Column("status", String(16), nullable=False),
+    Column("progress", Text),
+    Column("error", Text),
+    Column("started", Float, nullable=False),
+    Column("finished", Float),
+    Column("updated_at", Float, nullable=False),
+    Index("ix_batch_jobs_status", "status"),
+)
+
+feedback = Table(
+    "feedback", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("session_id", String(32)),
+    Column("text", Text, nullable=False),
+    Column("created_at", Float, nullable=False),
+    Index("ix_feedback_session", "session_id"),
+)
+
+def _configure_sqlite(dbapi_connection, _):
+    # WAL lets readers in other workers proceed while one writes; NORMAL sync is safe under WAL
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={DATABASE_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+def create_store_engine(url=DATABASE_URL, pool_size=DATABASE_POOL_SIZE):
+    """Pooled engine for the document store; SQLite connections are switched to WAL mode."""
+    if url.startswith("sqlite"):
+        engine = create_engine(url, pool_size=pool_size, max_overflow=pool_size * 2, pool_pre_ping=True,
+                               connect_args={"check_same_thread": False})
+        event.listen(engine, "connect", _configure_sqlite)
+    else:
+        engine = create_engine(url, pool_size=pool_size, max_overflow=pool_size * 2, pool_pre_ping=True)
+    return engine
+
+def _dump_state(state):
+    return json.dumps({key: value for key, value in state.items() if key != "chunks"})
+
+def _load_state(row, chunk_rows):
+    state = json.loads(row.state)
+    state["lengths"] = tuple(state["lengths"])
+    if "sections" not in state:
+        # Whole-document analyses diff against the document's chunks, which are stored once per document
+        state["chunks"] = ChunkMap(CompressedChunks([chunk.text for chunk in chunk_rows],
+                                                    [chunk.content_hash for chunk in chunk_rows]))
+    return state
+
+class DocumentStore:
+    """Persistent documents, analyses, Q&A history and feedback (SQLAlchemy Core)."""
+
+    def __init__(self, url=DATABASE_URL, engine=None, analyses_per_document=ANALYSES_PER_DOCUMENT):
+        self.engine = engine or create_store_engine(url)
+        self.analyses_per_document = analyses_per_document
+        metadata.create_all(self.engine)
+        self._migrate_columns()
+
+    def _migrate_columns(self):
+        """Add and drop columns changed after a database was created; create_all only creates missing tables."""
+        inspector = inspect(self.engine)
+        with self.engine.begin() as connection:
+            existing = {column["name"] for column in inspector.get_columns("questions")}
+            if "history_dependent" not in existing:
+                connection.execute(sql_text("ALTER TABLE questions ADD COLUMN history_dependent BOOLEAN NOT NULL DEFAULT false"))
+            # Document text used to be stored in full as well as in its chunks
+            if "text" in {column["name"] for column in inspector.get_columns("documents")}:
+                connection.execute(sql_text("ALTER TABLE documents DROP COLUMN text"))
+
+    def _document_id(self, connection, document_key):
+        return connection.execute(
+            select(documents.c.id).where(documents.c.content_hash == document_key)).scalar()
+
+    def save_document(self, text, name=None):
+        """Store a document and its chunks once; returns its content hash."""
+        document_key = content_hash(text)
+        with self.engine.begin() as connection:
+            if self._document_id(connection, document_key) is not None:
+                return document_key
+            try:
+                document_id = connection.execute(documents.insert().values(
+                    content_hash=document_key, name=name, chars=len(text), created_at=time.time()
+                )).inserted_primary_key[0]
+            except IntegrityError:  # another worker stored it first
+                return document_key
+            rows = [{"document_id": document_id, "position": position, "content_hash": content_hash(chunk),
+                     "text": chunk} for position, chunk in enumerate(split_into_chunks(text))]
+            if rows:
+                connection.execute(chunks.insert(), rows)  # one executemany for all chunks
+        return document_key
+
+    def save_analysis(self, document_key, state, mode=None, session_id=None):
+        """Store the analysis state of a saved document, keeping only its latest analyses_per_document."""
+        min_length, max_length = state["lengths"]
+        with self.engine.begin() as connection:
+            document_id = self._document_id(connection, document_key)
+            if document_id is None:
+                return False
+            connection.execute(analyses.insert().values(
+                document_id=document_id, session_id=session_id, min_length=min_length, max_length=max_length,
+                mode=mode, state=_dump_state(state), created_at=time.time()))
+            older = connection.execute(
+                select(analyses.c.id).where(analyses.c.document_id == document_id)
+                .order_by(analyses.c.created_at.desc(), analyses.c.id.desc())
+                .offset(self.analyses_per_document)).scalars().all()
+            if older:
+                connection.execute(analyses.delete().where(analyses.c.id.in_(older)))
+        return True
+
+    def _latest_analysis(self, condition):
+        with self.engine.connect() as connection:
+            row = connection.execute(
+                select(analyses.c.document_id, analyses.c.state).where(condition)
+                .order_by(analyses.c.created_at.desc(), analyses.c.id.desc()).limit(1)).first()
+            if row is None:
+                return None
+            chunk_rows = connection.execute(
+                select(chunks.c.content_hash, chunks.c.text).where(chunks.c.document_id == row.document_id)
+                .order_by(chunks.c.position)).all()
+        return _load_state(row, chunk_rows)
+
+    def load_analysis(self, document_key, lengths):
+        """Latest stored analysis state of this document at these lengths, or None."""
+        with self.engine.connect() as connection:
+            document_id = self._document_id(connection, document_key)
+        if document_id is None:
+            return None
+        min_length, max_length = lengths
+        return self._latest_analysis((analyses.c.document_id == document_id) &
+                                     (analyses.c.min_length == min_length) & (analyses.c.max_length == max_length))
+
+    def load_session_analysis(self, session_id):
+        """State of the session's latest analysis, or None."""
+        return self._latest_analysis(analyses.c.session_id == session_id)
+
+    def find_answer(self, document_key, question):
+        """Latest stored answer to the same (normalized) question about this document, or None.
+
+        Answers that depended on a session's conversation history are not returned.
+        """
+        with self.engine.connect() as connection:
+            return connection.execute(
+                select(questions.c.answer).join(documents, documents.c.id == questions.c.document_id)
+                .where((documents.c.content_hash == document_key) &
+                       (questions.c.normalized_question == normalize_question(question)) &
+                       (questions.c.history_dependent == false()))
+                .order_by(questions.c.created_at.desc()).limit(1)).scalar()
+
+    def record_question(self, document_key, question, answer, session_id=None, history_dependent=False):
+        """Add a question and its answer to the history; error answers are not kept.
+
+        Set ``history_dependent`` when the answer was given with earlier turns
+        of the session's conversation, so find_answer never reuses it.
+        """
+        if str(answer).startswith(UNCACHEABLE_PREFIXES):
+            return False
+        with self.engine.begin() as connection:
+            document_id = self._document_id(connection, document_key)
+            if document_id is None:
+                return False
+            connection.execute(questions.insert().values(
+                document_id=document_id, session_id=session_id, question=question,
+                normalized_question=normalize_question(question), answer=answer,
+                history_dependent=history_dependent, created_at=time.time()))
+        return True
+
+    def question_history(self, session_id, limit=50):
+        """The session's most recent questions, newest first."""
+        with self.engine.connect() as connection:
+            rows = connection.execute(
+                select(questions.c.question, questions.c.answer, questions.c.created_at, documents.c.name)
+                .join(documents, documents.c.id == questions.c.document_id)
+                .where(questions.c.session_id == session_id)
+                .order_by(questions.c.created_at.desc()).limit(limit)).all()
+        return [{"question": row.question, "answer": row.answer, "document_name": row.name,
+                 "asked_at": row.created_at} for row in rows]
+
+    def save_batch_job(self, job_id, job):
+        """Insert or update a batch job's status and progress."""
+        values = {"status": job["status"], "progress": json.dumps(job.get("progress") or {}), "error": job.get("error"),
+                  "started": job["started"], "finished": job.get("finished"), "updated_at": time.time()}
+        with self.engine.begin() as connection:
+            updated = connection.execute(batch_jobs.update().where(batch_jobs.c.id == job_id).values(**values)).rowcount
+            if not updated:
+                connection.execute(batch_jobs.insert().values(id=job_id, **values))
+
+    def load_batch_job(self, job_id):
+        """A batch job as saved by save_batch_job, plus when it was last updated, or None."""
+        with self.engine.connect() as connection:
+            row = connection.execute(select(batch_jobs).where(batch_jobs.c.id == job_id)).first()
+        if row is None:
+            return None
+        job = {"status": row.status, "progress": json.loads(row.progress or "{}"), "started": row.started,
+               "updated_at": row.updated_at}
+        if row.error is not None:
+            job["error"] = row.error
+        if row.finished is not None:
+            job["finished"] = row.finished
+        return job
+
+    def running_batch_jobs(self):
+        """Ids of batch jobs still marked as running."""
+        with self.engine.connect() as connection:
+            return connection.execute(select(batch_jobs.c.id).where(batch_jobs.c.status == "running")).scalars().all()
+
+    def claim_batch_job(self, job_id, stale_before):
+        """Take over a running job not updated since ``stale_before``; only one caller succeeds."""
+        with self.engine.begin() as connection:
+            return connection.execute(
+                batch_jobs.update()
+                .where((batch_jobs.c.id == job_id) & (batch_jobs.c.status == "running") &
+                       (batch_jobs.c.updated_at < stale_before))
+                .values(updated_at=time.time())).rowcount == 1
+
+    def save_feedback(self, text, session_id=None):
+        with self.engine.begin() as connection:
+            connection.execute(feedback.insert().values(session_id=session_id, text=text, created_at=time.time()))
+
+    def stats(self):
+        """Row counts per table."""
+        with self.engine.connect() as connection:
+            return {table.name: connection.execute(select(func.count()).select_from(table)).scalar()
+                    for table in (documents, chunks, analyses, questions, batch_jobs, feedback)}
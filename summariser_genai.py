@@ -1,18 +1,56 @@
 import os
-import docx
 import json
-import google.generativeai as genai
-from PyPDF2 import PdfReader
-from fpdf import FPDF
+import asyncio
+import time
+import hashlib
+import datetime as dt
+from dataclasses import dataclass, field
+from summary_render import (Block, TITLE, HEADING, BULLET, SEPARATOR, TEXT, SPACE, parse_summary, render_pdf,
+                            blocks_to_text, section_blocks, section_text)
 from datetime import datetime
 from dotenv import load_dotenv
+from llm_backends import LLM_BACKEND, BACKENDS, GeminiBackend, get_backend
+from clause_index import build_clause_index
+from hierarchy import split_parts, is_hierarchical, section_summary_cache, brief_key, detail_key
+
+try:
+    import google.generativeai as genai
+except ImportError:
+    # Other backends run the same prompts without the Gemini SDK
+    if LLM_BACKEND == 'gemini':
+        raise
+    genai = None
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Ask Gemini for JSON matching ANALYSIS_SCHEMA instead of free-text bullets (set to "false" to disable)
+STRUCTURED_OUTPUT = os.getenv('GENAI_STRUCTURED_OUTPUT', 'true').lower() != 'false'
+
+# Q&A context: Gemini context caching for documents long enough to cache; below that, each question is sent
+# with the clauses most relevant to it, up to QA_EXCERPT_TOKENS (QA_CONTEXT_TOKENS for batched questions)
+CONTEXT_CACHING = os.getenv('GENAI_CONTEXT_CACHING', 'true').lower() != 'false'
+CONTEXT_CACHE_MIN_TOKENS = int(os.getenv('CONTEXT_CACHE_MIN_TOKENS', '32768'))  # Gemini's minimum cache size
+CONTEXT_CACHE_MAX_CHARS = int(os.getenv('CONTEXT_CACHE_MAX_CHARS', '1000000'))
+CONTEXT_CACHE_TTL_MINUTES = int(os.getenv('CONTEXT_CACHE_TTL_MINUTES', '30'))
+CONTEXT_CACHE_REFRESH_SECONDS = 120  # extend a cached context this long before it expires
+QA_CONTEXT_TOKENS = int(os.getenv('QA_CONTEXT_TOKENS', '5000'))
+QA_EXCERPT_TOKENS = int(os.getenv('QA_EXCERPT_TOKENS', '1500'))
+CHARS_PER_TOKEN = 4  # rough estimate for English legal text
+
+# Summary length: requested word counts become a prompt target and a max_output_tokens cap
+TOKENS_PER_WORD = float(os.getenv('TOKENS_PER_WORD', '1.4'))
+WORDS_PER_BULLET = 20
+RISK_OUTPUT_TOKENS = 1024  # the risk half of a structured analysis is not length-controlled
+PART_SUMMARY_TOKENS = 256  # brief part summaries feeding a hierarchical overview
+
+MODEL_NAME = None
+
 # Configure Gemini API
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
-if GEMINI_API_KEY and GEMINI_API_KEY != 'your-gemini-api-key-here':
+if LLM_BACKEND != 'gemini':
+    model = None
+elif GEMINI_API_KEY and GEMINI_API_KEY != 'your-gemini-api-key-here':
     try:
         genai.configure(api_key=GEMINI_API_KEY)
         
@@ -34,6 +72,7 @@ if GEMINI_API_KEY and GEMINI_API_KEY != 'your-gemini-api-key-here':
                 model = genai.GenerativeModel(model_name)
                 # Test the model with a simple prompt
                 test_response = model.generate_content("Hello")
+                MODEL_NAME = model_name
                 print(f"Using Gemini model: {model_name}")
                 break
             except Exception as e:
@@ -59,25 +98,32 @@ else:
     print("GEMINI_API_KEY not found or not configured. GenAI features will not work.")
     model = None
 
-def extract_text_from_txt(file_path):
-    """Extract text from TXT file."""
-    with open(file_path, 'r', encoding='utf-8') as file:
-        return file.read()
-
-def extract_text_from_pdf(file_path):
-    """Extract text from PDF file."""
-    pdf_reader = PdfReader(file_path)
-    text = ""
-    for page in pdf_reader.pages:
-        page_text = page.extract_text()
-        if page_text:
-            text += page_text + "\n"
-    return text
-
-def extract_text_from_docx(file_path):
-    """Extract text from DOCX file."""
-    doc = docx.Document(file_path)
-    return "\n".join(para.text for para in doc.paragraphs)
+def use_backend(name):
+    """Send every prompt to the named backend (see llm_backends); returns it, or None if it is unusable."""
+    global backend, backend_name
+    backend = get_backend(name, model=model) if name == 'gemini' else get_backend(name)
+    backend_name = name
+    if not backend.available():
+        print(f"LLM backend '{name}' is not available")
+        backend = None
+    return backend
+
+backend = use_backend(LLM_BACKEND)
+
+def unavailable_message():
+    """What users see when the configured backend cannot be used, with what to check."""
+    return f"GenAI service unavailable. {BACKENDS[backend_name].setup_hint}"
+
+def _model_not_found():
+    backend_class = BACKENDS[backend_name]
+    return f"Error: Model not found for {backend_class.label}. {backend_class.setup_hint}"
+
+def _quota_exceeded():
+    return f"Error: API quota exceeded. Please check the usage limits of {BACKENDS[backend_name].label}."
+
+def _empty_response(request="content"):
+    return (f"Error: Empty response from {BACKENDS[backend_name].label}. "
+            f"The {request} might have been blocked by safety filters.")
 
 def split_into_sections(text):
     """Split text into manageable chunks for processing."""
@@ -99,18 +145,39 @@ def split_into_sections(text):
     
     return chunks
 
-def generate_summary(document_text):
-    """Generate abstractive summary using Gemini API."""
-    if not model:
-        return "GenAI service unavailable. Please check your GEMINI_API_KEY in the .env file."
-    
+def bullets_per_section(max_length, sections=4):
+    """Bullet range per summary section that fits a summary of max_length words."""
+    high = max(2, min(6, round(max_length / WORDS_PER_BULLET / sections)))
+    return max(1, high - 2), high
+
+def output_token_limit(max_length):
+    """max_output_tokens for a summary of max_length words, with room for headings and bullet markup."""
+    return int(max_length * TOKENS_PER_WORD * 1.25) + 64
+
+def _response_text(text):
+    """Generated text, or an error message if it came back empty."""
+    return text if text else _empty_response()
+
+def _summary_prompt(document_text, min_length, max_length, from_parts=False):
+    """Prompt and generation config for generate_summary.
+
+    With ``from_parts`` the text is the part summaries of a long document and
+    the prompt asks for an overview of the whole document from them.
+    """
     # Truncate document if too long (Gemini has input limits)
     max_input_length = 25000  # Conservative limit
     if len(document_text) > max_input_length:
         document_text = document_text[:max_input_length] + "\n\n[Document truncated due to length...]"
     
+    fewest_bullets, most_bullets = bullets_per_section(max_length)
+    if from_parts:
+        task = ("Below are short summaries of each part of a long legal document, in order. Combine them into "
+                "a comprehensive summary of the whole document in exactly this format:")
+    else:
+        task = "Analyze the following legal document and provide a comprehensive summary in exactly this format:"
+    
     prompt = f"""
-    Analyze the following legal document and provide a comprehensive summary in exactly this format:
+    {task}
 
     **DOCUMENT SUMMARY**
     
@@ -145,45 +212,257 @@ def generate_summary(document_text):
     - Keep each point to 1-2 sentences maximum
     - Use simple, clear language
     - No Unicode symbols or emojis
-    - Each section should have 3-5 bullet points
+    - Each section should have {fewest_bullets}-{most_bullets} bullet points
+    - The whole summary should be {min_length}-{max_length} words long
     """
+    return prompt, {"max_output_tokens": output_token_limit(max_length)}
+
+def _summary_error(error):
+    error_msg = str(error)
+    
+    if "404" in error_msg:
+        return _model_not_found()
+    elif "403" in error_msg:
+        return "Error: Access denied. Please check your API key permissions."
+    elif "quota" in error_msg.lower():
+        return _quota_exceeded()
+    else:
+        return f"Error generating summary: {error_msg}"
+
+def generate_summary(document_text, min_length=150, max_length=300):
+    """Generate abstractive summary using the configured language model."""
+    if not backend:
+        return unavailable_message()
     
+    prompt, generation_config = _summary_prompt(document_text, min_length, max_length)
     try:
-        response = model.generate_content(prompt)
-        
-        if response.text:
-            return response.text
-        else:
-            return "Error: Empty response from Gemini API. The content might have been blocked by safety filters."
+        return _response_text(backend.generate(prompt, generation_config))
     except Exception as e:
-        error_msg = str(e)
-        
-        if "404" in error_msg:
-            return "Error: Gemini model not found. Please check if your API key is valid and has access to Gemini models."
-        elif "403" in error_msg:
-            return "Error: Access denied. Please check your API key permissions."
-        elif "quota" in error_msg.lower():
-            return "Error: API quota exceeded. Please check your Gemini API usage limits."
-        else:
-            return f"Error generating summary: {error_msg}"
-
-def answer_question(document_text, user_question):
-    """Answer specific questions about the document using Gemini API."""
-    if not model:
-        return "GenAI service unavailable. Please check your GEMINI_API_KEY in the .env file."
+        return _summary_error(e)
+
+async def generate_summary_async(document_text, min_length=150, max_length=300):
+    """generate_summary that awaits the model instead of blocking a thread."""
+    if not backend:
+        return unavailable_message()
     
-    # Truncate document if too long
-    max_input_length = 20000  # Leave room for question and instructions
-    if len(document_text) > max_input_length:
-        document_text = document_text[:max_input_length] + "\n\n[Document truncated...]"
+    prompt, generation_config = _summary_prompt(document_text, min_length, max_length)
+    try:
+        return _response_text(await backend.generate_async(prompt, generation_config))
+    except Exception as e:
+        return _summary_error(e)
+
+def _part_prompt(title, part_text):
+    """Prompt and generation config for the brief summary of one part of a long document."""
+    max_input_length = 25000
+    if len(part_text) > max_input_length:
+        part_text = part_text[:max_input_length] + "\n\n[Part truncated due to length...]"
     
     prompt = f"""
-    Based on the following legal document, answer the user's question clearly and concisely.
+    The text below is one part ("{title}") of a longer legal document.
+    Summarize what it says in 2-4 bullet points for a consumer: what it requires, allows or
+    prohibits, and any deadlines, fees or rights it sets out.
     
-    Document:
-    {document_text}
+    Part text:
+    {part_text}
     
-    Question: {user_question}
+    FORMATTING RULES:
+    - Use exactly "* " (asterisk + space) for bullets, one per line, and no headings
+    - Keep each point to one sentence in simple language
+    - No Unicode symbols or emojis
+    """
+    return prompt, {"max_output_tokens": PART_SUMMARY_TOKENS}
+
+def _split_long_document(full_text, clause_index):
+    """Parts of a long document and its text; split_into_sections collapses whitespace, so prefer the index's text."""
+    if clause_index is None:
+        clause_index = build_clause_index(full_text)
+    text = clause_index.text
+    return split_parts(text, clause_index), text
+
+def _overview_prompt(parts, briefs, min_length, max_length):
+    outline_text = "\n\n".join(f"{part.title}:\n{brief}" for part, brief in zip(parts, briefs))
+    return _summary_prompt(outline_text, min_length, max_length, from_parts=True)
+
+def summarize_part_briefs(parts, document_text):
+    """Brief summary of each part, from the cache or in one concurrent batch of calls."""
+    briefs = [section_summary_cache.get(brief_key(part)) for part in parts]
+    missing = [i for i, brief in enumerate(briefs) if brief is None]
+    if missing:
+        prompt_config = [_part_prompt(parts[i].title, parts[i].text(document_text)) for i in missing]
+        results = backend.generate_batch([prompt for prompt, _ in prompt_config], prompt_config[0][1])
+        for i, result in zip(missing, results):
+            briefs[i] = _summary_error(result) if isinstance(result, Exception) else _response_text(result)
+            section_summary_cache.put(brief_key(parts[i]), briefs[i])
+    return briefs
+
+async def summarize_part_briefs_async(parts, document_text):
+    """summarize_part_briefs for the async server."""
+    briefs = [section_summary_cache.get(brief_key(part)) for part in parts]
+    missing = [i for i, brief in enumerate(briefs) if brief is None]
+
+    async def summarize(part):
+        prompt, generation_config = _part_prompt(part.title, part.text(document_text))
+        try:
+            return _response_text(await backend.generate_async(prompt, generation_config))
+        except Exception as e:
+            return _summary_error(e)
+
+    for i, brief in zip(missing, await asyncio.gather(*(summarize(parts[i]) for i in missing))):
+        briefs[i] = brief
+        section_summary_cache.put(brief_key(parts[i]), brief)
+    return briefs
+
+def summarize_hierarchically(full_text, min_length=150, max_length=300, clause_index=None):
+    """Overview of a long document built from brief summaries of its parts, plus the risk analysis."""
+    parts, document_text = _split_long_document(full_text, clause_index)
+    briefs = summarize_part_briefs(parts, document_text)
+    prompt, generation_config = _overview_prompt(parts, briefs, min_length, max_length)
+    try:
+        overview = _response_text(backend.generate(prompt, generation_config))
+    except Exception as e:
+        overview = _summary_error(e)
+    return {
+        "Document Analysis": overview,
+        "Risk Assessment": analyze_risks(full_text, clause_index=clause_index)
+    }
+
+async def summarize_hierarchically_async(full_text, min_length=150, max_length=300, clause_index=None):
+    """summarize_hierarchically for the async server; the risk analysis runs alongside the parts."""
+    parts, document_text = _split_long_document(full_text, clause_index)
+
+    async def overview():
+        briefs = await summarize_part_briefs_async(parts, document_text)
+        prompt, generation_config = _overview_prompt(parts, briefs, min_length, max_length)
+        try:
+            return _response_text(await backend.generate_async(prompt, generation_config))
+        except Exception as e:
+            return _summary_error(e)
+
+    summary, risk_analysis = await asyncio.gather(overview(), analyze_risks_async(full_text, clause_index=clause_index))
+    return {
+        "Document Analysis": summary,
+        "Risk Assessment": risk_analysis
+    }
+
+def summarize_part(document_text, part, min_length=150, max_length=300):
+    """Detailed summary of one part of a long document, generated on first request and then cached.
+
+    Returns ``(summary, cached)``.
+    """
+    key = detail_key(part, min_length, max_length)
+    summary = section_summary_cache.get(key)
+    if summary is not None:
+        return summary, True
+    summary = generate_summary(part.text(document_text), min_length=min_length, max_length=max_length)
+    section_summary_cache.put(key, summary)
+    return summary, False
+
+class DocumentContext:
+    """A document registered once for a series of questions: a server-side cache, or its clause index.
+
+    Without a server-side cache each question is sent with excerpt(): the
+    clauses most relevant to it. A cached context lapses at ``expires_at``;
+    refresh_document_context extends it shortly before then.
+    """
+
+    def __init__(self, key, clause_index=None, cached_content=None, cached_model=None, expires_at=None):
+        self.key = key
+        self.clause_index = clause_index
+        self.cached_content = cached_content
+        self.cached_model = cached_model
+        self.expires_at = expires_at
+
+    def expiring(self, margin=CONTEXT_CACHE_REFRESH_SECONDS):
+        return self.cached_content is not None and time.time() >= self.expires_at - margin
+
+    def excerpt(self, query, max_tokens=QA_EXCERPT_TOKENS):
+        """The clauses most relevant to the query, in document order, within max_tokens; short documents whole.
+
+        Clauses are chosen by their spans, so only the chosen ones are decompressed.
+        """
+        index = self.clause_index
+        max_chars = max_tokens * CHARS_PER_TOKEN
+        if index.chars <= max_chars:
+            return index.text
+
+        chosen = []
+        used = 0
+        for clause_id in index.rank(query, limit=len(index.clauses)):
+            clause = index.clauses[clause_id]
+            length = clause.end - clause.start + 2
+            if used + length <= max_chars:
+                chosen.append(clause_id)
+                used += length
+        if not chosen:
+            return index.prefix(max_chars) + "\n\n[Document truncated...]"
+        clauses = "\n\n".join(index.clause_text(clause_id) for clause_id in sorted(chosen))
+        return clauses + "\n\n[Only the clauses most relevant to the question are shown]"
+
+    def fall_back(self):
+        """Stop using the server-side cache and send relevant clauses instead."""
+        self.release()
+
+    def release(self):
+        """Delete the server-side cache, if any, when the document is replaced."""
+        if self.cached_content is not None:
+            try:
+                self.cached_content.delete()
+            except Exception as e:
+                print(f"Could not delete cached context: {e}")
+            self.cached_content = None
+            self.cached_model = None
+
+def register_document_context(clause_index, cache=True):
+    """Register a document, by its clause index, once for Q&A, using Gemini context caching when it is available.
+
+    The whole text is only decompressed to create the server-side cache.
+    ``cache=False`` skips context caching, for a context used by a single
+    question.
+    """
+    estimated_tokens = clause_index.chars // CHARS_PER_TOKEN
+    if cache and isinstance(backend, GeminiBackend) and CONTEXT_CACHING and MODEL_NAME and estimated_tokens >= CONTEXT_CACHE_MIN_TOKENS:
+        try:
+            from google.generativeai import caching
+
+            document_text = clause_index.text
+            key = hashlib.sha256(document_text.encode('utf-8')).hexdigest()
+            cached_content = caching.CachedContent.create(
+                model=MODEL_NAME if MODEL_NAME.startswith('models/') else f"models/{MODEL_NAME}",
+                display_name=f"document-{key[:16]}",
+                system_instruction="You answer questions about the legal document provided, clearly and concisely, in plain language.",
+                contents=[document_text[:CONTEXT_CACHE_MAX_CHARS]],
+                ttl=dt.timedelta(minutes=CONTEXT_CACHE_TTL_MINUTES)
+            )
+            cached_model = backend.bind(genai.GenerativeModel.from_cached_content(cached_content=cached_content))
+            # The clause index stays with the context for when the cache lapses
+            return DocumentContext(key, clause_index, cached_content=cached_content, cached_model=cached_model,
+                                   expires_at=time.time() + CONTEXT_CACHE_TTL_MINUTES * 60)
+        except Exception as e:
+            print(f"Context caching unavailable, using relevant clauses: {e}")
+
+    return DocumentContext(None, clause_index)
+
+def refresh_document_context(context):
+    """Extend a cached context that is about to expire; if that fails, register the document again."""
+    try:
+        context.cached_content.update(ttl=dt.timedelta(minutes=CONTEXT_CACHE_TTL_MINUTES))
+        context.expires_at = time.time() + CONTEXT_CACHE_TTL_MINUTES * 60
+        return context
+    except Exception as e:
+        print(f"Could not extend cached context, registering it again: {e}")
+        context.release()
+        return register_document_context(context.clause_index)
+
+def _history_text(history):
+    if not history:
+        return ""
+    turns = "\n".join(f"Q: {question}\nA: {answer[:600]}" for question, answer in history)
+    return f"Earlier questions in this conversation:\n{turns}\n\n"
+
+def _question_request(context, user_question, history=None):
+    """Backend and prompt for a question: the cached-context model if registered, else the prefix prompt."""
+    question_prompt = f"""
+    {_history_text(history)}Question: {user_question}
     
     Instructions:
     - Provide a direct answer in plain language
@@ -192,28 +471,159 @@ def answer_question(document_text, user_question):
     - Keep the response under 200 words
     """
     
+    if context.cached_model is not None:
+        # The document lives in the server-side cache; send only the question
+        return context.cached_model, question_prompt
+    
+    # Follow-up questions ("what about them?") find their clauses through the previous question
+    query = " ".join([question for question, _ in (history or [])[-1:]] + [user_question])
+    prompt = f"""
+    Based on the following excerpts from a legal document, answer the user's question clearly and concisely.
+    
+    Document:
+    {context.excerpt(query)}
+    {question_prompt}"""
+    return backend, prompt
+
+def _answer_result(text):
+    if text:
+        return text
+    else:
+        return _empty_response("question")
+
+def _answer_error(error):
+    error_msg = str(error)
+    if "404" in error_msg:
+        return _model_not_found()
+    elif "403" in error_msg:
+        return "Error: Access denied. Please verify your API key permissions."
+    else:
+        return f"Error answering question: {error_msg}"
+
+def answer_question(document_text, user_question, context=None, history=None):
+    """Answer specific questions about the document using the configured language model.
+
+    ``history`` is the asking session's earlier (question, answer) turns.
+    ``document_text`` is only read when no registered ``context`` is given.
+    """
+    if not backend:
+        return unavailable_message()
+    
+    if context is None:
+        context = DocumentContext(None, build_clause_index(document_text))
+    
+    target, prompt = _question_request(context, user_question, history)
     try:
-        response = model.generate_content(prompt)
-        if response.text:
-            return response.text
-        else:
-            return "Error: Empty response from Gemini API. The question might have been blocked by safety filters."
+        return _answer_result(target.generate(prompt))
     except Exception as e:
-        error_msg = str(e)
-        if "404" in error_msg:
-            return "Error: Gemini model not found. Please check your API key configuration."
-        elif "403" in error_msg:
-            return "Error: Access denied. Please verify your API key permissions."
-        else:
-            return f"Error answering question: {error_msg}"
-
-def analyze_risks(document_text):
-    """Identify potential risks and non-standard clauses using Gemini API."""
-    if not model:
-        return "GenAI service unavailable. Please check your GEMINI_API_KEY in the .env file."
+        if context.cached_model is None:
+            return _answer_error(e)
+        # The server-side cache may have lapsed or been evicted; answer from relevant clauses from now on
+        print(f"Cached context failed, using relevant clauses: {e}")
+        context.fall_back()
+        return answer_question(document_text, user_question, context=context, history=history)
+
+async def answer_question_async(document_text, user_question, context=None, history=None):
+    """answer_question that awaits the model instead of blocking a thread."""
+    if not backend:
+        return unavailable_message()
     
-    # Truncate document if too long
+    if context is None:
+        context = DocumentContext(None, build_clause_index(document_text))
+    
+    target, prompt = _question_request(context, user_question, history)
+    try:
+        return _answer_result(await target.generate_async(prompt))
+    except Exception as e:
+        if context.cached_model is None:
+            return _answer_error(e)
+        print(f"Cached context failed, using relevant clauses: {e}")
+        context.fall_back()
+        return await answer_question_async(document_text, user_question, context=context, history=history)
+
+ANSWERS_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "answers": {"type": "ARRAY", "items": {
+            "type": "OBJECT",
+            "properties": {"number": {"type": "INTEGER"}, "answer": {"type": "STRING"}},
+            "required": ["number", "answer"]
+        }}
+    },
+    "required": ["answers"]
+}
+
+def _batch_questions_request(context, questions):
+    """Backend, prompt and generation configs for answer_questions."""
+    numbered = "\n".join(f"{number}. {question}" for number, question in enumerate(questions, 1))
+    question_prompt = f"""
+    Answer each of these questions about the document:
+    {numbered}
+
+    Instructions:
+    - Return one entry per question with its number and the answer
+    - Provide a direct answer in plain language
+    - Quote relevant sections if helpful
+    - If the document doesn't contain the answer, say so clearly
+    - Keep each answer under 200 words
+    """
+    configs = [
+        {"response_mime_type": "application/json", "response_schema": ANSWERS_SCHEMA},
+        {"response_mime_type": "application/json"}
+    ]
+    if context.cached_model is not None:
+        return context.cached_model, question_prompt, configs
+
+    prompt = f"""
+    Based on the following excerpts from a legal document, answer the questions below clearly and concisely.
+    
+    Document:
+    {context.excerpt(" ".join(questions), max_tokens=QA_CONTEXT_TOKENS)}
+    {question_prompt}"""
+    return backend, prompt, configs
+
+def answer_questions(document_text, questions, context=None):
+    """Answer several questions in one call; returns {question: answer} for those answered.
+
+    Backends without JSON output get one prompt per question, batched as the backend allows.
+    """
+    if not backend or not questions:
+        return {}
+
+    if context is None:
+        context = DocumentContext(None, build_clause_index(document_text))
+
+    if not backend.structured_output:
+        prompts = [_question_request(context, question)[1] for question in questions]
+        return {question: text.strip() for question, text in zip(questions, backend.generate_batch(prompts))
+                if isinstance(text, str) and text.strip()}
+
+    target, prompt, configs = _batch_questions_request(context, questions)
+    for generation_config in configs:
+        try:
+            answers = {}
+            for entry in json.loads(target.generate(prompt, generation_config)).get("answers") or []:
+                number, answer = entry.get("number"), str(entry.get("answer") or "").strip()
+                if isinstance(number, int) and 1 <= number <= len(questions) and answer:
+                    answers[questions[number - 1]] = answer
+            return answers
+        except Exception as e:
+            print(f"Batched answers failed ({', '.join(generation_config)}): {e}")
+    return {}
+
+def _risk_prompt(document_text, clause_index=None):
+    """Prompt for analyze_risks."""
     max_input_length = 25000
+    scope_note = ""
+
+    # Send only the clauses flagged by the clause index's risk patterns when there are any
+    if clause_index is not None:
+        candidate_text = clause_index.risk_context(max_chars=max_input_length)
+        if candidate_text:
+            document_text = candidate_text
+            scope_note = "The clauses below were pre-selected from the document as likely risk areas.\n    "
+
+    # Truncate document if too long
     if len(document_text) > max_input_length:
         document_text = document_text[:max_input_length] + "\n\n[Document truncated due to length...]"
     
@@ -236,7 +646,7 @@ def analyze_risks(document_text):
     * Point 1: Important information to be aware of
     * Point 2: Important information to be aware of
     
-    Document to analyze:
+    {scope_note}Document to analyze:
     {document_text}
     
     Focus on identifying:
@@ -255,27 +665,193 @@ def analyze_risks(document_text):
     - No Unicode symbols, emojis, or special characters
     - Each section should have 2-3 bullet points
     """
+    return prompt
+
+def _risk_error(error):
+    error_msg = str(error)
+    
+    if "404" in error_msg:
+        return _model_not_found()
+    elif "403" in error_msg:
+        return "Error: Access denied. Please verify your API key permissions."
+    elif "quota" in error_msg.lower():
+        return _quota_exceeded()
+    else:
+        return f"Error analyzing risks: {error_msg}"
+
+def analyze_risks(document_text, clause_index=None):
+    """Identify potential risks and non-standard clauses using the configured language model."""
+    if not backend:
+        return unavailable_message()
     
     try:
-        response = model.generate_content(prompt)
-        
-        if response.text:
-            return response.text
-        else:
-            return "Error: Empty response from Gemini API. The content might have been blocked by safety filters."
+        return _response_text(backend.generate(_risk_prompt(document_text, clause_index)))
     except Exception as e:
-        error_msg = str(e)
-        
-        if "404" in error_msg:
-            return "Error: Gemini model not found. Please check your API key configuration."
-        elif "403" in error_msg:
-            return "Error: Access denied. Please verify your API key permissions."
-        elif "quota" in error_msg.lower():
-            return "Error: API quota exceeded. Please check your Gemini API usage limits."
-        else:
-            return f"Error analyzing risks: {error_msg}"
-
-def summarize_sections(sections, min_length=150, max_length=300):
+        return _risk_error(e)
+
+async def analyze_risks_async(document_text, clause_index=None):
+    """analyze_risks that awaits the model instead of blocking a thread."""
+    if not backend:
+        return unavailable_message()
+    
+    try:
+        return _response_text(await backend.generate_async(_risk_prompt(document_text, clause_index)))
+    except Exception as e:
+        return _risk_error(e)
+
+# Response schema for structured analysis (OpenAPI subset accepted by Gemini)
+_STRING_LIST = {"type": "ARRAY", "items": {"type": "STRING"}}
+ANALYSIS_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "key_points": _STRING_LIST,
+        "rights": _STRING_LIST,
+        "obligations": _STRING_LIST,
+        "important_terms": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {"term": {"type": "STRING"}, "definition": {"type": "STRING"}},
+                "required": ["term", "definition"]
+            }
+        },
+        "high_risks": _STRING_LIST,
+        "medium_risks": _STRING_LIST,
+        "points_to_note": _STRING_LIST
+    },
+    "required": ["key_points", "rights", "obligations", "important_terms", "high_risks", "medium_risks", "points_to_note"]
+}
+
+def _clean_items(items):
+    """Strip whitespace and any bullet markers the model added to list items."""
+    cleaned = []
+    for item in items or []:
+        item = str(item).strip().lstrip('*-\u2022 ').strip()
+        if item:
+            cleaned.append(item)
+    return cleaned
+
+@dataclass
+class DocumentAnalysis:
+    """Typed result of a structured Gemini analysis."""
+    key_points: list = field(default_factory=list)
+    rights: list = field(default_factory=list)
+    obligations: list = field(default_factory=list)
+    important_terms: list = field(default_factory=list)  # (term, definition) pairs
+    high_risks: list = field(default_factory=list)
+    medium_risks: list = field(default_factory=list)
+    points_to_note: list = field(default_factory=list)
+
+    @classmethod
+    def from_json(cls, raw):
+        data = json.loads(raw)
+        terms = []
+        for entry in data.get("important_terms") or []:
+            if isinstance(entry, dict) and entry.get("term"):
+                terms.append((str(entry["term"]).strip(), str(entry.get("definition", "")).strip()))
+        return cls(
+            key_points=_clean_items(data.get("key_points")),
+            rights=_clean_items(data.get("rights")),
+            obligations=_clean_items(data.get("obligations")),
+            important_terms=terms,
+            high_risks=_clean_items(data.get("high_risks")),
+            medium_risks=_clean_items(data.get("medium_risks")),
+            points_to_note=_clean_items(data.get("points_to_note"))
+        )
+
+    @staticmethod
+    def _section(heading, items):
+        if not items:
+            return []
+        return [Block(HEADING, heading)] + [Block(BULLET, item) for item in items] + [Block(SPACE, "")]
+
+    def summary_blocks(self):
+        terms = [f"{term}: {definition}" if definition else term for term, definition in self.important_terms]
+        return ([Block(HEADING, "DOCUMENT SUMMARY"), Block(SPACE, "")]
+                + self._section("Key Points:", self.key_points)
+                + self._section("Your Rights:", self.rights)
+                + self._section("Your Obligations:", self.obligations)
+                + self._section("Important Terms:", terms))
+
+    def risk_blocks(self):
+        return ([Block(HEADING, "RISK ANALYSIS"), Block(SPACE, "")]
+                + self._section("HIGH RISK:", self.high_risks)
+                + self._section("MEDIUM RISK:", self.medium_risks)
+                + self._section("POINTS TO NOTE:", self.points_to_note))
+
+def _structured_request(document_text, clause_index, min_length, max_length):
+    """Prompt and the generation configs to try, in order, for generate_structured_analysis."""
+    # Truncate document if too long (Gemini has input limits)
+    max_input_length = 25000
+    if len(document_text) > max_input_length:
+        document_text = document_text[:max_input_length] + "\n\n[Document truncated due to length...]"
+
+    flagged = ""
+    if clause_index is not None and clause_index.risk_matches:
+        headings = [clause_index.clauses[clause_id].heading[:80] for clause_id in clause_index.risk_clause_ids()[:20]]
+        flagged = "Clauses flagged by an automated scan as possible risks (check these first):\n    - " + "\n    - ".join(headings)
+
+    bullets = "{}-{}".format(*bullets_per_section(max_length))
+
+    prompt = f"""
+    Analyze the following legal document for a consumer and fill in every field of the JSON response:
+    - key_points: {bullets} most important points
+    - rights: {bullets} things the reader can do, expect or is protected by
+    - obligations: {bullets} things the reader must do, provide or avoid
+    - important_terms: {bullets} terms with a plain-language definition
+    - high_risks / medium_risks: 2-3 potentially risky or non-standard clauses each, such as unusual
+      liability limitations, broad indemnification, automatic renewal or difficult cancellation,
+      unexpected data usage, dispute resolution limits and unusual termination conditions
+    - points_to_note: 2-3 other things the reader should be aware of
+
+    Each item must be 1-2 sentences of simple, clear language with no bullet markers, Unicode symbols or emojis.
+    Together, key_points, rights, obligations and important_terms should be {min_length}-{max_length} words.
+
+    {flagged}
+
+    Document to analyze:
+    {document_text}
+    """
+
+    # Prefer a strict schema; older SDKs or models may only support plain JSON mode.
+    # JSON keys and quoting add roughly a third to the token count.
+    max_output_tokens = int(output_token_limit(max_length) * 1.3) + RISK_OUTPUT_TOKENS
+    configs = [
+        {"response_mime_type": "application/json", "response_schema": ANALYSIS_SCHEMA, "max_output_tokens": max_output_tokens},
+        {"response_mime_type": "application/json", "max_output_tokens": max_output_tokens}
+    ]
+    return prompt, configs
+
+def generate_structured_analysis(document_text, clause_index=None, min_length=150, max_length=300):
+    """Summary and risk analysis in one call, returned as a DocumentAnalysis or None on failure.
+
+    Returns None at once for backends without JSON output.
+    """
+    if not backend or not backend.structured_output:
+        return None
+    
+    prompt, configs = _structured_request(document_text, clause_index, min_length, max_length)
+    for generation_config in configs:
+        try:
+            return DocumentAnalysis.from_json(backend.generate(prompt, generation_config))
+        except Exception as e:
+            print(f"Structured analysis failed ({', '.join(generation_config)}): {e}")
+    return None
+
+async def generate_structured_analysis_async(document_text, clause_index=None, min_length=150, max_length=300):
+    """generate_structured_analysis that awaits the model instead of blocking a thread."""
+    if not backend or not backend.structured_output:
+        return None
+    
+    prompt, configs = _structured_request(document_text, clause_index, min_length, max_length)
+    for generation_config in configs:
+        try:
+            return DocumentAnalysis.from_json(await backend.generate_async(prompt, generation_config))
+        except Exception as e:
+            print(f"Structured analysis failed ({', '.join(generation_config)}): {e}")
+    return None
+
+def summarize_sections(sections, min_length=150, max_length=300, clause_index=None):
     """Process sections and generate comprehensive analysis."""
     if not sections:
         return {}
@@ -283,11 +859,26 @@ def summarize_sections(sections, min_length=150, max_length=300):
     # Combine all sections for full document analysis
     full_text = "\n\n".join(sections.values())
     
+    # Long documents: an overview from part summaries instead of a truncated single pass
+    if backend and is_hierarchical(full_text):
+        return summarize_hierarchically(full_text, min_length=min_length, max_length=max_length,
+                                        clause_index=clause_index)
+    
+    # One structured call replaces the separate summary and risk prompts when it works
+    if STRUCTURED_OUTPUT:
+        analysis = generate_structured_analysis(full_text, clause_index=clause_index,
+                                                min_length=min_length, max_length=max_length)
+        if analysis is not None:
+            return {
+                "Document Analysis": analysis.summary_blocks(),
+                "Risk Assessment": analysis.risk_blocks()
+            }
+    
     # Generate summary
-    summary = generate_summary(full_text)
+    summary = generate_summary(full_text, min_length=min_length, max_length=max_length)
     
     # Generate risk analysis
-    risk_analysis = analyze_risks(full_text)
+    risk_analysis = analyze_risks(full_text, clause_index=clause_index)
     
     result = {
         "Document Analysis": summary,
@@ -296,377 +887,293 @@ def summarize_sections(sections, min_length=150, max_length=300):
     
     return result
 
-def compile_final_summary(summaries):
-    """Compile the final formatted summary for GenAI responses with proper bullet point handling."""
-    header = "=" * 60 + "\n"
-    header += "GENAI LEGAL ASSISTANT ANALYSIS\n"
-    header += "=" * 60 + "\n\n"
-    
-    content_parts = []
-    
-    # Add the main document analysis (contains Key Points, Rights, Obligations, etc.)
-    if "Document Analysis" in summaries and summaries["Document Analysis"]:
-        summary_content = format_content_for_display(summaries["Document Analysis"])
-        content_parts.append(summary_content)
-    
-    # Add the risk analysis with a clear separator
-    if "Risk Assessment" in summaries and summaries["Risk Assessment"]:
-        risk_content = format_content_for_display(summaries["Risk Assessment"])
-        content_parts.append("\n" + "=" * 60 + "\n")
-        content_parts.append(risk_content)
-    
-    # Fallback: Handle legacy key names for compatibility
-    if "Summary" in summaries and summaries["Summary"]:
-        summary_content = format_content_for_display(summaries["Summary"])
-        content_parts.append(summary_content)
-    
-    if "Risk Analysis" in summaries and summaries["Risk Analysis"]:
-        risk_content = format_content_for_display(summaries["Risk Analysis"])
-        content_parts.append("\n" + "=" * 60 + "\n")
-        content_parts.append(risk_content)
-    
-    # Handle any other sections (fallback for compatibility)
-    for section_name, content in summaries.items():
-        if section_name not in ["Document Analysis", "Risk Assessment", "Summary", "Risk Analysis"]:
-            if content:
-                section_header = f"\n{section_name.upper()}\n"
-                section_header += "-" * len(section_name) + "\n"
-                formatted_section = section_header + format_content_for_display(content)
-                content_parts.append(formatted_section)
-    
-    if not content_parts:
-        return "Error: No content was generated. Please check your API key and try again."
-    
-    footer = "\n\n" + "=" * 60 + "\n"
-    footer += "IMPORTANT DISCLAIMER\n"
-    footer += "=" * 60 + "\n"
-    footer += "This analysis was generated by AI for informational purposes only.\n"
-    footer += "It should not be considered as legal advice.\n"
-    footer += "Please consult with qualified legal professionals for important decisions.\n"
-    footer += "Always refer to the original document for complete terms.\n"
-    
-    final_summary = header + "\n".join(content_parts) + footer
-    return final_summary
-
-def format_content_for_display(content):
-    """Format content to ensure proper bullet point structure."""
-    if not content:
-        return content
+async def summarize_sections_async(sections, min_length=150, max_length=300, clause_index=None):
+    """summarize_sections for the async server; the summary and risk calls run concurrently."""
+    if not sections:
+        return {}
     
-    lines = content.split('\n')
-    formatted_lines = []
+    full_text = "\n\n".join(sections.values())
     
-    for line in lines:
-        line = line.strip()
-        if not line:
-            formatted_lines.append('')
-            continue
-        
-        # Handle concatenated bullet points
-        if ' * ' in line and not line.startswith('* '):
-            # Split on bullet points
-            parts = line.split(' * ')
-            # Add the first part (might not be a bullet)
-            if parts[0].strip():
-                formatted_lines.append(parts[0].strip())
-            # Add the rest as bullet points
-            for part in parts[1:]:
-                if part.strip():
-                    formatted_lines.append('* ' + part.strip())
-        else:
-            formatted_lines.append(line)
-    
-    return '\n'.join(formatted_lines)
-
-def clean_text_for_pdf(text):
-    """Clean text for PDF compatibility by replacing Unicode characters with ASCII equivalents."""
-    # Dictionary of Unicode characters to ASCII replacements
-    unicode_replacements = {
-        '•': '* ',      # Bullet point
-        '◦': '- ',      # White bullet
-        '▪': '* ',      # Black small square
-        '▫': '- ',      # White small square
-        '–': '-',       # En dash
-        '—': '--',      # Em dash
-        ''': "'",       # Left single quotation mark
-        ''': "'",       # Right single quotation mark
-        '"': '"',       # Left double quotation mark
-        '"': '"',       # Right double quotation mark
-        '…': '...',     # Horizontal ellipsis
-        '©': '(c)',     # Copyright symbol
-        '®': '(R)',     # Registered trademark
-        '™': '(TM)',    # Trademark symbol
-        '°': ' deg',    # Degree symbol
-        '§': 'Section', # Section symbol
-        '¶': 'Para',    # Paragraph symbol
-        '†': '+',       # Dagger
-        '‡': '++',      # Double dagger
-        '★': '*',       # Black star
-        '☆': '*',       # White star
-        '✓': 'v',       # Check mark
-        '✗': 'x',       # Cross mark
-        '→': '->',      # Right arrow
-        '←': '<-',      # Left arrow
-        '↑': '^',       # Up arrow
-        '↓': 'v',       # Down arrow
-        '⚠': '!',       # Warning sign
-        '⚡': '!',       # High voltage sign
-        '🚨': '!!!',    # Police car light
-        '📋': '[*]',    # Clipboard
-        '🔍': '[?]',    # Magnifying glass
-        '📄': '[DOC]',  # Page facing up
-        '📝': '[EDIT]', # Memo
-        '🔑': '[KEY]',  # Key
-        '⭐': '*',      # Star
-        '❌': 'X',      # Cross mark
-        '✅': 'OK',     # Check mark button
-        '⚙': '[GEAR]', # Gear
-        '🎯': '[TARGET]', # Direct hit
-        '💡': '[IDEA]', # Light bulb
-        '🔧': '[TOOL]', # Wrench
-        '📊': '[CHART]', # Bar chart
-        '🌐': '[WEB]',  # Globe with meridians
-        '🏃': '[RUN]',  # Runner
-        '🚀': '[ROCKET]', # Rocket
-        '✨': '*',      # Sparkles
-        '🎉': '[PARTY]', # Party popper
-        '🛠': '[TOOLS]', # Hammer and wrench
-        '📱': '[MOBILE]', # Mobile phone
-        '💻': '[LAPTOP]', # Laptop computer
-        '🖥': '[DESKTOP]', # Desktop computer
-        '📈': '[UP]',   # Chart increasing
-        '📉': '[DOWN]', # Chart decreasing
-        '🔒': '[LOCK]', # Lock
-        '🔓': '[UNLOCK]', # Unlock
-        '🎨': '[ART]',  # Artist palette
-        '🔍': '[SEARCH]', # Magnifying glass tilted left
-        '📋': '[CLIP]', # Clipboard
-        '📄': '[PAGE]', # Page facing up
-        '🧠': '[BRAIN]', # Brain
-        '🤖': '[BOT]',  # Robot
-        '⚡': '[FAST]', # High voltage
-        '🔥': '[HOT]',  # Fire
-        '❄': '[COLD]', # Snowflake
-        '🌟': '[STAR]', # Glowing star
-        '💎': '[GEM]',  # Gem stone
-        '🏆': '[TROPHY]', # Trophy
-        '🎖': '[MEDAL]', # Military medal
-        '🏅': '[MEDAL]', # Sports medal
-        '🎪': '[CIRCUS]', # Circus tent
-        '🎭': '[THEATER]', # Performing arts
-        '🎬': '[MOVIE]', # Clapper board
-        '🎵': '[MUSIC]', # Musical note
-        '🎶': '[MUSIC]', # Multiple musical notes
-        '🔊': '[SOUND]', # Speaker high volume
-        '🔇': '[MUTE]',  # Speaker with cancellation stroke
-        '📢': '[ANNOUNCE]', # Public address loudspeaker
-        '📣': '[MEGAPHONE]', # Cheering megaphone
-        '📯': '[HORN]',  # Postal horn
-        '🔔': '[BELL]',  # Bell
-        '🔕': '[NO_BELL]', # Bell with cancellation stroke
-        '📞': '[PHONE]', # Telephone receiver
-        '📱': '[MOBILE]', # Mobile phone
-        '📲': '[CALL]',  # Mobile phone with arrow
-        '☎': '[PHONE]', # Telephone
-        '📠': '[FAX]',   # Fax machine
-        '📧': '[EMAIL]', # E-mail
-        '📨': '[INBOX]', # Incoming envelope
-        '📩': '[OUTBOX]', # Envelope with arrow
-        '📪': '[MAILBOX]', # Closed mailbox with lowered flag
-        '📫': '[MAILBOX]', # Closed mailbox with raised flag
-        '📬': '[MAILBOX]', # Open mailbox with raised flag
-        '📭': '[MAILBOX]', # Open mailbox with lowered flag
-        '📮': '[POSTBOX]', # Postbox
-        '🗳': '[BALLOT]', # Ballot box with ballot
-        '✏': '[PENCIL]', # Pencil
-        '✒': '[PEN]',    # Black nib
-        '🖋': '[PEN]',   # Fountain pen
-        '🖊': '[PEN]',   # Pen
-        '🖌': '[BRUSH]', # Paintbrush
-        '🖍': '[CRAYON]', # Crayon
-        '📝': '[MEMO]',  # Memo
-        '💼': '[BRIEFCASE]', # Briefcase
-        '📁': '[FOLDER]', # File folder
-        '📂': '[OPEN_FOLDER]', # Open file folder
-        '🗂': '[DIVIDERS]', # Card index dividers
-        '📅': '[CALENDAR]', # Calendar
-        '📆': '[CALENDAR]', # Tear-off calendar
-        '🗓': '[CALENDAR]', # Spiral calendar
-        '📇': '[ROLODEX]', # Card index
-        '📈': '[CHART_UP]', # Chart with upwards trend
-        '📉': '[CHART_DOWN]', # Chart with downwards trend
-        '📊': '[BAR_CHART]', # Bar chart
-        '📋': '[CLIPBOARD]', # Clipboard
-        '📌': '[PIN]',   # Pushpin
-        '📍': '[LOCATION]', # Round pushpin
-        '📎': '[CLIP]',  # Paperclip
-        '🖇': '[CLIPS]', # Linked paperclips
-        '📏': '[RULER]', # Straight ruler
-        '📐': '[TRIANGLE]', # Triangular ruler
-        '✂': '[SCISSORS]', # Scissors
-        '🗃': '[FILE_BOX]', # Card file box
-        '🗄': '[CABINET]', # File cabinet
-        '🗑': '[TRASH]', # Wastebasket
-        '🔒': '[LOCKED]', # Locked
-        '🔓': '[UNLOCKED]', # Unlocked
-        '🔏': '[LOCKED_PEN]', # Locked with pen
-        '🔐': '[LOCKED_KEY]', # Locked with key
-        '🔑': '[KEY]',   # Key
-        '🗝': '[OLD_KEY]', # Old key
-        '🔨': '[HAMMER]', # Hammer
-        '⛏': '[PICK]',  # Pick
-        '⚒': '[HAMMER_PICK]', # Hammer and pick
-        '🛠': '[TOOLS]', # Hammer and wrench
-        '🗡': '[SWORD]', # Dagger
-        '⚔': '[SWORDS]', # Crossed swords
-        '🔫': '[GUN]',   # Pistol
-        '🏹': '[BOW]',   # Bow and arrow
-        '🛡': '[SHIELD]', # Shield
-        '🔧': '[WRENCH]', # Wrench
-        '🔩': '[NUT_BOLT]', # Nut and bolt
-        '⚙': '[GEAR]',  # Gear
-        '🗜': '[CLAMP]', # Compression
-        '⚖': '[SCALE]', # Balance scale
-        '🔗': '[LINK]',  # Link
-        '⛓': '[CHAINS]', # Chains
-        '🧰': '[TOOLBOX]', # Toolbox
-        '🧲': '[MAGNET]', # Magnet
-        '⚗': '[ALEMBIC]', # Alembic
-        '🧪': '[TEST_TUBE]', # Test tube
-        '🧫': '[PETRI]', # Petri dish
-        '🧬': '[DNA]',   # DNA
-        '🔬': '[MICROSCOPE]', # Microscope
-        '🔭': '[TELESCOPE]', # Telescope
-        '📡': '[SATELLITE]', # Satellite antenna
-    }
+    if backend and is_hierarchical(full_text):
+        return await summarize_hierarchically_async(full_text, min_length=min_length, max_length=max_length,
+                                                    clause_index=clause_index)
     
-    # Replace Unicode characters with ASCII equivalents
-    for unicode_char, ascii_replacement in unicode_replacements.items():
-        text = text.replace(unicode_char, ascii_replacement)
+    if STRUCTURED_OUTPUT:
+        analysis = await generate_structured_analysis_async(full_text, clause_index=clause_index,
+                                                            min_length=min_length, max_length=max_length)
+        if analysis is not None:
+            return {
+                "Document Analysis": analysis.summary_blocks(),
+                "Risk Assessment": analysis.risk_blocks()
+            }
     
-    # Handle any remaining non-ASCII characters by encoding to latin-1 with replacement
+    summary, risk_analysis = await asyncio.gather(
+        generate_summary_async(full_text, min_length=min_length, max_length=max_length),
+        analyze_risks_async(full_text, clause_index=clause_index)
+    )
+    return {
+        "Document Analysis": summary,
+        "Risk Assessment": risk_analysis
+    }
+
+def _revision_prompt(previous_analysis, added_passages, removed_passages, min_length=None, max_length=None):
+    """Prompt and generation config for revise_analysis; the lengths, in words, apply when given."""
+    added_text = "\n\n".join(added_passages) or "(none)"
+    removed_text = "\n\n".join(removed_passages) or "(none)"
+
+    prompt = f"""
+    Below is an analysis of a legal document, followed by the passages that were
+    removed from the document and the passages that were added or reworded since
+    that analysis was written. The rest of the document is unchanged.
+
+    Update the analysis so it reflects the edited document:
+    - Keep points about unchanged parts of the document as they are
+    - Remove or correct points that relied on removed passages
+    - Add or adjust points for added passages
+
+    Previous analysis:
+    {previous_analysis}
+
+    Removed passages:
+    {removed_text}
+
+    Added or reworded passages:
+    {added_text}
+
+    FORMATTING RULES:
+    - Return the complete updated analysis in exactly the same format and section headings as the previous analysis
+    - Each bullet point must start on a new line
+    - Use exactly "* " (asterisk + space) for bullets
+    - No Unicode symbols or emojis
+    """
+    if max_length is None:
+        return prompt, None
+    prompt += f"- The whole updated analysis should be {min_length}-{max_length} words long\n"
+    return prompt, {"max_output_tokens": output_token_limit(max_length)}
+
+def _revision_error(error):
+    error_msg = str(error)
+
+    if "quota" in error_msg.lower():
+        return _quota_exceeded()
+    else:
+        return f"Error revising analysis: {error_msg}"
+
+def revise_analysis(previous_analysis, added_passages, removed_passages, min_length=None, max_length=None):
+    """Update an earlier analysis for an edited document using only the changed passages.
+
+    With ``max_length`` the revision is kept to min_length-max_length words, as generate_summary is.
+    """
+    if not backend:
+        return unavailable_message()
+
     try:
-        # First try to encode as latin-1
-        text.encode('latin-1')
-        return text
-    except UnicodeEncodeError:
-        # If that fails, replace problematic characters
-        return text.encode('latin-1', 'replace').decode('latin-1')
+        prompt, generation_config = _revision_prompt(previous_analysis, added_passages, removed_passages,
+                                                     min_length, max_length)
+        return _response_text(backend.generate(prompt, generation_config))
+    except Exception as e:
+        return _revision_error(e)
+
+async def revise_analysis_async(previous_analysis, added_passages, removed_passages, min_length=None, max_length=None):
+    """revise_analysis that awaits the model instead of blocking a thread."""
+    if not backend:
+        return unavailable_message()
+
+    try:
+        prompt, generation_config = _revision_prompt(previous_analysis, added_passages, removed_passages,
+                                                     min_length, max_length)
+        return _response_text(await backend.generate_async(prompt, generation_config))
+    except Exception as e:
+        return _revision_error(e)
+
+def revise_sections(previous_summaries, added_passages, removed_passages, min_length=150, max_length=300):
+    """Revise the summary and risk analysis of an edited document from its changed passages.
+
+    The summary keeps the requested length; the risk analysis, like analyze_risks, has none.
+    """
+    return {
+        "Document Analysis": revise_analysis(section_text(previous_summaries.get("Document Analysis", "")), added_passages, removed_passages,
+                                             min_length=min_length, max_length=max_length),
+        "Risk Assessment": revise_analysis(section_text(previous_summaries.get("Risk Assessment", "")), added_passages, removed_passages)
+    }
+
+async def revise_sections_async(previous_summaries, added_passages, removed_passages, min_length=150, max_length=300):
+    """revise_sections for the async server; both revisions run concurrently."""
+    summary, risk_analysis = await asyncio.gather(
+        revise_analysis_async(section_text(previous_summaries.get("Document Analysis", "")), added_passages, removed_passages,
+                              min_length=min_length, max_length=max_length),
+        revise_analysis_async(section_text(previous_summaries.get("Risk Assessment", "")), added_passages, removed_passages)
+    )
+    return {"Document Analysis": summary, "Risk Assessment": risk_analysis}
+
+def _comparison_prompt(changes, max_input_length=25000):
+    """Prompt for explain_changes: each changed clause before and after, nothing unchanged."""
+    parts = []
+    used = 0
+    for number, change in enumerate(changes, 1):
+        part = (f"Change {number} ({change['label']}, {change['status']}):\n"
+                f"Before: {change['old_text'] or '(not present)'}\n"
+                f"After: {change['new_text'] or '(removed)'}")
+        if used + len(part) > max_input_length:
+            parts.append(f"[{len(changes) - number + 1} further changes omitted due to length...]")
+            break
+        parts.append(part)
+        used += len(part) + 2
+    change_text = "\n\n".join(parts)
+
+    prompt = f"""
+    Below are the clauses that differ between an earlier and a revised version of a legal
+    document. Clauses that did not change are not shown.
+
+    Explain what changed and whether each change adds risk for the consumer, in exactly this format:
+
+    **WHAT CHANGED**
+    * Change 1: Plain-language description of the change
+    * Change 2: Plain-language description of the change
+
+    **NEW OR INCREASED RISKS**
+    * Risk 1: Brief explanation of the concern
+
+    **REDUCED RISKS**
+    * Point 1: Brief explanation
+
+    Changed clauses:
+    {change_text}
+
+    FORMATTING RULES:
+    - Each bullet point must start on a new line
+    - Use exactly "* " (asterisk + space) for bullets
+    - Keep each point to 1-2 sentences maximum
+    - Write "* None" under a heading with nothing to report
+    - No Unicode symbols or emojis
+    """
+    return prompt
+
+def explain_changes(changes):
+    """Describe the changed clauses of a document comparison and the risk they add, using the language model."""
+    if not backend:
+        return unavailable_message()
+    if not changes:
+        return "**WHAT CHANGED**\n* No clause-level changes found"
+
+    try:
+        return _response_text(backend.generate(_comparison_prompt(changes)))
+    except Exception as e:
+        error_msg = str(e)
+        if "quota" in error_msg.lower():
+            return _quota_exceeded()
+        return f"Error comparing documents: {error_msg}"
+
+VERDICTS_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "verdicts": {"type": "ARRAY", "items": {
+            "type": "OBJECT",
+            "properties": {"id": {"type": "INTEGER"}, "valid": {"type": "BOOLEAN"}},
+            "required": ["id", "valid"]
+        }}
+    },
+    "required": ["verdicts"]
+}
+
+ITEM_TYPE_DESCRIPTIONS = {
+    "notice_period": "a notice period someone must give",
+    "deadline": "a time limit for doing something",
+    "term": "how long the agreement or a commitment lasts",
+    "renewal": "an automatic renewal of the agreement",
+    "fee": "an amount or rate someone must pay",
+    "date": "a date on which something starts, ends or is due",
+}
+
+def _verification_prompt(items):
+    """Prompt for verify_extractions."""
+    numbered = "\n".join(
+        f'{item["id"]}. [{ITEM_TYPE_DESCRIPTIONS.get(item["type"], item["type"])}] "{item["text"]}" in: {item["sentence"]}'
+        for item in items)
+    return f"""
+    A rule-based extractor found these candidate terms in a legal document. Each line gives its id,
+    what it was taken to be, the matched text and the sentence it appears in:
+    {numbered}
+
+    For each id, decide whether the matched text really is what it was taken to be in that sentence
+    (for example, a year in a copyright notice or a version date is not a date something is due).
+    Return JSON of the form {{"verdicts": [{{"id": 1, "valid": true}}]}} with one entry per id.
+    """
+
+def verify_extractions(items):
+    """Confirm or reject low-confidence extracted items in one call; returns {id: valid}, or {} on failure.
+
+    ``items`` are the JSON entries of obligations.ObligationSet.
+    """
+    if not backend or not items:
+        return {}
+
+    prompt = _verification_prompt(items)
+    if backend.structured_output:
+        configs = [{"response_mime_type": "application/json", "response_schema": VERDICTS_SCHEMA},
+                   {"response_mime_type": "application/json"}]
+    else:
+        configs = [None]
+    ids = {item["id"] for item in items}
+    for generation_config in configs:
+        try:
+            text = backend.generate(prompt, generation_config)
+            # Plain-text backends may wrap the JSON in prose or a code fence
+            verdicts = json.loads(text[text.index("{"):text.rindex("}") + 1]).get("verdicts") or []
+            return {entry["id"]: bool(entry["valid"]) for entry in verdicts
+                    if isinstance(entry, dict) and entry.get("id") in ids and "valid" in entry}
+        except Exception as e:
+            print(f"Verifying extracted terms failed ({', '.join(generation_config or ['text'])}): {e}")
+    return {}
+
+DISCLAIMER_LINES = [
+    "This analysis was generated by AI for informational purposes only.",
+    "It should not be considered as legal advice.",
+    "Please consult with qualified legal professionals for important decisions.",
+    "Always refer to the original document for complete terms.",
+]
+
+def compile_summary_blocks(summaries):
+    """The final GenAI summary as render-ready blocks; structured analyses pass through without re-parsing."""
+    rule = [Block(SPACE, ""), Block(SEPARATOR, ""), Block(SPACE, "")]
+    content = []
+
+    # The document analysis (Key Points, Rights, Obligations, ...) then the risk analysis; "Summary" and
+    # "Risk Analysis" are legacy names for the same two sections
+    for summary_name, risk_name in (("Document Analysis", "Risk Assessment"), ("Summary", "Risk Analysis")):
+        if summaries.get(summary_name):
+            content += section_blocks(summaries[summary_name])
+        if summaries.get(risk_name):
+            content += rule + section_blocks(summaries[risk_name])
 
-def save_summary_as_pdf(summary, output_path="static/summary_output.pdf"):
+    for section_name, section in summaries.items():
+        if section and section_name not in ("Document Analysis", "Risk Assessment", "Summary", "Risk Analysis"):
+            content += [Block(SPACE, ""), Block(HEADING, section_name.upper()), Block(SEPARATOR, "")]
+            content += section_blocks(section)
+
+    if not content:
+        return [Block(TEXT, "Error: No content was generated. Please check your API key and try again.")]
+
+    return ([Block(TITLE, "GENAI LEGAL ASSISTANT ANALYSIS"), Block(SPACE, "")] + content
+            + [Block(SPACE, ""), Block(TITLE, "IMPORTANT DISCLAIMER")]
+            + [Block(TEXT, line) for line in DISCLAIMER_LINES])
+
+def compile_final_summary(summaries):
+    """The final GenAI summary as text, for API responses and batch results."""
+    return blocks_to_text(compile_summary_blocks(summaries))
+
+def save_summary_as_pdf(summary, output_path="static/summary_output.pdf", blocks=None):
     """Create a professionally formatted PDF with proper bullet point handling."""
-    os.makedirs("static", exist_ok=True)
-    
-    # Clean text for PDF compatibility
-    summary = clean_text_for_pdf(summary)
-    
-    # Pre-process the text to ensure proper line breaks and bullet formatting
-    summary = preprocess_text_for_pdf(summary)
-    
-    pdf = FPDF()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.add_page()
-    
-    # Add header
-    pdf.set_font("Arial", style="B", size=16)
-    pdf.set_text_color(0, 51, 102)
-    pdf.cell(0, 10, "GenAI Legal Assistant Analysis", ln=True, align="C")
-    pdf.ln(5)
-    
-    # Add generation date
-    pdf.set_font("Arial", size=10)
-    pdf.set_text_color(128, 128, 128)
-    pdf.cell(0, 5, f"Generated on: {datetime.now().strftime('%B %d, %Y at %I:%M %p')}", ln=True, align="C")
-    pdf.ln(10)
-    
-    # Process content line by line
-    lines = summary.split('\n')
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            pdf.ln(2)
-            continue
-        
-        # Reset text color for each line
-        pdf.set_text_color(0, 0, 0)
-        
-        # Handle different types of content
-        if line.startswith('=') and line.endswith('='):
-            # Main headers (surrounded by =)
-            header_text = line.replace('=', '').strip()
-            if header_text:
-                pdf.set_font("Arial", style="B", size=14)
-                pdf.set_text_color(0, 51, 102)
-                pdf.cell(0, 8, header_text, ln=True, align="C")
-                pdf.ln(3)
-        
-        elif line.startswith('**') and line.endswith('**'):
-            # Section headers (bold)
-            header_text = line.replace('**', '').strip()
-            pdf.set_font("Arial", style="B", size=12)
-            pdf.set_text_color(0, 102, 51)
-            pdf.cell(0, 7, header_text, ln=True)
-            pdf.ln(2)
-        
-        elif line.startswith('* '):
-            # Bullet points
-            bullet_text = line[2:].strip()  # Remove "* " prefix
-            pdf.set_font("Arial", size=10)
-            pdf.set_text_color(0, 0, 0)
-            
-            # Add bullet symbol and text
-            pdf.cell(5, 6, chr(149), ln=False)  # Bullet character
-            pdf.multi_cell(0, 6, bullet_text)
-            pdf.ln(1)
-        
-        elif line.startswith('-'):
-            # Separator lines
-            pdf.set_font("Arial", size=10)
-            pdf.set_text_color(128, 128, 128)
-            pdf.cell(0, 4, line, ln=True)
-            pdf.ln(1)
-        
-        else:
-            # Regular text
-            pdf.set_font("Arial", size=10)
-            pdf.set_text_color(0, 0, 0)
-            pdf.multi_cell(0, 6, line)
-            pdf.ln(1)
-    
-    # Add footer
-    pdf.ln(10)
-    pdf.set_font("Arial", style="I", size=9)
-    pdf.set_text_color(128, 128, 128)
-    pdf.multi_cell(0, 4, "This analysis was generated using Google's Gemini AI. Please consult legal professionals for important decisions.")
-    
-    pdf.output(output_path)
-
-def preprocess_text_for_pdf(text):
-    """Preprocess text to ensure proper formatting for PDF generation."""
-    
-    # Split text into lines
-    lines = text.split('\n')
-    processed_lines = []
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            processed_lines.append('')
-            continue
-        
-        # Handle concatenated bullet points (common issue from AI responses)
-        if ' * ' in line and not line.startswith('* '):
-            # Split on bullet points but preserve the first part
-            parts = line.split(' * ')
-            processed_lines.append(parts[0])
-            for part in parts[1:]:
-                if part.strip():
-                    processed_lines.append('* ' + part.strip())
-        else:
-            processed_lines.append(line)
-    
-    return '\n'.join(processed_lines)
+    # Parse once; bullet splitting and Unicode cleanup happen inside the block renderer
+    if blocks is None:
+        blocks = parse_summary(summary)
+    
+    render_pdf(
+        blocks,
+        output_path,
+        title="GenAI Legal Assistant Analysis",
+        footer=f"This analysis was generated using {BACKENDS[backend_name].label}. Please consult legal professionals for important decisions."
+    )
 
 def store_feedback(feedback_text, feedback_file="feedback.json"):
     """Store user feedback."""
@@ -1,32 +1,19 @@
 import os
-import docx
 import json
-import re
-from PyPDF2 import PdfReader
-from fpdf import FPDF
+from summary_render import parse_summary, render_pdf
 from datetime import datetime
-from transformers import pipeline
-from keybert import KeyBERT
-
-def extract_text_from_txt(file_path):
-    """Extract text from TXT file."""
-    with open(file_path, 'r', encoding='utf-8') as file:
-        return file.read()
-
-def extract_text_from_pdf(file_path):
-    """Extract text from PDF file."""
-    pdf_reader = PdfReader(file_path)
-    text = ""
-    for page in pdf_reader.pages:
-        page_text = page.extract_text()
-        if page_text:
-            text += page_text + "\n"
-    return text
-
-def extract_text_from_docx(file_path):
-    """Extract text from DOCX file."""
-    doc = docx.Document(file_path)
-    return "\n".join(para.text for para in doc.paragraphs)
+from hf_backends import get_backend
+from llm_backends import LLM_BACKEND, get_backend as get_llm_backend
+from embeddings import get_embedding_service, find_duplicate
+from clause_index import format_risk_findings
+
+# Sections at least this similar to one already summarised reuse its summary instead of running Pegasus
+DUPLICATE_SECTION_SIMILARITY = float(os.getenv('DUPLICATE_SECTION_SIMILARITY', '0.97'))
+
+# Requested summary lengths are in words; Pegasus limits are in tokens
+TOKENS_PER_WORD = float(os.getenv('TOKENS_PER_WORD', '1.4'))
+MIN_SECTION_TOKENS = 30
+MAX_SECTION_TOKENS = 256
 
 def split_into_sections(text):
     """Split text into logical sections based on common legal headings."""
@@ -55,31 +42,51 @@ def split_into_sections(text):
     
     return sections
 
-def summarize_text_hf(text):
-    """Summarize text using nsi319/legal-pegasus model."""
-    summarizer = pipeline("summarization", model="nsi319/legal-pegasus")
-    summary = summarizer(text, max_length=150, min_length=30, do_sample=False)
-    return summary[0]['summary_text']
+def summarize_text_hf(text, min_length=30, max_length=150):
+    """Summarize text using nsi319/legal-pegasus on the configured backend (HF_BACKEND)."""
+    return get_backend().summarize(text, min_length=min_length, max_length=max_length)
 
-def extract_keywords_bert(text):
-    """Extract keywords using KeyBERT."""
-    kw_model = KeyBERT()
-    keywords = kw_model.extract_keywords(text, keyphrase_ngram_range=(1, 2), stop_words='english', top_n=5)
-    return [keyword for keyword, _ in keywords]
+def section_token_limits(min_length, max_length, section_count):
+    """Per-section Pegasus token limits that add up to a summary of min_length-max_length words."""
+    section_count = max(section_count, 1)
+    max_tokens = max(MIN_SECTION_TOKENS, min(MAX_SECTION_TOKENS, round(max_length * TOKENS_PER_WORD / section_count)))
+    min_tokens = max(10, min(max_tokens - 10, round(min_length * TOKENS_PER_WORD / section_count)))
+    return min_tokens, max_tokens
 
-def summarize_sections(sections, min_length=150, max_length=300):
+def extract_keywords_bert(text, text_vector=None):
+    """Extract KeyBERT-style keywords with the shared embedding model."""
+    return get_embedding_service().keywords(text, top_n=5, ngram_range=(1, 2), text_vector=text_vector)
+
+def summarize_sections(sections, min_length=150, max_length=300, clause_index=None):
     """Create summaries for each section using Hugging Face and KeyBERT."""
     summaries = {}
     
-    for section_name, content in sections.items():
-        if not content.strip():
+    # Encode every section once; the vectors drive keyword extraction and duplicate detection
+    names = [name for name, content in sections.items() if content.strip()]
+    vectors = get_embedding_service().encode([sections[name] for name in names])
+    summarised = []
+    min_tokens, max_tokens = section_token_limits(min_length, max_length, len(names))
+    
+    for i, section_name in enumerate(names):
+        content = sections[section_name]
+        
+        duplicate = find_duplicate(vectors[i], vectors[summarised], DUPLICATE_SECTION_SIMILARITY) if summarised else None
+        if duplicate is not None:
+            summaries[section_name] = summaries[names[summarised[duplicate]]]
             continue
             
-        summary_text = summarize_text_hf(content)
-        keywords = extract_keywords_bert(content)
+        summary_text = summarize_text_hf(content, min_length=min_tokens, max_length=max_tokens)
+        keywords = extract_keywords_bert(content, text_vector=vectors[i])
         
         formatted_summary = f"{summary_text}\n\nKey Terms: {', '.join(keywords)}"
         summaries[section_name] = formatted_summary.strip()
+        summarised.append(i)
+    
+    # Add risk-pattern matches from the clause index as their own section
+    if clause_index is not None:
+        risk_findings = format_risk_findings(clause_index)
+        if risk_findings:
+            summaries["Risk Analysis"] = risk_findings
     
     return summaries
 
@@ -114,106 +121,17 @@ def compile_final_summary(summaries):
     final_summary = header + "\n\n".join(formatted_sections) + footer
     return final_summary
 
-def clean_text_for_pdf(text):
-    """Clean text for PDF compatibility by replacing Unicode characters with ASCII equivalents."""
-    unicode_replacements = {
-        '•': '* ',      # Bullet point
-        '◦': '- ',      # White bullet
-        '▪': '* ',      # Black small square
-        '▫': '- ',      # White small square
-        '–': '-',       # En dash
-        '—': '--',      # Em dash
-        ''': "'",       # Left single quotation mark
-        ''': "'",       # Right single quotation mark
-        '"': '"',       # Left double quotation mark
-        '"': '"',       # Right double quotation mark
-        '…': '...',     # Horizontal ellipsis
-        '©': '(c)',     # Copyright symbol
-        '®': '(R)',     # Registered trademark
-        '™': '(TM)',    # Trademark symbol
-        '°': ' deg',    # Degree symbol
-        '§': 'Section', # Section symbol
-        '¶': 'Para',    # Paragraph symbol
-    }
-    
-    # Replace Unicode characters with ASCII equivalents
-    for unicode_char, ascii_replacement in unicode_replacements.items():
-        text = text.replace(unicode_char, ascii_replacement)
-    
-    # Handle any remaining non-ASCII characters by encoding to latin-1 with replacement
-    try:
-        text.encode('latin-1')
-        return text
-    except UnicodeEncodeError:
-        return text.encode('latin-1', 'replace').decode('latin-1')
-
-def save_summary_as_pdf(summary, output_path="static/summary_output.pdf"):
+def save_summary_as_pdf(summary, output_path="static/summary_output.pdf", blocks=None):
     """Create a professionally formatted PDF."""
-    os.makedirs("static", exist_ok=True)
-    
-    summary = clean_text_for_pdf(summary)
-    pdf = FPDF()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.add_page()
-    
-    # Add header
-    pdf.set_font("Arial", style="B", size=16)
-    pdf.set_text_color(0, 51, 102)
-    pdf.cell(0, 10, "Legal Document Analysis (HuggingFace)", ln=True, align="C")
-    pdf.ln(5)
-    
-    # Add generation date
-    pdf.set_font("Arial", size=10)
-    pdf.set_text_color(128, 128, 128)
-    pdf.cell(0, 5, f"Generated on: {datetime.now().strftime('%B %d, %Y at %I:%M %p')}", ln=True, align="C")
-    pdf.ln(10)
-    
-    # Process content
-    lines = summary.split('\n')
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            pdf.ln(2)
-            continue
-        
-        pdf.set_text_color(0, 0, 0)
-        
-        if line.startswith('=') and line.endswith('='):
-            header_text = line.replace('=', '').strip()
-            if header_text:
-                pdf.set_font("Arial", style="B", size=14)
-                pdf.set_text_color(0, 51, 102)
-                pdf.cell(0, 8, header_text, ln=True, align="C")
-                pdf.ln(3)
-        
-        elif line.startswith('* '):
-            bullet_text = line[2:].strip()
-            pdf.set_font("Arial", size=10)
-            pdf.set_text_color(0, 0, 0)
-            pdf.cell(5, 6, chr(149), ln=False)
-            pdf.multi_cell(0, 6, bullet_text)
-            pdf.ln(1)
-        
-        elif line.startswith('-'):
-            pdf.set_font("Arial", size=10)
-            pdf.set_text_color(128, 128, 128)
-            pdf.cell(0, 4, line, ln=True)
-            pdf.ln(1)
-        
-        else:
-            pdf.set_font("Arial", size=10)
-            pdf.set_text_color(0, 0, 0)
-            pdf.multi_cell(0, 6, line)
-            pdf.ln(1)
-    
-    # Add footer
-    pdf.ln(10)
-    pdf.set_font("Arial", style="I", size=9)
-    pdf.set_text_color(128, 128, 128)
-    pdf.multi_cell(0, 4, "This analysis was generated using Legal Pegasus and KeyBERT. Please consult legal professionals for important decisions.")
-    
-    pdf.output(output_path)
+    if blocks is None:
+        blocks = parse_summary(summary)
+    
+    render_pdf(
+        blocks,
+        output_path,
+        title="Legal Document Analysis (HuggingFace)",
+        footer="This analysis was generated using Legal Pegasus and KeyBERT. Please consult legal professionals for important decisions."
+    )
 
 def store_feedback(feedback_text, feedback_file="feedback.json"):
     """Store user feedback."""
@@ -226,8 +144,47 @@ def store_feedback(feedback_text, feedback_file="feedback.json"):
         with open(feedback_file, "a") as file:
             json.dump(feedback_data, file)
             file.write("\n")
-    except Exception as e:
+    except Exception:
         pass  # Silently handle feedback storage errors
 
-def answer_question(text, question):
-    return "Q&A feature requires GenAI mode. Please wait till it's available."
+def _answer_backend():
+    """The LLM_BACKEND language model when it runs in this mode (local or fake), else None."""
+    if LLM_BACKEND == 'gemini':
+        return None  # Gemini is configured by summariser_genai, which failed to load
+    backend = get_llm_backend()
+    return backend if backend.available() else None
+
+def _answer_prompt(question, passages, history=None):
+    earlier = "".join(f"Q: {asked}\nA: {answered[:600]}\n\n" for asked, answered in history or ())
+    excerpts = "\n\n".join(passage for _, passage in passages)
+    return f"""
+    Answer the question about a legal document using only the passages below. Use simple, clear language.
+    If the passages do not contain the answer, say so.
+
+    {earlier}Passages:
+    {excerpts}
+
+    Question: {question}"""
+
+def answer_question(text, question, context=None, history=None):
+    """Answer from the document passages most similar to the question.
+
+    With a local or fake LLM_BACKEND the passages are sent to it with the
+    question; otherwise (Gemini needs GenAI mode) the passages are returned.
+    """
+    passages = get_embedding_service().search(text, question, top_k=3)
+    if not passages:
+        return "Q&A feature requires GenAI mode. Please wait till it's available."
+    
+    backend = _answer_backend()
+    if backend is not None:
+        try:
+            answer = backend.generate(_answer_prompt(question, passages, history))
+            if answer:
+                return answer
+        except Exception as e:
+            print(f"{backend.name} backend failed to answer, returning passages: {e}")
+    
+    answer = "Most relevant passages from the document:\n\n"
+    answer += "\n\n".join(f"{i}. {passage}" for i, (_, passage) in enumerate(passages, 1))
+    return answer
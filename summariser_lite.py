@@ -1,30 +1,25 @@
-import os
-import docx
 import json
 import re
-from PyPDF2 import PdfReader
-from fpdf import FPDF
+from summary_render import parse_summary, render_pdf, NUMBERED, TEXT, SPACE
 from datetime import datetime
+from clause_index import format_risk_findings
 
-def extract_text_from_txt(file_path):
-    """Extract text from TXT file."""
-    with open(file_path, 'r', encoding='utf-8') as file:
-        return file.read()
+# Lite summaries are mostly sentences, so use a larger justified body font
+LITE_PDF_STYLES = {
+    NUMBERED: ("", 11, (0, 0, 0), 6, "J", 2),
+    TEXT: ("", 11, (0, 0, 0), 6, "J", 2),
+    SPACE: ("", 11, (0, 0, 0), 3, "L", 0),
+}
 
-def extract_text_from_pdf(file_path):
-    """Extract text from PDF file."""
-    pdf_reader = PdfReader(file_path)
-    text = ""
-    for page in pdf_reader.pages:
-        page_text = page.extract_text()
-        if page_text:
-            text += page_text + "\n"
-    return text
+# Typical length of an extracted sentence, used to turn word counts into sentence counts
+WORDS_PER_SENTENCE = 25
 
-def extract_text_from_docx(file_path):
-    """Extract text from DOCX file."""
-    doc = docx.Document(file_path)
-    return "\n".join(para.text for para in doc.paragraphs)
+def sentences_per_section(min_length, max_length, section_count):
+    """Key sentences to extract per section for a summary of min_length-max_length words."""
+    section_count = max(section_count, 1)
+    fewest = -(-min_length // (WORDS_PER_SENTENCE * section_count))
+    most = round(max_length / WORDS_PER_SENTENCE / section_count)
+    return max(1, min(8, max(fewest, most)))
 
 def split_into_sections(text):
     """Split text into logical sections based on common legal headings."""
@@ -96,16 +91,17 @@ def create_simple_summary(text, max_sentences=3):
     
     return top_sentences
 
-def summarize_sections(sections, min_length=150, max_length=300):
+def summarize_sections(sections, min_length=150, max_length=300, clause_index=None):
     """Create summaries for each section using rule-based approach."""
     summaries = {}
+    max_sentences = sentences_per_section(min_length, max_length, sum(1 for content in sections.values() if content.strip()))
     
     for section_name, content in sections.items():
         if not content.strip():
             continue
             
         # Create simple summary
-        key_sentences = create_simple_summary(content, max_sentences=3)
+        key_sentences = create_simple_summary(content, max_sentences=max_sentences)
         
         # Format as numbered points
         formatted_summary = ""
@@ -119,6 +115,11 @@ def summarize_sections(sections, min_length=150, max_length=300):
         
         summaries[section_name] = formatted_summary.strip()
     
+    # Add risk-pattern matches from the clause index as their own section
+    if clause_index is not None:
+        risk_findings = format_risk_findings(clause_index)
+        summaries["Risk Analysis"] = risk_findings or "No common risk patterns (auto-renewal, arbitration, indemnity, liability caps) were found."
+    
     return summaries
 
 def compile_final_summary(summaries):
@@ -152,149 +153,18 @@ def compile_final_summary(summaries):
     final_summary = header + "\n\n".join(formatted_sections) + footer
     return final_summary
 
-def clean_text_for_pdf(text):
-    """Clean text for PDF compatibility by replacing Unicode characters with ASCII equivalents."""
-    # Dictionary of Unicode characters to ASCII replacements
-    unicode_replacements = {
-        '•': '* ',      # Bullet point
-        '◦': '- ',      # White bullet
-        '▪': '* ',      # Black small square
-        '▫': '- ',      # White small square
-        '–': '-',       # En dash
-        '—': '--',      # Em dash
-        ''': "'",       # Left single quotation mark
-        ''': "'",       # Right single quotation mark
-        '"': '"',       # Left double quotation mark
-        '"': '"',       # Right double quotation mark
-        '…': '...',     # Horizontal ellipsis
-        '©': '(c)',     # Copyright symbol
-        '®': '(R)',     # Registered trademark
-        '™': '(TM)',    # Trademark symbol
-        '°': ' deg',    # Degree symbol
-        '§': 'Section', # Section symbol
-        '¶': 'Para',    # Paragraph symbol
-        '†': '+',       # Dagger
-        '‡': '++',      # Double dagger
-        '★': '*',       # Black star
-        '☆': '*',       # White star
-        '✓': 'v',       # Check mark
-        '✗': 'x',       # Cross mark
-        '→': '->',      # Right arrow
-        '←': '<-',      # Left arrow
-        '↑': '^',       # Up arrow
-        '↓': 'v',       # Down arrow
-        '⚠': '!',       # Warning sign
-        '📋': '[*]',    # Clipboard
-        '🔍': '[?]',    # Magnifying glass
-        '📄': '[DOC]',  # Page facing up
-        '📝': '[EDIT]', # Memo
-        '🔑': '[KEY]',  # Key
-    }
-    
-    # Replace Unicode characters with ASCII equivalents
-    for unicode_char, ascii_replacement in unicode_replacements.items():
-        text = text.replace(unicode_char, ascii_replacement)
-    
-    # Handle any remaining non-ASCII characters by encoding to latin-1 with replacement
-    try:
-        # First try to encode as latin-1
-        text.encode('latin-1')
-        return text
-    except UnicodeEncodeError:
-        # If that fails, replace problematic characters
-        return text.encode('latin-1', 'replace').decode('latin-1')
-
-def save_summary_as_pdf(summary, output_path="static/summary_output.pdf"):
+def save_summary_as_pdf(summary, output_path="static/summary_output.pdf", blocks=None):
     """Create a professionally formatted PDF."""
-    # Ensure static directory exists
-    os.makedirs("static", exist_ok=True)
-    
-    summary = clean_text_for_pdf(summary)
-    pdf = FPDF()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.add_page()
-    
-    # Add header
-    pdf.set_font("Arial", style="B", size=16)
-    pdf.set_text_color(0, 51, 102)
-    pdf.cell(0, 10, "Terms & Conditions Summary", ln=True, align="C")
-    pdf.ln(5)
-    
-    # Add generation date
-    pdf.set_font("Arial", size=10)
-    pdf.set_text_color(128, 128, 128)
-    pdf.cell(0, 5, f"Generated on: {datetime.now().strftime('%B %d, %Y at %I:%M %p')}", ln=True, align="C")
-    pdf.ln(10)
-    
-    # Reset text color
-    pdf.set_text_color(0, 0, 0)
-    
-    # Process content
-    lines = summary.split('\n')
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            pdf.ln(3)
-            continue
-            
-        if line.startswith('='):
-            if not line.replace('=', '').strip():
-                pdf.ln(2)
-            else:
-                pdf.set_font("Arial", style="B", size=14)
-                pdf.set_text_color(0, 51, 102)
-                header_text = line.replace('=', '').strip()
-                if header_text:
-                    pdf.cell(0, 8, header_text, ln=True, align="C")
-                    pdf.ln(3)
-        
-        elif line.startswith('📋') or line.startswith('🔍'):
-            pdf.set_font("Arial", style="B", size=12)
-            pdf.set_text_color(0, 102, 51)
-            clean_line = line.encode('ascii', 'ignore').decode('ascii')
-            pdf.cell(0, 8, clean_line, ln=True)
-            pdf.ln(2)
-        
-        elif line.startswith('-'):
-            pdf.set_font("Arial", size=10)
-            pdf.set_text_color(128, 128, 128)
-            pdf.cell(0, 4, line, ln=True)
-            pdf.ln(1)
-        
-        elif line.startswith('⚠️'):
-            pdf.set_font("Arial", style="B", size=10)
-            pdf.set_text_color(204, 102, 0)
-            clean_line = line.encode('ascii', 'ignore').decode('ascii')
-            pdf.multi_cell(0, 5, clean_line)
-            pdf.ln(2)
-        
-        elif any(line.startswith(str(i) + '.') for i in range(1, 10)):
-            pdf.set_font("Arial", size=11)
-            pdf.set_text_color(0, 0, 0)
-            pdf.multi_cell(0, 6, line, align="J")
-            pdf.ln(2)
-        
-        elif line.startswith('Key Terms:') or line.startswith('📋 Key Terms:'):
-            pdf.set_font("Arial", style="I", size=10)
-            pdf.set_text_color(51, 51, 153)
-            clean_line = line.encode('ascii', 'ignore').decode('ascii')
-            pdf.multi_cell(0, 5, clean_line)
-            pdf.ln(3)
-        
-        else:
-            pdf.set_font("Arial", size=11)
-            pdf.set_text_color(0, 0, 0)
-            pdf.multi_cell(0, 6, line, align="J")
-            pdf.ln(2)
-    
-    # Add footer
-    pdf.ln(10)
-    pdf.set_font("Arial", style="I", size=9)
-    pdf.set_text_color(128, 128, 128)
-    pdf.multi_cell(0, 4, "This summary was generated using rule-based text analysis. Please consult the original document and legal professionals for complete information.")
-    
-    pdf.output(output_path)
+    if blocks is None:
+        blocks = parse_summary(summary)
+    
+    render_pdf(
+        blocks,
+        output_path,
+        title="Terms & Conditions Summary",
+        footer="This summary was generated using rule-based text analysis. Please consult the original document and legal professionals for complete information.",
+        styles=LITE_PDF_STYLES
+    )
 
 def store_feedback(feedback_text, feedback_file="feedback.json"):
     """Store user feedback."""
@@ -0,0 +1,469 @@
+import os
+import re
+import sys
+import html
+import time
+from collections import namedtuple
+from datetime import datetime
+from fpdf import FPDF
+
+# Block kinds produced by parse_summary
+TITLE = "title"          # banner title between "=====" lines
+SECTION = "section"      # emoji-prefixed section header (Lite/HF summaries)
+HEADING = "heading"      # **Heading** or markdown ## heading
+BULLET = "bullet"
+NUMBERED = "numbered"
+KEY_TERMS = "key_terms"
+WARNING = "warning"
+SEPARATOR = "separator"
+TEXT = "text"
+SPACE = "space"
+
+Block = namedtuple("Block", ["kind", "text"])
+
+NUMBERED_LINE = re.compile(r'^\d+[.)]\s')
+BOLD = re.compile(r'\*\*([^*\n]+?)\*\*')
+ITALIC = re.compile(r'(?<!\*)\*([^*\n]+?)\*(?!\*)')
+
+# PDF styles per block kind: font style, size, RGB colour, line height, alignment, space after
+PDF_STYLES = {
+    TITLE: ("B", 14, (0, 51, 102), 8, "C", 3),
+    SECTION: ("B", 12, (0, 102, 51), 8, "L", 2),
+    HEADING: ("B", 12, (0, 102, 51), 7, "L", 2),
+    BULLET: ("", 10, (0, 0, 0), 6, "L", 1),
+    NUMBERED: ("", 10, (0, 0, 0), 6, "L", 1),
+    KEY_TERMS: ("I", 10, (51, 51, 153), 5, "L", 3),
+    WARNING: ("B", 10, (204, 102, 0), 5, "L", 2),
+    SEPARATOR: ("", 10, (128, 128, 128), 4, "L", 1),
+    TEXT: ("", 10, (0, 0, 0), 6, "L", 1),
+    SPACE: ("", 10, (0, 0, 0), 2, "L", 0),
+}
+
+# Unicode characters that the core PDF fonts cannot show, with ASCII stand-ins
+PDF_UNICODE_REPLACEMENTS = {
+    '•': '* ',           # Bullet point
+    '◦': '- ',           # White bullet
+    '▪': '* ',           # Black small square
+    '▫': '- ',           # White small square
+    '–': '-',            # En dash
+    '—': '--',           # Em dash
+    '‘': "'",            # Left single quotation mark
+    '’': "'",            # Right single quotation mark
+    '“': '"',            # Left double quotation mark
+    '”': '"',            # Right double quotation mark
+    '…': '...',          # Horizontal ellipsis
+    '©': '(c)',          # Copyright symbol
+    '®': '(R)',          # Registered trademark
+    '™': '(TM)',         # Trademark symbol
+    '°': ' deg',         # Degree symbol
+    '§': 'Section',      # Section symbol
+    '¶': 'Para',         # Paragraph symbol
+    '†': '+',            # Dagger
+    '‡': '++',           # Double dagger
+    '★': '*',            # Black star
+    '☆': '*',            # White star
+    '✓': 'v',            # Check mark
+    '✗': 'x',            # Cross mark
+    '→': '->',           # Right arrow
+    '←': '<-',           # Left arrow
+    '↑': '^',            # Up arrow
+    '↓': 'v',            # Down arrow
+    '⚠': '!',            # Warning sign
+    '🚨': '!!!',          # Police car light
+    '⭐': '*',            # Star
+    '❌': 'X',            # Cross mark
+    '✅': 'OK',           # Check mark button
+    '🎯': '[TARGET]',     # Direct hit
+    '💡': '[IDEA]',       # Light bulb
+    '🌐': '[WEB]',        # Globe with meridians
+    '🏃': '[RUN]',        # Runner
+    '🚀': '[ROCKET]',     # Rocket
+    '✨': '*',            # Sparkles
+    '🎉': '[PARTY]',      # Party popper
+    '💻': '[LAPTOP]',     # Laptop computer
+    '🖥': '[DESKTOP]',    # Desktop computer
+    '🎨': '[ART]',        # Artist palette
+    '🔍': '[SEARCH]',     # Magnifying glass tilted left
+    '📄': '[PAGE]',       # Page facing up
+    '🧠': '[BRAIN]',      # Brain
+    '🤖': '[BOT]',        # Robot
+    '⚡': '[FAST]',       # High voltage
+    '🔥': '[HOT]',        # Fire
+    '❄': '[COLD]',       # Snowflake
+    '🌟': '[STAR]',       # Glowing star
+    '💎': '[GEM]',        # Gem stone
+    '🏆': '[TROPHY]',     # Trophy
+    '🎖': '[MEDAL]',      # Military medal
+    '🏅': '[MEDAL]',      # Sports medal
+    '🎪': '[CIRCUS]',     # Circus tent
+    '🎭': '[THEATER]',    # Performing arts
+    '🎬': '[MOVIE]',      # Clapper board
+    '🎵': '[MUSIC]',      # Musical note
+    '🎶': '[MUSIC]',      # Multiple musical notes
+    '🔊': '[SOUND]',      # Speaker high volume
+    '🔇': '[MUTE]',       # Speaker with cancellation stroke
+    '📢': '[ANNOUNCE]',   # Public address loudspeaker
+    '📣': '[MEGAPHONE]',  # Cheering megaphone
+    '📯': '[HORN]',       # Postal horn
+    '🔔': '[BELL]',       # Bell
+    '🔕': '[NO_BELL]',    # Bell with cancellation stroke
+    '📞': '[PHONE]',      # Telephone receiver
+    '📱': '[MOBILE]',     # Mobile phone
+    '📲': '[CALL]',       # Mobile phone with arrow
+    '☎': '[PHONE]',      # Telephone
+    '📠': '[FAX]',        # Fax machine
+    '📧': '[EMAIL]',      # E-mail
+    '📨': '[INBOX]',      # Incoming envelope
+    '📩': '[OUTBOX]',     # Envelope with arrow
+    '📪': '[MAILBOX]',    # Closed mailbox with lowered flag
+    '📫': '[MAILBOX]',    # Closed mailbox with raised flag
+    '📬': '[MAILBOX]',    # Open mailbox with raised flag
+    '📭': '[MAILBOX]',    # Open mailbox with lowered flag
+    '📮': '[POSTBOX]',    # Postbox
+    '🗳': '[BALLOT]',     # Ballot box with ballot
+    '✏': '[PENCIL]',     # Pencil
+    '✒': '[PEN]',        # Black nib
+    '🖋': '[PEN]',        # Fountain pen
+    '🖊': '[PEN]',        # Pen
+    '🖌': '[BRUSH]',      # Paintbrush
+    '🖍': '[CRAYON]',     # Crayon
+    '📝': '[MEMO]',       # Memo
+    '💼': '[BRIEFCASE]',  # Briefcase
+    '📁': '[FOLDER]',     # File folder
+    '📂': '[OPEN_FOLDER]', # Open file folder
+    '🗂': '[DIVIDERS]',   # Card index dividers
+    '📅': '[CALENDAR]',   # Calendar
+    '📆': '[CALENDAR]',   # Tear-off calendar
+    '🗓': '[CALENDAR]',   # Spiral calendar
+    '📇': '[ROLODEX]',    # Card index
+    '📈': '[CHART_UP]',   # Chart with upwards trend
+    '📉': '[CHART_DOWN]', # Chart with downwards trend
+    '📊': '[BAR_CHART]',  # Bar chart
+    '📋': '[CLIPBOARD]',  # Clipboard
+    '📌': '[PIN]',        # Pushpin
+    '📍': '[LOCATION]',   # Round pushpin
+    '📎': '[CLIP]',       # Paperclip
+    '🖇': '[CLIPS]',      # Linked paperclips
+    '📏': '[RULER]',      # Straight ruler
+    '📐': '[TRIANGLE]',   # Triangular ruler
+    '✂': '[SCISSORS]',   # Scissors
+    '🗃': '[FILE_BOX]',   # Card file box
+    '🗄': '[CABINET]',    # File cabinet
+    '🗑': '[TRASH]',      # Wastebasket
+    '🔒': '[LOCKED]',     # Locked
+    '🔓': '[UNLOCKED]',   # Unlocked
+    '🔏': '[LOCKED_PEN]', # Locked with pen
+    '🔐': '[LOCKED_KEY]', # Locked with key
+    '🔑': '[KEY]',        # Key
+    '🗝': '[OLD_KEY]',    # Old key
+    '🔨': '[HAMMER]',     # Hammer
+    '⛏': '[PICK]',       # Pick
+    '⚒': '[HAMMER_PICK]', # Hammer and pick
+    '🛠': '[TOOLS]',      # Hammer and wrench
+    '🗡': '[SWORD]',      # Dagger
+    '⚔': '[SWORDS]',     # Crossed swords
+    '🔫': '[GUN]',        # Pistol
+    '🏹': '[BOW]',        # Bow and arrow
+    '🛡': '[SHIELD]',     # Shield
+    '🔧': '[WRENCH]',     # Wrench
+    '🔩': '[NUT_BOLT]',   # Nut and bolt
+    '⚙': '[GEAR]',       # Gear
+    '🗜': '[CLAMP]',      # Compression
+    '⚖': '[SCALE]',      # Balance scale
+    '🔗': '[LINK]',       # Link
+    '⛓': '[CHAINS]',     # Chains
+    '🧰': '[TOOLBOX]',    # Toolbox
+    '🧲': '[MAGNET]',     # Magnet
+    '⚗': '[ALEMBIC]',    # Alembic
+    '🧪': '[TEST_TUBE]',  # Test tube
+    '🧫': '[PETRI]',      # Petri dish
+    '🧬': '[DNA]',        # DNA
+    '🔬': '[MICROSCOPE]', # Microscope
+    '🔭': '[TELESCOPE]',  # Telescope
+    '📡': '[SATELLITE]',  # Satellite antenna
+    '\ufe0f': '',       # Emoji variation selector
+    'ℹ': 'i',            # Information source
+}
+
+PDF_TRANSLATION = str.maketrans(PDF_UNICODE_REPLACEMENTS)
+
+def clean_text_for_pdf(text):
+    """Replace Unicode characters the PDF fonts cannot encode, in a single pass."""
+    text = text.translate(PDF_TRANSLATION)
+    try:
+        text.encode('latin-1')
+        return text
+    except UnicodeEncodeError:
+        return text.encode('latin-1', 'replace').decode('latin-1')
+
+def _is_rule(line, char):
+    return len(line) >= 3 and not line.strip(char)
+
+def parse_summary(text):
+    """Parse summary text into a list of typed blocks in one pass over its lines."""
+    blocks = []
+    append = blocks.append
+    lines = text.split('\n')
+    count = len(lines)
+    i = 0
+
+    while i < count:
+        line = lines[i].strip()
+        i += 1
+
+        if not line:
+            append(Block(SPACE, ""))
+            continue
+
+        first = line[0]
+
+        if first == '=':
+            if _is_rule(line, '='):
+                # "=====" / TITLE / "=====" banners collapse into one title block
+                if i + 1 < count and lines[i].strip() and _is_rule(lines[i + 1].strip(), '='):
+                    append(Block(TITLE, lines[i].strip()))
+                    i += 2
+                continue
+            append(Block(TITLE, line.strip('= ')))
+            continue
+
+        if first == '-' and _is_rule(line, '-'):
+            append(Block(SEPARATOR, ""))
+            continue
+
+        if first == '*':
+            if line.startswith('**') and line.endswith('**') and len(line) > 4:
+                append(Block(HEADING, line.strip('*').strip()))
+                continue
+            if line.startswith('* '):
+                append(Block(BULLET, line[2:].strip()))
+                continue
+
+        if first in '-•' and line[1:2] == ' ':
+            append(Block(BULLET, line[2:].strip()))
+            continue
+
+        if first == '#':
+            append(Block(HEADING, line.lstrip('#').strip()))
+            continue
+
+        if first in '\U0001f4cb\U0001f50d':
+            rest = line[1:].strip()
+            if rest.startswith('Key Terms:'):
+                append(Block(KEY_TERMS, rest[len('Key Terms:'):].strip()))
+            else:
+                append(Block(SECTION, rest))
+            continue
+
+        if line.startswith('Key Terms:'):
+            append(Block(KEY_TERMS, line[len('Key Terms:'):].strip()))
+            continue
+
+        if first == '⚠':
+            append(Block(WARNING, line.lstrip('⚠️ ').strip()))
+            continue
+
+        if first.isdigit() and NUMBERED_LINE.match(line):
+            append(Block(NUMBERED, line))
+            continue
+
+        # Model output sometimes runs several bullets together on one line
+        if ' * ' in line:
+            parts = line.split(' * ')
+            if parts[0].strip():
+                append(Block(TEXT, parts[0].strip()))
+            for part in parts[1:]:
+                if part.strip():
+                    append(Block(BULLET, part.strip()))
+            continue
+
+        append(Block(TEXT, line))
+
+    return blocks
+
+def blocks_to_text(blocks):
+    """Serialise blocks back to summary text; parse_summary() reads the result back unchanged."""
+    lines = []
+    append = lines.append
+    for kind, text in blocks:
+        if kind == TITLE:
+            append("=" * 60)
+            append(text)
+            append("=" * 60)
+        elif kind == SECTION:
+            append(f"\U0001f4cb {text}")
+        elif kind == HEADING:
+            append(f"**{text}**")
+        elif kind == BULLET:
+            append(f"* {text}")
+        elif kind == KEY_TERMS:
+            append(f"Key Terms: {text}")
+        elif kind == WARNING:
+            append(f"⚠️ {text}")
+        elif kind == SEPARATOR:
+            append("-" * 60)
+        else:
+            append(text)
+    return "\n".join(lines)
+
+def section_blocks(content):
+    """Blocks of one section summary: structured analyses are blocks already, model text is parsed."""
+    if isinstance(content, str):
+        return parse_summary(content)
+    # Blocks read back from the document store are plain [kind, text] lists
+    return [Block(*block) for block in content]
+
+def section_text(content):
+    """One section summary as text, e.g. to quote it in a revision prompt or a JSON response."""
+    return content if isinstance(content, str) else blocks_to_text(section_blocks(content))
+
+def _text_width(pdf, text):
+    """Width of text in the current font, using the font's cached character widths."""
+    return sum(map(pdf.current_font['cw'].__getitem__, text)) * pdf.font_size / 1000
+
+def render_pdf(blocks, output_path, title, footer, styles=None):
+    """Render parsed summary blocks to a PDF, switching font and colour only when they change."""
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    styles = dict(PDF_STYLES, **(styles or {}))
+
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+
+    # Add header
+    pdf.set_font("Arial", style="B", size=16)
+    pdf.set_text_color(0, 51, 102)
+    pdf.cell(0, 10, title, ln=True, align="C")
+    pdf.ln(5)
+
+    # Add generation date
+    pdf.set_font("Arial", size=10)
+    pdf.set_text_color(128, 128, 128)
+    pdf.cell(0, 5, f"Generated on: {datetime.now().strftime('%B %d, %Y at %I:%M %p')}", ln=True, align="C")
+    pdf.ln(10)
+
+    current_font = None
+    current_color = None
+
+    for kind, text in blocks:
+        font_style, size, color, height, align, after = styles[kind]
+
+        if kind == SPACE:
+            pdf.ln(height)
+            continue
+
+        if kind == SEPARATOR:
+            y = pdf.get_y() + height / 2
+            pdf.set_draw_color(*color)
+            pdf.line(pdf.l_margin, y, pdf.w - pdf.r_margin, y)
+            pdf.ln(height + after)
+            continue
+
+        if (font_style, size) != current_font:
+            pdf.set_font("Arial", style=font_style, size=size)
+            current_font = (font_style, size)
+        if color != current_color:
+            pdf.set_text_color(*color)
+            current_color = color
+
+        text = clean_text_for_pdf(text.replace('**', ''))
+        if kind == KEY_TERMS:
+            text = "Key Terms: " + text
+
+        if kind in (TITLE, SECTION, HEADING):
+            pdf.cell(0, height, text, ln=True, align=align)
+            pdf.ln(after)
+            continue
+
+        if kind == BULLET:
+            pdf.cell(5, height, chr(149), ln=False)
+
+        # Most lines fit on one row; a plain cell is much cheaper than multi_cell's line breaking
+        available = pdf.w - pdf.r_margin - pdf.x - 2 * pdf.c_margin
+        if _text_width(pdf, text) <= available:
+            pdf.cell(0, height, text, ln=True, align="L" if align == "J" else align)
+        else:
+            pdf.multi_cell(0, height, text, align=align)
+        pdf.ln(after)
+
+    # Add footer
+    pdf.ln(10)
+    pdf.set_font("Arial", style="I", size=9)
+    pdf.set_text_color(128, 128, 128)
+    pdf.multi_cell(0, 4, footer)
+
+    pdf.output(output_path)
+
+def _inline_html(text):
+    """Escape text and convert inline **bold** and *italic* markers."""
+    text = html.escape(text, quote=False)
+    text = BOLD.sub(r'<strong>\1</strong>', text)
+    return ITALIC.sub(r'<em>\1</em>', text)
+
+def render_html(blocks):
+    """Render parsed summary blocks to the HTML the results panel displays."""
+    parts = []
+    append = parts.append
+    previous_space = True
+
+    for kind, text in blocks:
+        if kind == SPACE:
+            if not previous_space:
+                append('<br>')
+            previous_space = True
+            continue
+        previous_space = False
+
+        if kind == TITLE:
+            append(f'<h1>{_inline_html(text)}</h1>')
+        elif kind == SECTION:
+            append(f'<div class="section-header">{_inline_html(text)}</div>')
+        elif kind == HEADING:
+            append(f'<div class="genai-section-header">{_inline_html(text)}</div>')
+        elif kind == BULLET:
+            append(f'<div class="bullet-point">{_inline_html(text)}</div>')
+        elif kind == NUMBERED:
+            number, _, rest = text.partition(' ')
+            append(f'<div class="numbered-point"><strong>{html.escape(number)} </strong>{_inline_html(rest)}</div>')
+        elif kind == KEY_TERMS:
+            append(f'<div class="key-terms"><strong>Key Terms:</strong> {_inline_html(text)}</div>')
+        elif kind == WARNING:
+            append(f'<div class="disclaimer"><strong>{_inline_html(text)}</strong></div>')
+        elif kind == SEPARATOR:
+            append('<hr class="separator">')
+        else:
+            append(f'<p>{_inline_html(text)}</p>')
+
+    return ''.join(parts)
+
+def _benchmark(bullet_count=5000):
+    """Time parsing and rendering a summary with many bullets."""
+    import tempfile
+
+    lines = ["=" * 60, "GENAI LEGAL ASSISTANT ANALYSIS", "=" * 60, ""]
+    for section in range(bullet_count // 50):
+        lines.append(f"**Section {section + 1}:**")
+        lines.extend(f"* Point {n}: The provider may change these terms at any time with notice." for n in range(50))
+        lines.append("")
+    summary = "\n".join(lines)
+
+    start = time.perf_counter()
+    blocks = parse_summary(summary)
+    parsed = time.perf_counter()
+    render_html(blocks)
+    rendered_html = time.perf_counter()
+    with tempfile.TemporaryDirectory() as directory:
+        render_pdf(blocks, os.path.join(directory, "bench.pdf"), "Benchmark", "Footer")
+    rendered_pdf = time.perf_counter()
+
+    print(f"{bullet_count} bullets, {len(blocks)} blocks")
+    print(f"  parse       {(parsed - start) * 1000:8.1f} ms")
+    print(f"  render_html {(rendered_html - parsed) * 1000:8.1f} ms")
+    print(f"  render_pdf  {(rendered_pdf - rendered_html) * 1000:8.1f} ms")
+
+if __name__ == '__main__':
+    # Usage: python summary_render.py [bullet_count]
+    _benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
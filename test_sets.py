@@ -0,0 +1,31 @@
+import os
+import json
+
+# Committed benchmark documents with reference summaries, so runs are comparable across changes
+DEFAULT_TEST_SET = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'contracts.jsonl')
+
+def load_test_set(path):
+    """Benchmark documents from a JSONL file ({"text", optional "reference"}) or a directory of .txt files.
+
+    In a directory, `name.reference.txt` next to `name.txt` is used as its reference summary.
+    """
+    documents = []
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if not name.endswith('.txt') or name.endswith('.reference.txt'):
+                continue
+            with open(os.path.join(path, name), 'r', encoding='utf-8') as file:
+                document = {"id": name, "text": file.read()}
+            reference_path = os.path.join(path, name[:-4] + '.reference.txt')
+            if os.path.exists(reference_path):
+                with open(reference_path, 'r', encoding='utf-8') as file:
+                    document["reference"] = file.read()
+            documents.append(document)
+    else:
+        with open(path, 'r', encoding='utf-8') as file:
+            for number, line in enumerate(file):
+                if line.strip():
+                    document = json.loads(line)
+                    document.setdefault("id", str(number))
+                    documents.append(document)
+    return documents
@@ -0,0 +1,85 @@
+import asyncio
+import threading
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+CLASSES = {
+    "ask": {"priority": 0, "queue": 2, "lite": False, "seconds": 1.0},
+    "analyze": {"priority": 1, "queue": 1, "lite": True, "seconds": 10.0},
+}
+
+def controller(**kwargs):
+    return AdmissionController(**dict({"max_concurrent": 1, "classes": CLASSES, "lite_wait": 100.0,
+                                       "lite_max_concurrent": 1}, **kwargs))
+
+def enter_in_thread(admission, kind, order):
+    def run():
+        with admission.enter(kind):
+            order.append(kind)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+def wait_for_queue(admission, kind, length):
+    while admission.stats()[kind]["queued"] < length:
+        threading.Event().wait(0.001)
+
+def test_queued_questions_run_before_queued_analyses():
+    admission = controller()
+    running = admission.enter("analyze")
+    order = []
+    analysis = enter_in_thread(admission, "analyze", order)
+    wait_for_queue(admission, "analyze", 1)
+    question = enter_in_thread(admission, "ask", order)
+    wait_for_queue(admission, "ask", 1)
+    running.release()
+    analysis.join()
+    question.join()
+    assert order == ["ask", "analyze"]
+    assert admission.stats()["analyze"]["running"] == 0
+
+def test_full_queue_rejects_with_a_retry_delay():
+    admission = controller()
+    running = admission.enter("analyze")
+    queued = enter_in_thread(admission, "analyze", [])
+    wait_for_queue(admission, "analyze", 1)
+    with pytest.raises(AdmissionRejected) as rejected:
+        admission.enter("analyze")
+    assert rejected.value.retry_after >= 1
+    running.release()
+    queued.join()
+    assert admission.stats()["analyze"]["rejected"] == 1
+
+def test_lite_mode_has_its_own_bounded_slots():
+    admission = controller(lite_wait=0.0)
+    running = admission.enter("analyze")
+    lite = admission.enter("analyze")
+    assert lite.degraded and admission.stats()["lite_running"] == 1
+    # The Lite slot is taken, so the next analysis queues for a full one
+    order = []
+    queued = enter_in_thread(admission, "analyze", order)
+    wait_for_queue(admission, "analyze", 1)
+    lite.release()
+    assert admission.stats()["lite_running"] == 0
+    running.release()
+    queued.join()
+    assert order == ["analyze"]
+    with admission.enter("analyze") as ticket:
+        assert not ticket.degraded
+
+def test_cancelled_async_waiter_leaves_the_queue():
+    admission = controller()
+
+    async def run():
+        running = await admission.enter_async("ask")
+        waiting = asyncio.ensure_future(admission.enter_async("ask"))
+        await asyncio.sleep(0.01)
+        assert admission.stats()["ask"]["queued"] == 1
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        running.release()
+
+    asyncio.run(run())
+    assert admission.stats()["ask"]["queued"] == 0 and admission.stats()["ask"]["running"] == 0
@@ -0,0 +1,83 @@
+import pytest
+
+import app as flask_app
+
+RISKY = """1. Term
+This agreement renews automatically for successive one-year terms.
+
+2. Liability
+In no event shall the Supplier's liability exceed the fees paid.
+"""
+DEADLINES = """1. Notices
+The agreement is effective from 03/04/2025 and ends on 2026-01-01.
+"""
+PLAIN = """1. Services
+The Supplier provides hosting services to the Customer.
+"""
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(flask_app, "save_summary_as_pdf", lambda *args, **kwargs: None)
+    return flask_app.app.test_client()
+
+def test_responses_describe_their_own_document_when_another_replaces_it(client, monkeypatch):
+    analyze_with_reuse = flask_app.analyze_with_reuse
+
+    def analyze_then_replaced(text, *args, **kwargs):
+        result = analyze_with_reuse(text, *args, **kwargs)
+        flask_app.set_current_document(PLAIN, "other.txt")  # a concurrent upload lands meanwhile
+        return result
+
+    monkeypatch.setattr(flask_app, "analyze_with_reuse", analyze_then_replaced)
+    body = client.post("/analyze-text", json={"text": RISKY}).get_json()
+    assert body["risk_flags"] == flask_app.build_clause_index(RISKY).risk_flags()
+    assert any(body["risk_flags"].values())
+    assert flask_app.current_document()[1] == "other.txt"
+
+def test_obligations_are_kept_by_document_key():
+    key, _, clause_index = flask_app.set_current_document(DEADLINES, "deadlines.txt")
+    terms = flask_app.document_obligations(key, clause_index)
+    assert flask_app.document_obligations(key, clause_index) is terms
+    other = flask_app.set_current_document(PLAIN, "other.txt")
+    stale = flask_app.document_obligations(key, clause_index)
+    assert stale is not terms and stale.document_key == key and stale.items
+    assert flask_app.document_obligations(other[0], other[2]).items == []
+
+def test_verification_finishing_after_a_new_upload_is_dropped(monkeypatch):
+    key, _, clause_index = flask_app.set_current_document(DEADLINES, "deadlines.txt")
+    terms = flask_app.document_obligations(key, clause_index)
+
+    def verify_while_replaced(items):
+        flask_app.set_current_document(PLAIN, "other.txt")
+        return {item["id"]: False for item in items}
+
+    monkeypatch.setattr(flask_app, "verify_extractions", verify_while_replaced)
+    flask_app.verify_obligations(terms)
+    assert terms.verification == "unverified" and all(item.verified is None for item in terms.items)
+
+def test_near_duplicates_are_reused_across_owners_without_naming_them():
+    clauses = [f"{n}. The provider shall keep service {n} of the boilerplate terms available to every user."
+               for n in range(1, 21)]
+    original = "\n\n".join(clauses)
+    edited = "\n\n".join(clauses[:-1] + ["20. The provider may end service twenty after sixty days' notice."])
+    flask_app.analyze_document(original, name="alice-terms.txt", owner="alice")
+
+    shared = flask_app.analyze_document(edited, name="bob-terms.txt", owner="bob")["near_duplicate"]
+    assert shared["shared"] and shared["changed_paragraphs"] == 1 and shared["unchanged_paragraphs"] == 19
+    assert "document_name" not in shared and "differences" not in shared
+    own = flask_app.analyze_document(edited.replace("sixty", "ninety"), name="again.txt", owner="bob")
+    assert own["near_duplicate"]["document_name"] == "bob-terms.txt"
+
+def test_history_limits_are_parsed_and_clamped(client, monkeypatch):
+    limits = []
+    monkeypatch.setattr(flask_app, "persist", lambda method, *args, **kwargs: limits.append(kwargs["limit"]) or [])
+    for limit in ("abc", "0", "5", "100000"):
+        assert client.get(f"/ask/history?limit={limit}").status_code == 200
+    assert limits == [50, 1, 5, 200]
+
+def test_clause_search_limits_are_parsed_and_clamped(client):
+    flask_app.set_current_document("\n\n".join(f"{n}. The Supplier shall deliver part {n}." for n in range(1, 61)),
+                                   "parts.txt")
+    counts = [len(client.get(f"/clauses/search?q=deliver&limit={limit}").get_json()["clauses"])
+              for limit in ("abc", "0", "3", "1000")]
+    assert counts == [10, 1, 3, 50]
@@ -0,0 +1,53 @@
+import pytest
+from starlette.testclient import TestClient
+
+import asgi
+from clause_index import build_clause_index
+
+@pytest.fixture
+def client():
+    return TestClient(asgi.application)
+
+def chunks(count, size=1024 * 1024, prefix=b""):
+    yield prefix
+    for _ in range(count):
+        yield b"x" * size
+
+def test_bodies_over_the_limit_are_rejected_with_or_without_content_length(client):
+    declared = client.post('/analyze-text', content=b"x" * (9 * 1024 * 1024),
+                           headers={"content-type": "application/json"})
+    assert declared.status_code == 413
+    # A generator body is sent chunked, with no Content-Length to check up front
+    streamed = client.post('/analyze-text', content=chunks(9), headers={"content-type": "application/json"})
+    assert streamed.status_code == 413 and streamed.json() == {"error": "Request too large"}
+    part = b'--b\r\nContent-Disposition: form-data; name="file"; filename="a.txt"\r\n\r\n'
+    upload = client.post('/upload', content=chunks(9, prefix=part),
+                         headers={"content-type": "multipart/form-data; boundary=b"})
+    assert upload.status_code == 413 and upload.json() == {"error": "File too large"}
+
+@pytest.mark.parametrize("path", ['/analyze-text', '/ask'])
+@pytest.mark.parametrize("body", [b"not json", b"[1, 2]"])
+def test_invalid_json_bodies_are_bad_requests(client, path, body, monkeypatch):
+    monkeypatch.setattr(asgi.flask_app, "current_clause_index", build_clause_index("A contract."))
+    response = client.post(path, content=body, headers={"content-type": "application/json"})
+    assert response.status_code == 400
+
+def test_flask_responses_are_compressed_once(client):
+    plain = asgi.app.test_client().get("/static/js/scripts.js").data
+    response = client.get("/static/js/scripts.js", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == plain  # decoded by the client, so a second gzip layer would show here
+
+def test_analyses_describe_their_own_document_when_another_replaces_it(client, monkeypatch):
+    risky = "1. Term\nThis agreement renews automatically for successive one-year terms.\n"
+    analyze = asgi.analyze_with_reuse_async
+
+    async def analyze_then_replaced(text, *args, **kwargs):
+        result = await analyze(text, *args, **kwargs)
+        asgi.flask_app.set_current_document("1. Services\nHosting for the Customer.\n", "other.txt")
+        return result
+
+    monkeypatch.setattr(asgi, "analyze_with_reuse_async", analyze_then_replaced)
+    monkeypatch.setattr(asgi.flask_app, "save_summary_as_pdf", lambda *args, **kwargs: None)
+    body = client.post('/analyze-text', json={"text": risky}).json()
+    assert body["risk_flags"] == build_clause_index(risky).risk_flags() and any(body["risk_flags"].values())
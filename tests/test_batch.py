@@ -0,0 +1,66 @@
+import json
+import time
+import zipfile
+
+import pytest
+
+import batch
+from batch import extract_source, run_batch
+from storage import DocumentStore
+
+def write_zip(path, members, compression=zipfile.ZIP_DEFLATED):
+    with zipfile.ZipFile(path, "w", compression=compression) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return str(path)
+
+def test_highly_compressed_member_is_rejected_before_reading(tmp_path):
+    archive = write_zip(tmp_path / "bomb.zip", {"bomb.txt": b"0" * (2 * 1024 * 1024)})
+    with pytest.raises(ValueError, match="compressed more than"):
+        extract_source(("zip", archive, "bomb.txt"))
+
+def test_oversized_member_is_rejected(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, "MAX_DOCUMENT_BYTES", 1000)
+    archive = write_zip(tmp_path / "big.zip", {"big.txt": b"x" * 1001}, compression=zipfile.ZIP_STORED)
+    with pytest.raises(ValueError, match="larger than 1000 bytes"):
+        extract_source(("zip", archive, "big.txt"))
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "docs" / "big.txt").write_bytes(b"x" * 1001)
+    with pytest.raises(ValueError, match="larger than 1000 bytes"):
+        extract_source(("dir", str(tmp_path / "docs"), "big.txt"))
+
+def test_batch_skips_duplicates_and_resumes(tmp_path):
+    archive = write_zip(tmp_path / "docs.zip", {"a.txt": "Contract A", "b.txt": "Contract B", "copy.txt": "Contract A",
+                                                "notes.md": "ignored"})
+    output = str(tmp_path / "results.jsonl")
+    analysed = []
+
+    def analyze(text):
+        analysed.append(text)
+        return {"summary": text.lower()}
+
+    stats = run_batch(archive, output, analyze, extract_workers=1, concurrency=1, documents_per_minute=0)
+    assert stats == {"total": 3, "skipped": 0, "analyzed": 2, "duplicates": 1, "errors": 0}
+    assert sorted(analysed) == ["Contract A", "Contract B"]
+
+    stats = run_batch(archive, output, analyze, extract_workers=1, concurrency=1, documents_per_minute=0)
+    assert stats["skipped"] == 3 and stats["analyzed"] == 0
+    with open(output, encoding="utf-8") as file:
+        assert len([json.loads(line) for line in file]) == 3
+
+def test_batch_jobs_persist_and_are_claimed_once(tmp_path):
+    store = DocumentStore(f"sqlite:///{tmp_path / 'store.db'}")
+    job = {"status": "running", "progress": {"total": 4, "analyzed": 1}, "started": time.time()}
+    store.save_batch_job("job1", job)
+    assert store.running_batch_jobs() == ["job1"]
+    assert store.load_batch_job("job1")["progress"] == {"total": 4, "analyzed": 1}
+
+    # Recently updated jobs belong to a live process; stale ones are taken over by exactly one caller
+    assert not store.claim_batch_job("job1", time.time() - 300)
+    assert store.claim_batch_job("job1", time.time() + 1)
+    assert not store.claim_batch_job("job1", time.time() - 300)
+
+    store.save_batch_job("job1", dict(job, status="completed", finished=time.time()))
+    assert store.running_batch_jobs() == []
+    assert store.load_batch_job("job1")["status"] == "completed"
+    assert store.load_batch_job("missing") is None
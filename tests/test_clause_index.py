@@ -0,0 +1,67 @@
+from clause_index import build_clause_index, format_risk_findings
+
+CONTRACT = """SERVICES AGREEMENT
+
+1. Definitions
+In this agreement "Services" means the hosting services.
+
+2. Term and Termination
+2.1 This agreement renews automatically for successive one-year terms.
+2.2 Either party may terminate this agreement at any time for any reason.
+
+3. Limitation of Liability
+In no event shall the Supplier's liability exceed the fees paid.
+"""
+
+# PDF extraction hard-wraps lines, so numbers often start a line in the middle of a sentence
+WRAPPED_PDF = """4. Notice
+The Customer may end this agreement by giving the Supplier
+30 days' prior written notice, after which the Supplier will refund
+12 months of prepaid fees less any amounts owed.
+5. Governing Law
+This agreement is governed by the laws of England.
+"""
+
+def headings(index):
+    return [(clause.number, clause.heading) for clause in index.clauses]
+
+def test_numbered_and_capitalised_headings_start_clauses():
+    index = build_clause_index(CONTRACT)
+    assert headings(index) == [
+        ("", "SERVICES AGREEMENT"),
+        ("1", "1. Definitions"),
+        ("2", "2. Term and Termination"),
+        ("2.1", "2.1 This agreement renews automatically for successive one-year terms."),
+        ("2.2", "2.2 Either party may terminate this agreement at any time for any reason."),
+        ("3", "3. Limitation of Liability"),
+    ]
+    assert [child["heading"] for child in index.tree[0]["children"][1]["children"]] == [
+        "2.1 This agreement renews automatically for successive one-year terms.",
+        "2.2 Either party may terminate this agreement at any time for any reason.",
+    ]
+
+def test_wrapped_lines_starting_with_numbers_do_not_split_clauses():
+    index = build_clause_index(WRAPPED_PDF)
+    assert headings(index) == [("4", "4. Notice"), ("5", "5. Governing Law")]
+    assert "30 days' prior written notice" in index.clause_text(0)
+    assert "12 months of prepaid fees" in index.clause_text(0)
+
+def test_long_sentence_after_a_number_is_not_a_heading():
+    index = build_clause_index("1. Payment\nThe fee is due on\n2. the first day of each month and is payable in advance by bank transfer.\n")
+    assert headings(index) == [("1", "1. Payment")]
+
+def test_search_and_risks_map_to_clauses():
+    index = build_clause_index(CONTRACT)
+    assert index.search("terminate agreement") == [4]
+    assert index.search("the") == []
+    assert index.risk_flags() == {"auto_renewal": 1, "termination": 1, "liability_cap": 1}
+    findings = format_risk_findings(index).splitlines()
+    assert findings[0].startswith("1. [HIGH] Automatic renewal (Clause 2.1): 2.1 This agreement renews")
+    assert len(findings) == 3
+
+def test_rank_orders_clauses_by_shared_terms():
+    index = build_clause_index(CONTRACT)
+    ranked = index.rank("When can the supplier's liability be limited, and what fees apply?")
+    assert ranked[0] == 5
+    assert index.rank("Can I terminate?") == [4, 2]  # exact "terminate" in 2.2, prefix "termination" in 2
+    assert index.rank("the and for") == []
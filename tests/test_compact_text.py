@@ -0,0 +1,55 @@
+import compact_text
+from compact_text import CompressedChunks, ChunkMap
+from clause_index import build_clause_index
+from incremental import content_hash
+from summariser_genai import DocumentContext
+
+CHUNKS = [f"Paragraph {n}: the supplier delivers order {n} within {n} days." for n in range(40)]
+
+def compressed(chunks=CHUNKS, block_chars=200):
+    return CompressedChunks(chunks, [content_hash(chunk) for chunk in chunks], block_chars=block_chars)
+
+def count_decompressions(monkeypatch):
+    calls = []
+    text = compact_text.ChunkBlock.text
+    monkeypatch.setattr(compact_text.ChunkBlock, "text", lambda block: calls.append(block) or text(block))
+    return calls
+
+def test_chunks_round_trip_across_blocks():
+    chunks = compressed()
+    assert len(chunks.blocks) > 1
+    assert list(chunks) == CHUNKS and len(chunks) == len(CHUNKS)
+    assert chunks[17] == CHUNKS[17] and chunks[-1] == CHUNKS[-1] and chunks[3:5] == CHUNKS[3:5]
+    assert chunks.keys() == [content_hash(chunk) for chunk in CHUNKS]
+    assert chunks.index_of(content_hash(CHUNKS[25])) == 25 and chunks.index_of(content_hash("missing")) == -1
+    assert chunks.text().split("\n\n") == CHUNKS
+    assert chunks.nbytes < chunks.raw_nbytes
+
+def test_reading_one_chunk_decompresses_only_its_block(monkeypatch):
+    chunks = compressed()
+    calls = count_decompressions(monkeypatch)
+    assert chunks[30] == CHUNKS[30]
+    assert len(calls) == 1
+
+def test_chunk_map_looks_up_by_content_hash():
+    mapping = ChunkMap(compressed())
+    key = content_hash(CHUNKS[8])
+    assert key in mapping and mapping[key] == CHUNKS[8]
+    assert len(mapping) == len(CHUNKS) and list(mapping)[0] == content_hash(CHUNKS[0])
+
+def test_clause_index_keeps_its_text_compressed(monkeypatch):
+    filler = " Deliveries are made to the address in the order form during business hours." * 8
+    text = "\n".join(f"{n}. Heading {n}\nThe supplier delivers order {n} within {n} days.{filler}"
+                     for n in range(1, 41)).replace("12 days.", "12 days. Refunds are paid by cheque.")
+    index = build_clause_index(text)
+    assert "text" not in vars(index)
+    assert index.text == text and index.chars == len(text)
+    assert index.prefix(30) == text[:30]
+
+    calls = count_decompressions(monkeypatch)
+    assert index.clause_text(11).startswith("12. Heading 12\nThe supplier delivers order 12 within 12 days.")
+    assert len(calls) == 1
+    # A question about one clause sends that clause, decompressing a single block
+    calls.clear()
+    excerpt = DocumentContext(None, index).excerpt("How are refunds paid?", max_tokens=250)
+    assert excerpt.startswith("12. Heading 12") and len(calls) == 1
@@ -0,0 +1,71 @@
+import pytest
+
+import app as flask_app
+import summariser_genai
+from clause_index import build_clause_index
+from document_compare import align_clauses, compare_documents
+
+ORIGINAL = """1. Payment
+The Customer pays the fees within thirty days of each invoice.
+
+2. Confidentiality
+Each party keeps the other party's information confidential.
+
+3. Termination
+Either party may terminate this agreement with sixty days notice.
+
+4. Governing Law
+This agreement is governed by the laws of England.
+"""
+REVISED = """1. Confidentiality
+Each party keeps the other party's information confidential.
+
+2. Fees and Payment
+The Customer pays the fees within forty five days of each invoice.
+
+3. Termination
+Either party may terminate this agreement with ninety days notice.
+
+4. Audit
+The Supplier may audit the Customer's use of the services once a year.
+"""
+
+def test_clauses_align_by_text_then_title_then_shared_terms():
+    old_index, new_index = build_clause_index(ORIGINAL), build_clause_index(REVISED)
+    # Confidentiality is identical but renumbered, Termination keeps its title, Payment is reworded
+    # under a new title, Governing Law is replaced by Audit
+    assert align_clauses(old_index, new_index) == [(1, 0), (0, 1), (2, 2), (3, None), (None, 3)]
+    # Without the term match the reworded clause counts as removed, placed first as nothing preceded it
+    assert align_clauses(old_index, new_index, threshold=1.0) == [
+        (0, None), (1, 0), (None, 1), (2, 2), (3, None), (None, 3)]
+
+def test_comparison_lists_only_changed_clauses():
+    comparison = compare_documents(ORIGINAL, REVISED)
+    assert comparison["counts"] == {"unchanged": 1, "modified": 2, "added": 1, "removed": 1}
+    assert [(c["status"], c["label"]) for c in comparison["changes"]] == [
+        ("modified", "2. Fees and Payment"), ("modified", "3. Termination"),
+        ("removed", "4. Governing Law"), ("added", "4. Audit")]
+    termination = comparison["changes"][1]
+    assert termination["word_changes"] == [{"old": "sixty", "new": "ninety"}]
+    assert comparison["tokens_changed"] < comparison["tokens_total"]
+
+@pytest.fixture
+def prompts(monkeypatch):
+    prompts = []
+    monkeypatch.setattr(summariser_genai.backend, "generate",
+                        lambda prompt, config=None: prompts.append(prompt) or "**WHAT CHANGED**\n* Fees are due later")
+    return prompts
+
+def test_only_changed_clauses_are_sent_to_the_model(prompts):
+    response = flask_app.app.test_client().post("/compare", json={"original_text": ORIGINAL,
+                                                                  "revised_text": REVISED})
+    assert response.status_code == 200 and response.get_json()["counts"]["unchanged"] == 1
+    [prompt] = prompts
+    assert "ninety days notice" in prompt and "laws of England" in prompt
+    assert "information confidential" not in prompt
+
+def test_identical_documents_need_no_model_call(prompts):
+    response = flask_app.app.test_client().post("/compare", json={"original_text": ORIGINAL,
+                                                                  "revised_text": ORIGINAL})
+    assert "No clause-level changes found" in response.get_json()["explanation"]
+    assert prompts == []
@@ -0,0 +1,27 @@
+from clause_index import build_clause_index
+from summariser_genai import DocumentContext
+
+FILLER = "The parties agree to cooperate in good faith on all matters under this agreement. " * 12
+
+def contract():
+    clauses = [f"{number}. {title}\n{FILLER}" for number, title in enumerate(
+        ["Definitions", "Services", "Payment", "Confidentiality", "Warranties"], 1)]
+    clauses.insert(3, "4. Cancellation\nThe customer may cancel the subscription on 30 days' written notice.")
+    return "\n".join(clauses)
+
+def test_short_documents_are_sent_whole():
+    text = "1. Term\nThis agreement lasts one year."
+    assert DocumentContext("key", build_clause_index(text)).excerpt("How long?") == text
+
+def test_long_documents_send_only_relevant_clauses():
+    text = contract()
+    context = DocumentContext("key", build_clause_index(text))
+    excerpt = context.excerpt("How do I cancel the subscription?", max_tokens=300)
+    assert "30 days' written notice" in excerpt
+    assert len(excerpt) <= 300 * 4 + 100
+    assert excerpt.endswith("[Only the clauses most relevant to the question are shown]")
+
+def test_questions_matching_nothing_get_the_start_of_the_document():
+    context = DocumentContext("key", build_clause_index(contract()))
+    excerpt = context.excerpt("zebra xylophone", max_tokens=100)
+    assert excerpt.startswith("1. Definitions") and excerpt.endswith("[Document truncated...]")
@@ -0,0 +1,62 @@
+import zlib
+
+import numpy as np
+import pytest
+
+from embeddings import EmbeddingService, find_duplicate
+
+class BagOfWordsModel:
+    """Stands in for the sentence-transformer: normalised word-count vectors, counting what it encodes."""
+
+    def __init__(self, dimensions=64):
+        self.dimensions = dimensions
+        self.batches = []
+
+    def encode(self, texts, normalize_embeddings=True, convert_to_numpy=True):
+        self.batches.append(list(texts))
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, zlib.crc32(word.strip(".,").encode()) % self.dimensions] += 1
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+
+@pytest.fixture
+def service(tmp_path):
+    service = EmbeddingService(cache_dir=str(tmp_path))
+    service._model = BagOfWordsModel()
+    return service
+
+DOCUMENT = "\n\n".join([
+    "The tenant pays rent on the first day of each month.",
+    "Either party may terminate the lease with sixty days notice.",
+    "The landlord repairs the roof and the heating system.",
+])
+
+def test_each_distinct_text_is_encoded_once(service):
+    vectors = service.encode(["alpha beta", "gamma", "alpha beta"])
+    assert vectors.shape == (3, 64) and vectors.dtype == np.float16
+    assert np.array_equal(vectors[0], vectors[2])
+    service.encode(["gamma", "delta"])
+    assert service._model.batches == [["alpha beta", "gamma"], ["delta"]]
+    assert service.stats()["encoded"] == 3 and service.stats()["reused"] == 2
+
+def test_search_returns_the_closest_chunks(service, tmp_path):
+    score, chunk = service.search(DOCUMENT, "how do I terminate the lease", top_k=1)[0]
+    assert chunk == "Either party may terminate the lease with sixty days notice." and score > 0
+    # Chunk vectors are saved and memory-mapped, so a new process reads them back without encoding
+    assert len(list(tmp_path.glob("*.npy"))) == 1
+    restarted = EmbeddingService(cache_dir=str(tmp_path))
+    restarted._model = BagOfWordsModel()
+    assert restarted.search(DOCUMENT, "terminate the lease", top_k=1)[0][1] == chunk
+    assert restarted._model.batches == [["terminate the lease"]]
+
+def test_find_duplicate_needs_the_threshold(service):
+    vectors = service.encode(["rent is due monthly", "the roof is repaired"])
+    assert find_duplicate(service.encode(["Rent is due monthly."])[0], vectors, 0.97) == 0
+    assert find_duplicate(service.encode(["heating and plumbing"])[0], vectors, 0.97) is None
+    assert find_duplicate(vectors[0], vectors[:0], 0.97) is None
+
+def test_keywords_rank_phrases_by_similarity_to_the_text(service):
+    pytest.importorskip("sklearn")
+    keywords = service.keywords("Rent is due monthly. Late rent incurs a fee.", top_n=2, ngram_range=(1, 1))
+    assert "rent" in keywords
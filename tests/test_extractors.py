@@ -0,0 +1,42 @@
+import io
+import zipfile
+
+from extractors import extract_text_from_docx, iter_docx_blocks
+
+W = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+
+def paragraph(text):
+    return f"<w:p><w:r><w:t>{text}</w:t></w:r></w:p>"
+
+def table(*rows):
+    cells = "".join("<w:tr>" + "".join(f"<w:tc>{paragraph(cell)}</w:tc>" for cell in row) + "</w:tr>"
+                    for row in rows)
+    return f"<w:tbl>{cells}</w:tbl>"
+
+def docx(body, headers=(), footers=()):
+    """A minimal DOCX archive holding just the parts the streaming reader looks at."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("word/document.xml", f"<w:document {W}><w:body>{body}</w:body></w:document>")
+        for number, text in headers:
+            archive.writestr(f"word/header{number}.xml", f"<w:hdr {W}>{paragraph(text)}</w:hdr>")
+        for number, text in footers:
+            archive.writestr(f"word/footer{number}.xml", f"<w:ftr {W}>{paragraph(text)}</w:ftr>")
+    return buffer.getvalue()
+
+def test_tables_are_read_in_document_order():
+    source = docx(paragraph("1. Fees") + table(("Item", "Price"), ("Hosting", "100")) + paragraph("2. Term"))
+    assert list(iter_docx_blocks(source)) == ["1. Fees", "Item | Price", "Hosting | 100", "2. Term"]
+
+def test_headers_and_footers_are_labelled_around_the_body():
+    source = docx(paragraph("1. Services") + paragraph("2. Fees"),
+                  headers=[(10, "Draft"), (2, "Acme Ltd"), (1, "Acme Ltd")],
+                  footers=[(1, "Page numbers"), (2, "Confidential")])
+    assert list(iter_docx_blocks(source)) == [
+        "Header: Acme Ltd", "Header: Draft", "1. Services", "2. Fees",
+        "Footer: Page numbers", "Footer: Confidential",
+    ]
+
+def test_max_chars_stops_before_the_footers():
+    source = docx(paragraph("1. Services") + paragraph("2. Fees"), footers=[(1, "Confidential")])
+    assert extract_text_from_docx(source, max_chars=15) == "1. Services\n2. "
@@ -0,0 +1,59 @@
+import app as flask_app
+import hierarchy
+from clause_index import build_clause_index
+from hierarchy import SectionSummaryCache, brief_key, outline, split_parts
+
+TEXT = "\n\n".join(f"{n}. Clause {n}\nThe Supplier shall deliver item {n} to the Customer on time. " + "x" * 200
+                   for n in range(1, 41))
+
+def test_parts_end_at_clause_headings_and_cover_the_text():
+    clause_index = build_clause_index(TEXT)
+    parts = split_parts(TEXT, clause_index, part_chars=1000, max_parts=16)
+    assert [part.title for part in parts[:2]] == ["1. Clause 1 ... 4. Clause 4", "5. Clause 5 ... 8. Clause 8"]
+    assert parts[0].start == 0 and parts[-1].end == len(TEXT)
+    assert all(previous.end == part.start for previous, part in zip(parts, parts[1:]))
+    assert all(TEXT[part.start:].startswith(f"{4 * (part.number - 1) + 1}. Clause") for part in parts)
+    assert all(part.end - part.start >= 1000 for part in parts[:-1])
+    # The split depends only on the text, so parts are found again by key
+    assert [part.key for part in split_parts(TEXT, clause_index, part_chars=1000, max_parts=16)] == \
+        [part.key for part in parts]
+
+def test_parts_grow_to_stay_within_max_parts():
+    parts = split_parts(TEXT, part_chars=1000, max_parts=4)
+    assert len(parts) == 4 and [part.title for part in parts] == ["Part 1", "Part 2", "Part 3", "Part 4"]
+    assert all(TEXT[part.start - 2:part.start] == "\n\n" for part in parts[1:])
+
+def test_unbroken_text_is_split_at_spaces():
+    text = " ".join(["word"] * 1000)
+    parts = split_parts(text, part_chars=1000, max_parts=16)
+    assert len(parts) > 1 and all(text[part.start - 1] == " " for part in parts[1:])
+
+def test_cache_is_an_lru_that_skips_error_messages():
+    cache = SectionSummaryCache(max_entries=2)
+    cache.put("a", "summary a")
+    cache.put("b", "summary b")
+    cache.put("failed", "Error generating summary: quota")
+    assert cache.get("a") == "summary a"
+    cache.put("c", "summary c")
+    assert cache.peek("b") is None and cache.peek("a") == "summary a"
+    assert cache.get("failed") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 2}
+
+def test_outline_shows_cached_brief_summaries(monkeypatch):
+    monkeypatch.setattr(hierarchy, "section_summary_cache", SectionSummaryCache())
+    parts = split_parts(TEXT)
+    hierarchy.section_summary_cache.put(brief_key(parts[0]), "Delivery terms")
+    sections = outline(TEXT)
+    assert sections[0]["summary"] == "Delivery terms" and sections[0]["chars"] == parts[0].end - parts[0].start
+    assert all(section["summary"] is None for section in sections[1:])
+
+def test_section_endpoint_summarises_the_requested_part(monkeypatch):
+    calls = []
+    monkeypatch.setattr(flask_app, "summarize_part",
+                        lambda text, part, **lengths: calls.append(part.key) or ("Part summary", False))
+    client = flask_app.app.test_client()
+    flask_app.set_current_document(TEXT, "long.txt")
+    parts = split_parts(TEXT, build_clause_index(TEXT))
+    body = client.get("/sections/1").get_json()
+    assert body["title"] == parts[0].title and body["summary"] == "Part summary" and calls == [parts[0].key]
+    assert client.get(f"/sections/{len(parts) + 1}").status_code == 404
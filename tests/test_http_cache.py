@@ -0,0 +1,48 @@
+import gzip
+import os
+
+import pytest
+
+import app as flask_app
+from http_cache import fingerprinted_name, resolve_fingerprint, content_etag
+
+STATIC = flask_app.app.static_folder
+
+@pytest.fixture
+def client():
+    return flask_app.app.test_client()
+
+def test_fingerprinted_names_resolve_to_the_file_while_its_content_is_unchanged():
+    name = fingerprinted_name(STATIC, "css/styles.css")
+    assert name.startswith("css/styles.") and name.endswith(".css") and name != "css/styles.css"
+    assert resolve_fingerprint(STATIC, name) == ("css/styles.css", True)
+    assert resolve_fingerprint(STATIC, "css/styles.000000000000.css") == ("css/styles.css", False)
+    assert resolve_fingerprint(STATIC, "css/styles.css") == ("css/styles.css", False)
+    assert fingerprinted_name(STATIC, "missing.css") == "missing.css"
+
+def test_fingerprinted_static_files_are_cached_for_good(client):
+    with flask_app.app.test_request_context():
+        url = flask_app.static_url("css/styles.css")
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.cache_control.immutable and response.cache_control.max_age == flask_app.STATIC_MAX_AGE
+    with open(os.path.join(STATIC, "css", "styles.css"), "rb") as file:
+        assert response.data == file.read()
+    assert client.get("/static/css/styles.css").cache_control.no_cache
+
+def test_json_responses_get_content_etags_and_304s(client):
+    response = client.get("/health")
+    etag, weak = response.get_etag()
+    assert etag == content_etag(response.data) and weak
+    assert client.get("/health", headers={"If-None-Match": f'W/"{etag}"'}).status_code == 304
+    assert client.get("/health", headers={"If-None-Match": 'W/"other"'}).status_code == 200
+
+def test_large_text_bodies_are_compressed_for_clients_that_accept_it(client):
+    plain = client.get("/static/js/scripts.js")
+    assert "Content-Encoding" not in plain.headers and len(plain.data) >= flask_app.COMPRESS_MIN_BYTES
+    compressed = client.get("/static/js/scripts.js", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in compressed.headers["Vary"]
+    assert gzip.decompress(compressed.data) == plain.data
+    # One weak ETag covers the identity and compressed forms
+    assert compressed.get_etag() == (plain.get_etag()[0], True)
@@ -0,0 +1,113 @@
+from incremental import analyze_incrementally
+
+PARAGRAPHS = [f"Clause {n}. The customer shall pay the fee for service {n} within thirty days." for n in range(1, 7)]
+
+def whole_document_calls():
+    calls = []
+
+    def summarize_sections(sections, min_length=150, max_length=300, clause_index=None):
+        calls.append(("full", None))
+        return {"Summary": "summary"}
+
+    def revise_sections(previous, added, removed, min_length=150, max_length=300):
+        calls.append(("revised", (added, removed)))
+        return dict(previous, Revised="yes")
+
+    return calls, summarize_sections, revise_sections
+
+def split_whole(text):
+    return {"Document": text}
+
+def test_unchanged_text_reuses_previous_summaries():
+    calls, summarize, revise = whole_document_calls()
+    text = "\n\n".join(PARAGRAPHS)
+    _, state, _ = analyze_incrementally(None, text, split_whole, summarize, revise_sections=revise)
+    summaries, _, stats = analyze_incrementally(state, text + "\n", split_whole, summarize, revise_sections=revise)
+    assert stats["mode"] == "cached"
+    assert summaries == {"Summary": "summary"}
+    assert [mode for mode, _ in calls] == ["full"]
+
+def test_small_edit_revises_with_changed_chunks_only():
+    calls, summarize, revise = whole_document_calls()
+    _, state, _ = analyze_incrementally(None, "\n\n".join(PARAGRAPHS), split_whole, summarize, revise_sections=revise)
+    edited = PARAGRAPHS[:2] + ["Clause 3. The supplier may terminate on ninety days' notice."] + PARAGRAPHS[3:]
+    _, _, stats = analyze_incrementally(state, "\n\n".join(edited), split_whole, summarize, revise_sections=revise)
+    assert stats["mode"] == "revised"
+    assert stats["chunks_changed"] == 2
+    added, removed = calls[-1][1]
+    assert added == [edited[2]] and removed == [PARAGRAPHS[2]]
+
+def test_large_edit_or_new_lengths_run_full_analysis():
+    calls, summarize, revise = whole_document_calls()
+    _, state, _ = analyze_incrementally(None, "\n\n".join(PARAGRAPHS), split_whole, summarize, revise_sections=revise)
+    rewritten = "\n\n".join(p.replace("customer", "tenant") for p in PARAGRAPHS)
+    assert analyze_incrementally(state, rewritten, split_whole, summarize, revise_sections=revise)[2]["mode"] == "full"
+    text = "\n\n".join(PARAGRAPHS)
+    _, _, stats = analyze_incrementally(state, text, split_whole, summarize, revise_sections=revise, max_length=500)
+    assert stats["mode"] == "full"
+
+def test_failed_summaries_are_not_reused():
+    calls, _, revise = whole_document_calls()
+
+    def failing(sections, min_length=150, max_length=300, clause_index=None):
+        return {"Summary": "Error: quota exceeded"}
+
+    text = "\n\n".join(PARAGRAPHS)
+    _, state, _ = analyze_incrementally(None, text, split_whole, failing, revise_sections=revise)
+    assert analyze_incrementally(state, text, split_whole, failing, revise_sections=revise)[2]["mode"] == "full"
+
+def test_per_section_mode_resummarises_changed_sections_only():
+    summarised = []
+
+    def summarize_sections(sections, min_length=150, max_length=300):
+        summarised.extend(sections)
+        return {name: f"summary of {name}" for name in sections}
+
+    def split(text):
+        return dict(part.split(":", 1) for part in text.split("\n\n"))
+
+    _, state, _ = analyze_incrementally(None, "A: one\n\nB: two", split, summarize_sections)
+    summaries, _, stats = analyze_incrementally(state, "A: one\n\nB: changed", split, summarize_sections)
+    assert summarised == ["A", "B", "B"]
+    assert stats["mode"] == "sections" and stats["chunks_changed"] == 1
+    assert summaries == {"A": "summary of A", "B": "summary of B"}
+
+def test_per_section_summaries_are_redone_when_their_share_of_the_length_changes():
+    lengths = []
+
+    def summarize_sections(sections, min_length=150, max_length=300):
+        lengths.extend((name, max_length // len(sections)) for name in sections)  # each section's share
+        return {name: f"summary of {name}" for name in sections}
+
+    def split(text):
+        return dict(part.split(":", 1) for part in text.split("\n\n"))
+
+    _, state, _ = analyze_incrementally(None, "A: one\n\nB: two", split, summarize_sections, max_length=300)
+    _, _, stats = analyze_incrementally(state, "A: one\n\nB: two\n\nC: three", split, summarize_sections, max_length=300)
+    assert lengths == [("A", 150), ("B", 150), ("A", 100), ("B", 100), ("C", 100)]
+    assert stats["chunks_changed"] == 3
+
+def test_revisions_keep_the_requested_length(monkeypatch):
+    import summariser_genai
+
+    configs = []
+    monkeypatch.setattr(summariser_genai.backend, "generate", lambda prompt, config=None: configs.append(config) or prompt)
+    revised = summariser_genai.revise_sections({"Document Analysis": "old", "Risk Assessment": "risks"},
+                                               ["added"], [], min_length=40, max_length=80)
+    assert "40-80 words" in revised["Document Analysis"] and "words long" not in revised["Risk Assessment"]
+    assert configs == [{"max_output_tokens": summariser_genai.output_token_limit(80)}, None]
+
+def test_changed_sections_are_summarised_together():
+    calls = []
+
+    def summarize_sections(sections, min_length=150, max_length=300):
+        calls.append((list(sections), max_length))
+        return {name: f"summary of {name}" for name, content in sections.items() if content.strip()}
+
+    def split(text):
+        return dict(part.split(":", 1) for part in text.split("\n\n"))
+
+    _, state, _ = analyze_incrementally(None, "A: one\n\nB: two\n\nC: three", split, summarize_sections, max_length=300)
+    summaries, _, _ = analyze_incrementally(state, "A: one\n\nB: 2\n\nC: 3", split, summarize_sections, max_length=300)
+    assert calls == [(["A", "B", "C"], 300), (["B", "C"], 200)]
+    assert summaries == {"A": "summary of A", "B": "summary of B", "C": "summary of C"}
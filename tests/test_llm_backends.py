@@ -0,0 +1,46 @@
+import asyncio
+import time
+
+from llm_backends import FakeBackend
+
+def slow_backend(max_concurrency, seconds=0.05):
+    backend = FakeBackend(max_concurrency=max_concurrency)
+
+    async def generate(prompt, generation_config):
+        await asyncio.sleep(seconds)
+        return prompt
+
+    backend._generate_async = generate
+    return backend
+
+def test_async_calls_wait_for_slots_and_release_them_when_cancelled():
+    backend = slow_backend(max_concurrency=2)
+
+    async def run():
+        started = time.perf_counter()
+        assert await asyncio.gather(*[backend.generate_async(str(n)) for n in range(6)]) == [str(n) for n in range(6)]
+        elapsed = time.perf_counter() - started
+
+        waiting = asyncio.gather(*[backend.generate_async("cancelled") for _ in range(5)])
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        await asyncio.sleep(0.2)
+        return elapsed
+
+    assert asyncio.run(run()) >= 0.15  # three rounds of two
+    assert backend._slots.acquire(blocking=False) and backend._slots.acquire(blocking=False)
+    assert backend.stats()["in_flight"] == 0
+
+def test_messages_name_the_selected_backend():
+    import summariser_genai
+
+    try:
+        assert summariser_genai.use_backend("local") is None
+        assert summariser_genai.generate_summary("Text.") == summariser_genai.unavailable_message()
+        assert "LOCAL_LLM_MODEL_PATH" in summariser_genai.unavailable_message()
+        summariser_genai.use_backend("fake")
+        assert "the fake backend" in summariser_genai._empty_response("question")
+        assert "Gemini" not in summariser_genai._model_not_found()
+    finally:
+        summariser_genai.use_backend("fake")
@@ -0,0 +1,44 @@
+import io
+
+import memory_budget
+from memory_budget import MemoryTracker, MB
+from extractors import extract_text_from_txt
+
+def tracker_with_room(monkeypatch, chars, rss_mb=100.0):
+    """A tracker whose budget leaves room for exactly ``chars`` characters of text."""
+    monkeypatch.setattr(memory_budget, "current_rss_mb", lambda: rss_mb)
+    return MemoryTracker(budget_mb=rss_mb + chars * memory_budget.BYTES_PER_TEXT_CHAR / MB, max_chars=1000)
+
+def test_text_is_capped_and_degraded_past_the_budget(monkeypatch):
+    tracker = tracker_with_room(monkeypatch, 500)
+    assert tracker.check_text("x" * 400) == "x" * 400 and not tracker.degraded
+    assert tracker.check_text("x" * 1200) == "x" * 1000
+    assert tracker.truncated and tracker.degraded
+    assert tracker.report()["estimated_mb"] == round(tracker.estimated_mb(1000), 1)
+
+def test_extraction_degrades_as_soon_as_the_text_outgrows_the_budget(monkeypatch):
+    tracker = tracker_with_room(monkeypatch, 2000)
+    counts = []
+    progress = tracker.text_progress()
+
+    def on_text(chars):
+        counts.append((chars, progress(chars)))
+
+    monkeypatch.setattr("extractors.TXT_READ_CHARS", 1000)
+    text = extract_text_from_txt(io.BytesIO(b"y" * 5000), max_chars=3500, on_text=on_text)
+    assert len(text) == 3500
+    assert counts == [(1000, False), (2000, False), (3000, True), (3500, True)]
+    assert tracker.degraded
+
+def test_stages_do_not_reset_the_process_peak_unless_asked(monkeypatch):
+    resets = []
+    monkeypatch.setattr(memory_budget, "_reset_peak", lambda: resets.append(True) or True)
+    tracker = MemoryTracker()
+    with tracker.stage("extract"):
+        pass
+    assert resets == [] and tracker.stages[0]["peak_is_per_stage"] is False
+    assert tracker.report()["rss_scope"] == "process"
+    benchmark = MemoryTracker(per_stage_peak=True)
+    with benchmark.stage("load"):
+        pass
+    assert resets == [True] and benchmark.stages[0]["peak_is_per_stage"] is True
@@ -0,0 +1,50 @@
+from near_duplicates import (NearDuplicateIndex, minhash_signature, estimated_similarity, diff_documents, shingles,
+                             PERMUTATIONS, MASK_64)
+
+CLAUSES = [f"{n}. Acme Corp shall provide service number {n} to the customer within thirty days of each request."
+           for n in range(1, 21)]
+ORIGINAL = "\n\n".join(CLAUSES)
+EDITED = "\n\n".join(CLAUSES[:-1] + ["20. Acme Corp may suspend the service if invoices remain unpaid for sixty days."])
+UNRELATED = "\n\n".join(f"{n}. The tenant pays rent of {n} hundred pounds on the first day of every month."
+                        for n in range(1, 21))
+LENGTHS = (150, 300)
+
+def indexed(owner="alice"):
+    index = NearDuplicateIndex(threshold=0.8)
+    index.add("original", "lease.txt", minhash_signature(ORIGINAL), ORIGINAL, {"summary": "ok"}, LENGTHS, owner=owner)
+    return index
+
+def test_signatures_estimate_similarity():
+    assert estimated_similarity(minhash_signature(ORIGINAL), minhash_signature(ORIGINAL)) == 1.0
+    assert estimated_similarity(minhash_signature(ORIGINAL), minhash_signature(EDITED)) > 0.8
+    assert estimated_similarity(minhash_signature(ORIGINAL), minhash_signature(UNRELATED)) < 0.2
+    assert minhash_signature("") == ()
+
+def test_near_duplicates_are_found_with_their_owner():
+    index = indexed()
+    entry, similarity = index.find("edited", minhash_signature(EDITED), LENGTHS)
+    assert entry["name"] == "lease.txt" and entry["state"] == {"summary": "ok"} and entry["owner"] == "alice"
+    assert 0.8 <= similarity < 1.0
+    assert index.find("original", minhash_signature(ORIGINAL), LENGTHS)[1] == 1.0
+    assert index.find("unrelated", minhash_signature(UNRELATED), LENGTHS) is None
+    assert index.find("edited", minhash_signature(EDITED), (50, 100)) is None
+    assert index.stats()["exact_matches"] == 1 and index.stats()["near_matches"] == 1
+
+def test_signatures_match_the_reference_hash_functions():
+    hashes = shingles(EDITED)
+    expected = tuple(min((a * h + b) & MASK_64 for h in hashes) >> 32 for a, b in PERMUTATIONS)
+    assert minhash_signature(EDITED) == expected
+
+def test_oldest_documents_are_evicted_with_their_buckets():
+    index = NearDuplicateIndex(threshold=0.8, max_documents=1)
+    index.add("original", "lease.txt", minhash_signature(ORIGINAL), ORIGINAL, None, LENGTHS, owner="alice")
+    index.add("unrelated", "rent.txt", minhash_signature(UNRELATED), UNRELATED, None, LENGTHS, owner="alice")
+    assert index.stats()["documents"] == 1
+    assert index.find("edited", minhash_signature(EDITED), LENGTHS) is None
+
+def test_diff_reports_replaced_words_and_new_paragraphs():
+    renamed = ORIGINAL.replace("Acme Corp", "Globex Inc")
+    assert diff_documents(ORIGINAL, renamed)["replacements"] == [{"old": "Acme Corp", "new": "Globex Inc", "count": 20}]
+    differences = diff_documents(ORIGINAL, EDITED)
+    assert differences["unchanged_paragraphs"] == 19
+    assert differences["added"] == ["20. Acme Corp may suspend the service if invoices remain unpaid for sixty days."]
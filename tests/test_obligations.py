@@ -0,0 +1,64 @@
+import pytest
+
+from clause_index import build_clause_index
+from obligations import extract_obligations
+
+CONTRACT = """1. Term
+The initial term of one hundred and eighty days starts on signature. It renews automatically for periods of twelve months.
+
+2. Payment
+The Customer shall pay each invoice within forty-five (45) days. A setup fee of $1,250.00 is payable by March 3, 2025.
+
+3. Termination
+Either party may terminate this agreement on ninety days' written notice.
+"""
+
+def extracted(text, **kwargs):
+    return [(item["type"], item["text"], item["value"]) for item in extract_obligations(text, **kwargs).to_json()["items"]]
+
+def extracted_confidence(text):
+    return extract_obligations(text).items[0].confidence
+
+@pytest.mark.parametrize("words, amount", [
+    ("thirteen", 13), ("sixteen", 16), ("seventeen", 17), ("eighteen", 18), ("nineteen", 19), ("forty", 40),
+    ("fifty", 50), ("forty-five", 45), ("twenty one", 21), ("a hundred", 100), ("one hundred twenty", 120),
+    ("two hundred and forty", 240), ("seventy-two", 72),
+])
+def test_numbers_in_words_are_read(words, amount):
+    assert extracted(f"Refunds shall be issued within {words} days.") == [
+        ("deadline", f"within {words} days", {"amount": amount, "unit": "days"})]
+
+def test_longer_number_words_win_over_their_prefixes():
+    assert extracted("Payment is due within nineteen business days.")[0][2] == {"amount": 19, "unit": "business_days"}
+    assert extracted("Payment is due within seventy days.")[0][2] == {"amount": 70, "unit": "days"}
+
+def test_kinds_and_values_are_extracted_in_document_order():
+    assert extracted(CONTRACT) == [
+        ("term", "term of one hundred and eighty days", {"amount": 180, "unit": "days"}),
+        ("renewal", "renews automatically", {"amount": 12, "unit": "months"}),
+        ("deadline", "within forty-five (45) days", {"amount": 45, "unit": "days"}),
+        ("fee", "$1,250.00", {"amount": 1250.0, "currency": "USD"}),
+        ("date", "March 3, 2025", {"date": "2025-03-03"}),
+        ("notice_period", "ninety days' written notice", {"amount": 90, "unit": "days"}),
+    ]
+
+def test_items_are_mapped_to_clauses_and_scored_by_cues():
+    result = extract_obligations(CONTRACT, clause_index=build_clause_index(CONTRACT)).to_json()
+    clauses = {item["text"]: item["clause"]["number"] for item in result["items"]}
+    assert clauses["within forty-five (45) days"] == "2" and clauses["ninety days' written notice"] == "3"
+    confidence = {item["text"]: item["confidence"] for item in result["items"]}
+    assert confidence["within forty-five (45) days"] > extracted_confidence("It took within forty-five days.")
+    assert result["counts"]["date"] == 1
+
+def test_ambiguous_and_impossible_dates():
+    ambiguous, = extract_obligations("The agreement is effective from 03/04/2025.").items
+    assert ambiguous.value == {"date": "2025-03-04"} and ambiguous.confidence < 0.7
+    assert extract_obligations("Rent is due on 31/31/2024.").items == []
+
+def test_rejected_items_are_dropped_after_verification():
+    obligations = extract_obligations("The agreement is effective from 03/04/2025. It ends on 2026-01-01.")
+    assert [item.id for item in obligations.unverified()] == [1, 2]
+    obligations.apply_verdicts({1: False, 2: True})
+    result = obligations.to_json()
+    assert result["verification"] == "done" and result["rejected"] == 1
+    assert [item["text"] for item in result["items"]] == ["2026-01-01"]
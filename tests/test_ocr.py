@@ -0,0 +1,95 @@
+import io
+import sys
+import types
+
+import pytest
+from PyPDF2 import PdfWriter
+from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject, NumberObject
+
+import extractors
+import ocr
+
+def blank_pdf(pages):
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=200, height=200)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+@pytest.fixture
+def scanned(monkeypatch):
+    """Every page of the PDF is a scan; records the batches handed to OCR."""
+    batches = []
+
+    def ocr_pages(pages, **kwargs):
+        batches.append([number for number, _ in pages])
+        return {number: f"page {number} " + "x" * 90 for number, _ in pages}
+
+    monkeypatch.setattr(extractors, "ocr_available", lambda: True)
+    monkeypatch.setattr(extractors, "page_images", lambda page: [b"image"])
+    monkeypatch.setattr(extractors, "ocr_pages", ocr_pages)
+    monkeypatch.setattr(extractors, "OCR_BATCH_PAGES", 2)
+    return batches
+
+def test_scanned_pages_are_recognised_in_batches(scanned):
+    text = extractors.extract_text_from_pdf(blank_pdf(5))
+    assert scanned == [[0, 1], [2, 3], [4]]
+    assert text.splitlines()[4].startswith("page 4")
+
+def test_recognised_text_counts_toward_max_chars(scanned):
+    text = extractors.extract_text_from_pdf(blank_pdf(10), max_chars=250)
+    assert scanned == [[0, 1], [2, 3]] and len(text) == 250
+
+def test_no_pages_are_recognised_past_the_memory_budget(scanned):
+    text = extractors.extract_text_from_pdf(blank_pdf(5), on_text=lambda chars: chars > 150)
+    assert scanned == [[0, 1]] and text.count("page") == 2
+
+def test_ocr_pages_caches_results_and_counts_failures(monkeypatch):
+    calls = []
+
+    def recognise_page(images, language=ocr.OCR_LANGUAGE):
+        calls.append(images)
+        if images == [b"torn"]:
+            raise OSError("cannot identify image file")
+        return images[0].decode()
+
+    monkeypatch.setattr(ocr, "recognise_page", recognise_page)
+    monkeypatch.setattr(ocr, "_cache", type(ocr._cache)())
+    monkeypatch.setattr(ocr, "_counters", {"pages_recognised": 0, "cache_hits": 0, "failures": 0})
+    pages = [(0, [b"first"]), (1, [b"torn"])]
+    assert ocr.ocr_pages(pages, parallel=False) == {0: "first"}
+    assert ocr.ocr_pages(pages, parallel=False) == {0: "first"}
+    assert calls == [[b"first"], [b"torn"], [b"torn"]]
+    stats = ocr.ocr_stats()
+    assert stats["pages_recognised"] == 1 and stats["cache_hits"] == 1 and stats["failures"] == 2
+    assert stats["in_progress"] == []
+
+def test_ocr_needs_pillow(monkeypatch):
+    pytesseract = types.SimpleNamespace(pytesseract=types.SimpleNamespace(tesseract_cmd="tesseract"))
+    monkeypatch.setitem(sys.modules, "pytesseract", pytesseract)
+    monkeypatch.setattr(ocr.shutil, "which", lambda command: "/usr/bin/tesseract")
+    monkeypatch.setattr(ocr, "_available", None)
+    monkeypatch.setattr(ocr.importlib.util, "find_spec", lambda name: None)
+    assert ocr.ocr_available() is False
+    monkeypatch.setattr(ocr, "_available", None)
+    monkeypatch.setattr(ocr.importlib.util, "find_spec", lambda name: object())
+    assert ocr.ocr_available() is True
+
+def test_only_images_the_page_draws_are_decoded():
+    pytest.importorskip("PIL")
+    page = PdfWriter().add_blank_page(width=10, height=10)
+    x_objects = DictionaryObject()
+    for name in ("/Drawn", "/Shared"):
+        image = DecodedStreamObject()
+        image.set_data(b"\xff\x00\x00" * 4)
+        image.update({NameObject("/Type"): NameObject("/XObject"), NameObject("/Subtype"): NameObject("/Image"),
+                      NameObject("/Width"): NumberObject(2), NameObject("/Height"): NumberObject(2),
+                      NameObject("/ColorSpace"): NameObject("/DeviceRGB"),
+                      NameObject("/BitsPerComponent"): NumberObject(8)})
+        x_objects[NameObject(name)] = image
+    page[NameObject("/Resources")] = DictionaryObject({NameObject("/XObject"): x_objects})
+    contents = DecodedStreamObject()
+    contents.set_data(b"q 10 0 0 10 0 0 cm /Drawn Do Q")
+    page[NameObject("/Contents")] = contents
+    assert len(ocr.page_images(page)) == 1
@@ -0,0 +1,46 @@
+import threading
+
+from precompute import IdleScheduler
+
+def wait_for(scheduler, completed_and_failed, timeout=2):
+    """Wait until the scheduler has finished the jobs queued so far (the given number of them)."""
+    done = threading.Event()
+    scheduler.submit(done.set, priority=100)
+    assert done.wait(timeout)
+    # The marker job itself may not be counted yet
+    assert scheduler.completed + scheduler.failed >= completed_and_failed
+
+def test_jobs_run_when_idle():
+    scheduler = IdleScheduler(idle_seconds=0)
+    ran = threading.Event()
+    assert scheduler.submit(ran.set)
+    assert ran.wait(2)
+
+def test_jobs_wait_while_a_request_is_in_progress():
+    scheduler = IdleScheduler(idle_seconds=0.05)
+    ran = threading.Event()
+    scheduler.begin()
+    scheduler.submit(ran.set)
+    assert not ran.wait(0.2)
+    assert scheduler.stats()["queued"] == 1 and scheduler.stats()["active_requests"] == 1
+    scheduler.end()
+    assert ran.wait(2)
+
+def test_queued_jobs_run_by_priority_once_per_key():
+    scheduler = IdleScheduler(idle_seconds=0)
+    order = []
+    with scheduler.foreground():
+        assert scheduler.submit(order.append, "later", priority=20, key="a")
+        assert not scheduler.submit(order.append, "duplicate", priority=1, key="a")
+        assert scheduler.submit(order.append, "first", priority=5)
+    wait_for(scheduler, 2)
+    assert order == ["first", "later"]
+
+def test_a_failing_job_does_not_stop_the_worker():
+    scheduler = IdleScheduler(idle_seconds=0)
+    ran = []
+    with scheduler.foreground():
+        scheduler.submit(lambda: 1 / 0, priority=1)
+        scheduler.submit(ran.append, "after", priority=2)
+    wait_for(scheduler, 2)
+    assert ran == ["after"] and scheduler.failed == 1 and scheduler.completed >= 1
@@ -0,0 +1,47 @@
+import pytest
+
+from qa_cache import AnswerCache, ConversationHistory
+
+# Pairs that read alike but ask different things: another party, a negation, another number
+DIFFERENT_QUESTIONS = [
+    ("Can I cancel the contract?", "Can they cancel the contract?"),
+    ("Can I cancel the contract?", "When can I not cancel the contract?"),
+    ("How much notice must be given by the customer?", "How much notice must be given by the supplier?"),
+    ("What is the fee in year 1?", "What is the fee in year 2?"),
+    ("How can I cancel or terminate this agreement?", "How can they cancel or terminate this agreement?"),
+    # Antonyms and modifiers that n-gram similarity scores above the threshold
+    ("Can the landlord increase the rent?", "Can the landlord decrease the rent?"),
+    ("What happens before the end of the term?", "What happens after the end of the term?"),
+    ("How long is the initial term?", "How long is the renewal term?"),
+    ("Who is liable for data breaches?", "Who is liable for data losses?"),
+]
+
+@pytest.mark.parametrize("cached, asked", DIFFERENT_QUESTIONS)
+def test_different_questions_do_not_share_answers(cached, asked):
+    cache = AnswerCache()
+    cache.put("doc", cached, "cached answer")
+    assert cache.get("doc", asked) is None
+
+def test_rewordings_share_answers():
+    cache = AnswerCache()
+    cache.put("doc", "Can I cancel the contract?", "cached answer")
+    assert cache.get("doc", "can i cancel the contract") == "cached answer"
+    assert cache.get("doc", "Can I cancel the contracts?") == "cached answer"
+    assert cache.get("doc", "Can I cancel this contract?") == "cached answer"
+    assert cache.stats()["similar_hits"] == 2
+
+def test_inflections_share_answers():
+    cache = AnswerCache()
+    cache.put("doc", "What are the penalties for cancelling?", "cached answer")
+    assert cache.get("doc", "What is the penalty for cancelling?") == "cached answer"
+
+def test_conversation_history_is_per_session_and_document():
+    history = ConversationHistory(max_turns=2)
+    history.add("a", "doc", "Q1", "A1")
+    history.add("a", "doc", "Q2", "A2")
+    history.add("a", "doc", "Q3", "A3")
+    assert history.turns("a", "doc") == [("Q2", "A2"), ("Q3", "A3")]
+    assert history.turns("b", "doc") == []
+    assert history.turns("a", "other") == []
+    history.add("a", "other", "Q4", "A4")
+    assert history.turns("a", "other") == [("Q4", "A4")]
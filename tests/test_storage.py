@@ -0,0 +1,54 @@
+import sqlite3
+
+from storage import DocumentStore
+
+def test_history_dependent_answers_are_not_reused(tmp_path):
+    store = DocumentStore(f"sqlite:///{tmp_path / 'store.db'}")
+    key = store.save_document("The customer may cancel on 30 days' notice.", "contract.txt")
+    store.record_question(key, "And how much notice?", "30 days, as for them.", session_id="a" * 32,
+                          history_dependent=True)
+    assert store.find_answer(key, "And how much notice?") is None
+    store.record_question(key, "How much notice?", "30 days.", session_id="a" * 32)
+    assert store.find_answer(key, "how much notice") == "30 days."
+    # Both still show in the session's own history
+    assert [row["question"] for row in store.question_history("a" * 32)] == ["How much notice?", "And how much notice?"]
+
+def test_columns_added_after_creation_are_migrated(tmp_path):
+    path = tmp_path / "old.db"
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE questions (id INTEGER PRIMARY KEY, document_id INTEGER NOT NULL, session_id VARCHAR(32), "
+                       "question TEXT NOT NULL, normalized_question TEXT NOT NULL, answer TEXT NOT NULL, created_at FLOAT NOT NULL)")
+    connection.commit()
+    connection.close()
+    store = DocumentStore(f"sqlite:///{path}")
+    key = store.save_document("Text of an older database.", "old.txt")
+    assert store.record_question(key, "Question?", "Answer.")
+    assert store.find_answer(key, "Question?") == "Answer."
+
+def test_only_the_latest_analyses_of_a_document_are_kept(tmp_path):
+    store = DocumentStore(f"sqlite:///{tmp_path / 'store.db'}", analyses_per_document=2)
+    key = store.save_document("Section one.\n\nSection two.", "contract.txt")
+    other = store.save_document("Another contract.", "other.txt")
+    store.save_analysis(other, {"lengths": (150, 300), "sections": {}, "summary": "other"})
+    for number in range(4):
+        store.save_analysis(key, {"lengths": (150, 300), "sections": {}, "summary": number},
+                            session_id=f"{number:032d}")
+    assert store.stats()["analyses"] == 3
+    assert store.load_analysis(key, (150, 300))["summary"] == 3
+    assert store.load_session_analysis(f"{0:032d}") is None
+    assert store.load_session_analysis(f"{2:032d}")["summary"] == 2
+    assert store.load_analysis(other, (150, 300))["summary"] == "other"
+
+def test_document_text_is_stored_once_and_old_copies_are_dropped(tmp_path):
+    path = tmp_path / "old.db"
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE documents (id INTEGER PRIMARY KEY, content_hash VARCHAR(64) NOT NULL UNIQUE, "
+                       "name VARCHAR(255), text TEXT NOT NULL, chars INTEGER NOT NULL, created_at FLOAT NOT NULL)")
+    connection.commit()
+    connection.close()
+    store = DocumentStore(f"sqlite:///{path}")
+    key = store.save_document("Clause one.\n\nClause two.", "contract.txt")
+    store.save_analysis(key, {"lengths": (150, 300), "summaries": {"Document Analysis": "ok"}})
+    assert store.load_analysis(key, (150, 300))["chunks"].chunks.text() == "Clause one.\n\nClause two."
+    columns = [row[1] for row in sqlite3.connect(path).execute("PRAGMA table_info(documents)")]
+    assert "text" not in columns
@@ -0,0 +1,33 @@
+import json
+
+from summary_render import (Block, TITLE, HEADING, BULLET, SEPARATOR, SPACE, parse_summary, blocks_to_text,
+                            render_html, section_blocks, section_text)
+from summariser_genai import DocumentAnalysis, compile_summary_blocks
+
+def test_parse_summary_splits_run_together_bullets_in_model_text():
+    assert parse_summary("**Key Points:**\nFirst * second * third") == [
+        Block(HEADING, "Key Points:"), Block("text", "First"), Block(BULLET, "second"), Block(BULLET, "third")]
+
+def test_blocks_survive_a_text_round_trip():
+    blocks = [Block(TITLE, "ANALYSIS"), Block(SPACE, ""), Block(HEADING, "Key Points:"), Block(BULLET, "One"),
+              Block(SEPARATOR, "")]
+    assert parse_summary(blocks_to_text(blocks)) == blocks
+
+def test_structured_items_are_rendered_without_reparsing():
+    analysis = DocumentAnalysis.from_json(json.dumps({
+        "key_points": ["* Fees are charged * monthly in advance"], "rights": [], "obligations": [],
+        "important_terms": [{"term": "Term", "definition": "Twelve months"}],
+        "high_risks": ["Renews automatically"], "medium_risks": [], "points_to_note": []}))
+    blocks = compile_summary_blocks({"Document Analysis": analysis.summary_blocks(),
+                                     "Risk Assessment": analysis.risk_blocks()})
+    bullets = [text for kind, text in blocks if kind == BULLET]
+    assert bullets == ["Fees are charged * monthly in advance", "Term: Twelve months", "Renews automatically"]
+    assert '<div class="bullet-point">Fees are charged * monthly in advance</div>' in render_html(blocks)
+
+def test_stored_blocks_and_model_text_both_compile():
+    stored = json.loads(json.dumps([Block(HEADING, "HIGH RISK:"), Block(BULLET, "Arbitration")]))
+    assert section_blocks(stored) == [Block(HEADING, "HIGH RISK:"), Block(BULLET, "Arbitration")]
+    assert section_text(stored) == "**HIGH RISK:**\n* Arbitration"
+    blocks = compile_summary_blocks({"Document Analysis": "**Key Points:**\n* One", "Risk Assessment": stored})
+    assert [text for kind, text in blocks if kind in (TITLE, HEADING)] == [
+        "GENAI LEGAL ASSISTANT ANALYSIS", "Key Points:", "HIGH RISK:", "IMPORTANT DISCLAIMER"]